@@ -0,0 +1,83 @@
+"""
+Load test for the WebSocket broadcaster with simulated clients.
+
+Most clients accept messages after a small random delay; a few are stalled and
+should be disconnected without delaying anyone else.
+
+Usage:
+    python -m benchmarks.bench_broadcast [--clients 300] [--slow 10] [--events 500] [--rate 50]
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from src.broadcaster import Broadcaster
+
+
+class FakeWebSocket:
+    """Stands in for a Starlette WebSocket; records when each event arrives"""
+    def __init__(self, delay, stalled=False):
+        self.delay = delay
+        self.stalled = stalled
+        self.latencies = []
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, message):
+        if self.stalled:
+            await asyncio.sleep(3600)
+        await asyncio.sleep(self.delay)
+        self.latencies.append(time.perf_counter() - json.loads(message)['sent_at'])
+
+    async def close(self):
+        self.closed = True
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    return statistics.quantiles(values, n=100)[q - 1] if len(values) > 1 else values[0]
+
+
+async def run(num_clients, num_slow, num_events, rate):
+    broadcaster = Broadcaster(queue_size=32, send_timeout=1.0, max_dropped=64)
+    sockets = [FakeWebSocket(random.uniform(0, 0.002)) for _ in range(num_clients - num_slow)]
+    stalled = [FakeWebSocket(0, stalled=True) for _ in range(num_slow)]
+    for ws in sockets + stalled:
+        await broadcaster.connect(ws)
+
+    publish_time = 0.0
+    for i in range(num_events):
+        start = time.perf_counter()
+        broadcaster.publish({'frame_number': i, 'violation_count': i, 'sent_at': start})
+        publish_time += time.perf_counter() - start
+        await asyncio.sleep(1 / rate)
+    await asyncio.sleep(1.5)
+
+    latencies = [latency for ws in sockets for latency in ws.latencies]
+    delivered = len(latencies) / (len(sockets) * num_events)
+    print(f"clients: {num_clients} ({num_slow} stalled), events: {num_events} at {rate}/s")
+    print(f"publish cost: {publish_time / num_events * 1e6:.1f} us/event")
+    print(f"delivery to healthy clients: {delivered:.1%}, "
+          f"latency p50 {percentile(latencies, 50) * 1000:.2f} ms, p99 {percentile(latencies, 99) * 1000:.2f} ms")
+    print(f"stalled clients disconnected: {sum(ws.closed for ws in stalled)}/{num_slow}")
+    print(f"broadcaster: {broadcaster.metrics()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=300)
+    parser.add_argument("--slow", type=int, default=10)
+    parser.add_argument("--events", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.clients, args.slow, args.events, args.rate))
+
+
+if __name__ == "__main__":
+    main()
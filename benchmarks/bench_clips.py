@@ -0,0 +1,126 @@
+"""
+Cost of violation clips cut from the processing ring buffer, against cutting them by
+reopening and decoding the source video afterwards.
+
+A synthetic clip runs through run_video with a stub detector taking --stub-latency-ms
+per frame, with clips off and on. Hands only appear in a few bursts per
+--violation-every frames, so violations come in groups, as in a store.
+The report covers the overhead per frame, the clips written against the violations
+(overlapping ones merge), the frames in each clip and the buffer memory against the
+budget. The same clip windows are then cut from the source file for comparison.
+
+Usage:
+    python -m benchmarks.bench_clips [--frames 1800] [--width 1280] [--height 720] [--memory-mb 256]
+                                     [--stub-latency-ms 30] [--violation-every 450]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+
+from benchmarks.pipeline_suite import make_video
+from benchmarks.stub_detector import StubDetector, synthetic_detections
+from src.video_processor import VideoProcessor
+
+
+def bursty_detections(num_frames, width, height, every, burst=150):
+    """Synthetic detections with hands only in the first burst frames of every `every` frames"""
+    frames = synthetic_detections(num_frames, width=width, height=height)
+    for i, detections in enumerate(frames):
+        if i % every >= burst:
+            frames[i] = detections[detections[:, 5] != 0]
+    return frames
+
+
+def run(video_path, detections, workdir, latency_ms, **kwargs):
+    processor = VideoProcessor(model=StubDetector(detections, per_image_ms=latency_ms), db_path=None, **kwargs)
+    processor.frames_dir = workdir / "frames"
+    if processor.clip_recorder is not None:
+        processor.clip_recorder.clips_dir = workdir / "clips"
+    clip_paths = []
+    handle_frame = processor.emit_violation_event
+
+    def record(frame_path, frame_number, violations, clip_path=None):
+        clip_paths.append(clip_path)
+        return handle_frame(frame_path, frame_number, violations, clip_path)
+
+    processor.emit_violation_event = record
+    start = time.perf_counter()
+    processor.run_video(video_path)
+    return processor, clip_paths, time.perf_counter() - start
+
+
+def frame_count(path):
+    cap = cv2.VideoCapture(str(path))
+    count = 0
+    while cap.grab():
+        count += 1
+    cap.release()
+    return count
+
+
+def cut_from_source(video_path, windows, out_dir):
+    """Cut each (first, last) frame window by reopening the source, as a reviewer tool would"""
+    out_dir.mkdir(exist_ok=True)
+    start = time.perf_counter()
+    for i, (first, last) in enumerate(windows):
+        cap = cv2.VideoCapture(str(video_path))
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first - 1)
+        writer = None
+        for _ in range(last - first + 1):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if writer is None:
+                writer = cv2.VideoWriter(str(out_dir / f"{i}.mp4"), cv2.VideoWriter_fourcc(*"mp4v"), fps,
+                                         (frame.shape[1], frame.shape[0]))
+            writer.write(frame)
+        if writer is not None:
+            writer.release()
+        cap.release()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=1800)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--memory-mb", type=float, default=256)
+    parser.add_argument("--stub-latency-ms", type=float, default=30.0, help="Simulated model time per frame")
+    parser.add_argument("--violation-every", type=int, default=450, help="Frames between bursts of violations")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = Path(workdir)
+        video_path = workdir / "clip.mp4"
+        make_video(video_path, args.frames, width=args.width, height=args.height)
+        detections = bursty_detections(args.frames, args.width, args.height, args.violation_every)
+
+        _, _, base_time = run(video_path, detections, workdir, args.stub_latency_ms)
+        processor, clip_paths, clip_time = run(video_path, detections, workdir, args.stub_latency_ms,
+                                               violation_clips=True, clip_memory_mb=args.memory_mb)
+        stats = processor.last_run_stats['clips']
+        overhead_ms = (clip_time - base_time) / args.frames * 1000
+        print(f"clips off: {base_time:.2f}s, clips on: {clip_time:.2f}s ({overhead_ms:+.2f} ms/frame)")
+
+        clips = sorted({Path(path) for path in clip_paths if path}, key=lambda path: int(path.name.split("_")[1]))
+        print(f"{len(clip_paths)} violations -> {len(clips)} clips; encoder {stats}")
+        print(f"buffers {stats['buffer_mb']} MB of a {args.memory_mb:.0f} MB budget")
+        windows = []
+        for clip in clips:
+            frames = frame_count(clip)
+            first = int(clip.name.split("_")[1]) - processor.clip_recorder.pre_frames
+            windows.append((max(1, first), max(1, first) + frames - 1))
+            print(f"  {clip.name}: {frames} frames")
+
+        source_time = cut_from_source(video_path, windows, workdir / "recut")
+        print(f"cutting the same clips from the source: {source_time:.2f}s "
+              f"({source_time / len(windows) * 1000 if windows else 0:.0f} ms per clip)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Rule tuning with the detection cache: the first run of a clip records its detections,
+later runs replay tracking from the cache without the model.
+
+A stub detector with --stub-latency-ms per frame stands in for YOLO on CPU. Each
+cooldown in --cooldowns is run once from the cache and once with full inference;
+the violation counts must match. Also checks that changing the weights file
+invalidates the entry and that a full cache evicts the least recently used clip.
+
+Usage:
+    python -m benchmarks.bench_detection_cache [--frames 900] [--stub-latency-ms 20] [--cooldowns 10,30,90]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.pipeline_suite import make_video
+from benchmarks.stub_detector import StubDetector, synthetic_detections
+from src.camera_config import CameraConfig
+from src.detection_cache import DetectionCache
+from src.video_processor import VideoProcessor
+
+
+def make_processor(detections, weights, frames_dir, cache, latency_ms, cooldown):
+    model = StubDetector(detections, per_image_ms=latency_ms, weights_path=weights)
+    camera_config = CameraConfig.from_roi()
+    camera_config.violation_cooldown = cooldown
+    processor = VideoProcessor(model=model, camera_config=camera_config, db_path=None, detection_cache=cache)
+    processor.frames_dir = frames_dir
+    return processor
+
+
+def timed_run(processor, video_path):
+    start = time.perf_counter()
+    violations = processor.run_video(video_path)
+    elapsed = time.perf_counter() - start
+    return violations, elapsed, processor.last_run_stats.get('detection_cache', 'off')
+
+
+def run(num_frames, latency_ms, cooldowns):
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = Path(workdir)
+        frames_dir = workdir / "frames"
+        frames_dir.mkdir()
+        video_path = workdir / "clip.mp4"
+        make_video(video_path, num_frames, width=640, height=480)
+        weights = workdir / "model.pt"
+        weights.write_bytes(b"weights v1")
+        detections = synthetic_detections(num_frames, hands=2)
+        cache = DetectionCache(workdir / "cache")
+
+        processor = make_processor(detections, weights, frames_dir, cache, latency_ms, cooldowns[0])
+        violations, elapsed, status = timed_run(processor, video_path)
+        print(f"first run: {violations} violations, {num_frames / elapsed:.0f} fps ({status}), "
+              f"cache {cache.total_bytes() / 1024:.0f} KB")
+
+        all_match = True
+        for cooldown in cooldowns:
+            replay = make_processor(detections, weights, frames_dir, cache, latency_ms, cooldown)
+            replayed, replay_s, status = timed_run(replay, video_path)
+            full = make_processor(detections, weights, frames_dir, None, latency_ms, cooldown)
+            expected, full_s, _ = timed_run(full, video_path)
+            match = replayed == expected
+            all_match &= match
+            print(f"cooldown {cooldown:3d}: replay {replayed} violations at {num_frames / replay_s:.0f} fps ({status}), "
+                  f"full inference {expected} at {num_frames / full_s:.0f} fps "
+                  f"-> {full_s / replay_s:.0f}x ({'match' if match else 'MISMATCH'})")
+
+        weights.write_bytes(b"weights v2")
+        _, _, status = timed_run(make_processor(detections, weights, frames_dir, cache, latency_ms, cooldowns[0]), video_path)
+        entries = len(list(cache._entries()))
+        print(f"after changing the weights: {status}, {entries} entry in the cache")
+
+        # Room for one clip: caching a second one evicts the least recently used
+        small = DetectionCache(workdir / "cache", max_bytes=cache.total_bytes() * 3 // 2)
+        other_path = workdir / "other.mp4"
+        make_video(other_path, num_frames // 2, width=640, height=480)
+        timed_run(make_processor(detections, weights, frames_dir, small, latency_ms, cooldowns[0]), other_path)
+        _, _, status = timed_run(make_processor(detections, weights, frames_dir, small, latency_ms, cooldowns[0]), video_path)
+        print(f"after caching a second clip with room for one: first clip "
+              f"{'evicted' if status == 'stored' else 'still cached'}")
+        print("replay matches full inference" if all_match else "REPLAY MISMATCH")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=900)
+    parser.add_argument("--stub-latency-ms", type=float, default=20.0, help="Simulated model time per frame")
+    parser.add_argument("--cooldowns", default="10,30,90", help="Comma-separated violation cooldowns to try")
+    args = parser.parse_args()
+    run(args.frames, args.stub_latency_ms, [int(c) for c in args.cooldowns.split(",")])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Per-frame cost of hand tracking against the number of hands and scoopers.
+
+Compares HandTracker with the previous nested-loop implementation on synthetic
+hands random-walking around the default ROI. HandTracker compares track/hand
+distances in plain Python on small frames and with NumPy on crowded ones; the
+"arrays only" column always uses NumPy, to show where it starts to pay off.
+
+Usage:
+    python -m benchmarks.bench_hand_tracker [--frames 2000]
+"""
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from src.camera_config import Station
+from src.hand_tracker import HandTracker
+
+ROI = np.array([(400, 260), (560, 260), (460, 740), (300, 740)], dtype=np.int32)
+
+
+class LegacyTracker:
+    """The dict-based tracker VideoProcessor used before HandTracker, kept for comparison"""
+    def __init__(self, roi):
+        self.roi = roi
+        self.hands_in_roi = {}
+        self.next_hand_id = 0
+
+    def update(self, hand_centers, scooper_centers):
+        violators = []
+        hands_to_remove = []
+        for hand_id, hand_info in self.hands_in_roi.items():
+            hand_found = False
+            last_pos = hand_info['last_pos']
+            for index, (cx, cy) in enumerate(hand_centers):
+                if np.hypot(cx - last_pos[0], cy - last_pos[1]) < 50:
+                    hand_found = True
+                    hand_info['last_pos'] = (cx, cy)
+                    in_roi = cv2.pointPolygonTest(self.roi, (cx, cy), False) >= 0
+                    if not in_roi and not hand_info['left_checked']:
+                        if not any(np.hypot(sx - cx, sy - cy) < 100 for sx, sy in scooper_centers):
+                            violators.append(index)
+                        hand_info['left_checked'] = True
+                    break
+            if not hand_found:
+                hands_to_remove.append(hand_id)
+        for hand_id in hands_to_remove:
+            del self.hands_in_roi[hand_id]
+
+        for cx, cy in hand_centers:
+            if cv2.pointPolygonTest(self.roi, (cx, cy), False) >= 0:
+                if not any(np.hypot(cx - info['last_pos'][0], cy - info['last_pos'][1]) < 50
+                           for info in self.hands_in_roi.values()):
+                    self.hands_in_roi[self.next_hand_id] = {
+                        'entered_with_scooper': any(np.hypot(sx - cx, sy - cy) < 100 for sx, sy in scooper_centers),
+                        'last_pos': (cx, cy),
+                        'left_checked': False
+                    }
+                    self.next_hand_id += 1
+        return violators
+
+
+def synthetic_frames(num_hands, num_scoopers, num_frames, seed=0):
+    """Hands and scoopers random-walking around the ROI, as integer centers per frame"""
+    rng = np.random.default_rng(seed)
+    hands = rng.uniform((250, 200), (650, 800), size=(num_hands, 2))
+    scoopers = rng.uniform((250, 200), (650, 800), size=(num_scoopers, 2))
+    for _ in range(num_frames):
+        hands += rng.normal(0, 8, size=hands.shape)
+        scoopers += rng.normal(0, 8, size=scoopers.shape)
+        yield hands.astype(np.int64), scoopers.astype(np.int64)
+
+
+def time_tracker(tracker, frames, as_lists):
+    start = time.perf_counter()
+    for hands, scoopers in frames:
+        if as_lists:
+            tracker.update([tuple(h) for h in hands.tolist()], [tuple(s) for s in scoopers.tolist()])
+        else:
+            tracker.update(hands, scoopers)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'hands':>5} {'scoopers':>8} {'legacy us/frame':>16} {'HandTracker us/frame':>21} "
+          f"{'arrays only us/frame':>21} {'speedup':>8}")
+    for num_hands in (1, 2, 4, 8, 16, 32):
+        for num_scoopers in (0, 2, 8):
+            frames = list(synthetic_frames(num_hands, num_scoopers, args.frames))
+            legacy = time_tracker(LegacyTracker(ROI), frames, as_lists=True)
+            tracker = time_tracker(HandTracker([Station('roi', ROI)]), frames, as_lists=False)
+            vectorized = time_tracker(HandTracker([Station('roi', ROI)], loop_max_pairs=0), frames, as_lists=False)
+            print(f"{num_hands:>5} {num_scoopers:>8} {legacy / args.frames * 1e6:>16.1f} "
+                  f"{tracker / args.frames * 1e6:>21.1f} {vectorized / args.frames * 1e6:>21.1f} "
+                  f"{legacy / tracker:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Latency of live processing when the model is slower than the camera.
+
+A synthetic clip is played at its real frame rate as a stand-in for a camera, and a
+stub detector takes --model-ms per frame. A naive loop that queues every frame falls
+further behind with each frame. VideoProcessor.run_live processes the freshest frame
+and drops the rest, so its latency stays around one inference. Also checks that a
+lost feed is reopened.
+
+Usage:
+    python -m benchmarks.bench_live [--seconds 10] [--fps 30] [--model-ms 60]
+"""
+import argparse
+import cv2
+import queue
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from benchmarks.pipeline_suite import make_video
+from benchmarks.stub_detector import StubDetector, synthetic_detections
+from src.live_source import LiveCapture
+from src.video_processor import VideoProcessor, latency_summary
+
+
+def make_processor(detections, model_ms, frames_dir):
+    processor = VideoProcessor(model=StubDetector(detections, per_image_ms=model_ms), db_path=None)
+    processor.frames_dir = frames_dir
+    return processor
+
+
+def run_naive(video_path, processor, fps):
+    """Read at camera rate into an unbounded queue and process every frame in order"""
+    frames = queue.Queue()
+
+    def read():
+        cap = cv2.VideoCapture(str(video_path))
+        started = time.monotonic()
+        n = 0
+        while True:
+            delay = started + n / fps - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            ret, frame = cap.read()
+            if not ret:
+                break
+            n += 1
+            frames.put((n, frame, time.monotonic()))
+        frames.put(None)
+        cap.release()
+
+    threading.Thread(target=read, daemon=True).start()
+    latencies = []
+    while True:
+        item = frames.get()
+        if item is None:
+            break
+        frame_number, frame, captured_at = item
+        processor.handle_frame(frame, processor.infer_batch([frame])[0], frame_number)
+        latencies.append(time.monotonic() - captured_at)
+    processor.flush_outputs()
+    return latencies
+
+
+def run(seconds, fps, model_ms):
+    num_frames = int(seconds * fps)
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = Path(workdir)
+        frames_dir = workdir / "frames"
+        frames_dir.mkdir()
+        video_path = workdir / "camera.mp4"
+        make_video(video_path, num_frames, width=640, height=480, fps=fps)
+        detections = synthetic_detections(num_frames)
+
+        latencies = run_naive(video_path, make_processor(detections, model_ms, frames_dir), fps)
+        naive = latency_summary(latencies)
+        print(f"naive loop:    {len(latencies)} of {num_frames} frames processed, latency ms {naive}")
+
+        processor = make_processor(detections, model_ms, frames_dir)
+        processor.run_live(video_path, realtime=True)
+        stats = processor.last_run_stats
+        print(f"freshest frame: {stats['frames']} of {stats['frames_captured']} frames processed, "
+              f"{stats['frames_dropped']} dropped, latency ms {stats['frame_latency_ms']}")
+        print(f"capture to alert ms: {stats['capture_to_alert_ms']}")
+
+        # The end of a file played with reconnect=True looks like a lost feed
+        capture = LiveCapture(video_path, realtime=False, reconnect=True, max_reconnects=2, backoff_initial=0.05).start()
+        while capture.read(timeout=1.0) is not None or not capture.ended:
+            pass
+        print(f"lost feed: {capture.reconnects} reconnects, {capture.frames_captured} frames captured "
+              f"({capture.frames_captured // num_frames} plays of the clip)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--model-ms", type=float, default=60.0, help="Stub model time per frame")
+    args = parser.parse_args()
+    run(args.seconds, args.fps, args.model_ms)
+
+
+if __name__ == "__main__":
+    main()
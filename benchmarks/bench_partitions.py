@@ -0,0 +1,127 @@
+"""
+Check partitioned, checkpointed DetectionService workers against one uninterrupted consumer.
+
+Synthetic hands cross the default station on several cameras, some with a scooper
+nearby. Messages are routed to workers by camera id. Every worker "crashes" after
+handling messages it never acknowledged; a fresh worker on the same database then
+gets those messages again, as the broker would redeliver them. Violation counts
+must match the uninterrupted run exactly.
+
+Usage:
+    python -m benchmarks.bench_partitions [--cameras 8] [--workers 3] [--frames 2000]
+"""
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.detection_service import DetectionService
+from src.transport import DetectionPublisher, partition_for
+
+LABELS = {0: 'hand', 1: 'scooper'}
+ACK_EVERY = 16
+
+
+class ListTransport:
+    """Collects published messages"""
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, body):
+        self.messages.append(body)
+
+
+def camera_messages(camera_id, num_frames, seed):
+    """
+    One hand sweeping back and forth through the station, out of view at both ends of
+    the sweep; a scooper follows it on some passes
+    """
+    rng = random.Random(seed)
+    transport = ListTransport()
+    publisher = DetectionPublisher(transport, LABELS, camera_id=camera_id, batch_frames=8)
+    x, step, with_scooper = 200, 12, False
+    for frame_number in range(1, num_frames + 1):
+        x += step
+        if x > 700 or x < 200:
+            step = -step
+            with_scooper = rng.random() < 0.4
+        y = 500 + rng.randint(-5, 5)
+        if x < 260 or x > 640:
+            publisher.add(frame_number, np.zeros((0, 6), dtype=np.float32), timestamp=time.time())
+            continue
+        detections = [[x - 20, y - 20, x + 20, y + 20, 0.9, 0]]
+        if with_scooper:
+            detections.append([x + 10, y - 15, x + 50, y + 15, 0.8, 1])
+        publisher.add(frame_number, np.array(detections, dtype=np.float32), timestamp=time.time())
+    publisher.flush()
+    return transport.messages
+
+
+def run(num_cameras, num_workers, num_frames):
+    cameras = {f"cam{i}": camera_messages(f"cam{i}", num_frames, seed=i) for i in range(num_cameras)}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = Path(workdir)
+        frames_dir = str(workdir / "frames")
+
+        # Reference: one consumer, no interruptions
+        reference = DetectionService(db_path=str(workdir / "reference.db"), frames_dir=frames_dir, transport=ListTransport())
+        for messages in cameras.values():
+            for body in messages:
+                reference.process_message(body)
+        reference.checkpoint()
+        expected = reference.violation_store.count()
+
+        # Partitioned workers; each crashes partway with unacknowledged messages
+        partitions = {partition: [] for partition in range(num_workers)}
+        for camera_id, messages in cameras.items():
+            partitions[partition_for(camera_id, num_workers)].extend(messages)
+
+        db_path = str(workdir / "partitioned.db")
+        start = time.perf_counter()
+        for partition, messages in partitions.items():
+            worker = DetectionService(db_path=db_path, frames_dir=frames_dir, transport=ListTransport(),
+                                      partition=partition, partitions=num_workers)
+            crash_at = len(messages) // 2 + ACK_EVERY * 3 // 4
+            acked = 0
+            for index, body in enumerate(messages[:crash_at], start=1):
+                worker.process_message(body)
+                if index % ACK_EVERY == 0:
+                    worker.checkpoint()
+                    acked = index
+            # Violations of unacknowledged messages reach the database before the crash
+            worker.violation_store.flush()
+
+            restarted = DetectionService(db_path=db_path, frames_dir=frames_dir, transport=ListTransport(),
+                                         partition=partition, partitions=num_workers)
+            for body in messages[acked:]:
+                restarted.process_message(body)
+            restarted.checkpoint()
+        elapsed = time.perf_counter() - start
+
+        store = restarted.violation_store
+        actual = store.count()
+        total_frames = num_cameras * num_frames
+        print(f"cameras: {num_cameras}, workers: {num_workers}, frames: {total_frames}")
+        print(f"violations: uninterrupted {expected}, partitioned with restarts {actual} "
+              f"({'match' if actual == expected else 'MISMATCH'})")
+        print(f"partitioned throughput: {total_frames / elapsed:.0f} frames/s (including replays)")
+        for row in store.partition_summary():
+            print(f"  partition {row['partition']}: {row['cameras']} cameras, {row['frames']} frames, "
+                  f"{row['violations']} violations")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cameras", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--frames", type=int, default=2000)
+    args = parser.parse_args()
+    run(args.cameras, args.workers, args.frames)
+
+
+if __name__ == "__main__":
+    main()
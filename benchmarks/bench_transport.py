@@ -0,0 +1,98 @@
+"""
+Compare the per-frame JSON detection messages with batched binary messages.
+
+Synthetic detections are published through an in-process transport and consumed by
+a DetectionService, so no broker or model is needed.
+
+Usage:
+    python -m benchmarks.bench_transport [--frames 5000] [--batch 16] [--detections 6]
+"""
+import argparse
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.detection_service import DetectionService
+from src.transport import DetectionPublisher, InProcessTransport
+
+LABELS = {0: 'hand', 1: 'person', 2: 'pizza', 3: 'scooper'}
+
+
+def synthetic_frames(num_frames, detections_per_frame, seed=0):
+    """Random boxes around the default ROI with a mix of hands and scoopers"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for _ in range(num_frames):
+        centers = rng.uniform([380, 280], [560, 420], size=(detections_per_frame, 2))
+        sizes = rng.uniform(20, 60, size=(detections_per_frame, 2))
+        detections = np.empty((detections_per_frame, 6), dtype=np.float32)
+        detections[:, :2] = centers - sizes / 2
+        detections[:, 2:4] = centers + sizes / 2
+        detections[:, 4] = rng.uniform(0.3, 1.0, detections_per_frame)
+        detections[:, 5] = rng.choice([0, 0, 3, 1, 2], detections_per_frame)
+        frames.append(detections)
+    return frames
+
+
+def run(frames, batch_frames, json_messages, workdir):
+    transport = InProcessTransport(maxsize=256)
+    service = DetectionService(
+        db_path=str(workdir / f"bench_{'json' if json_messages else 'batch'}.db"),
+        frames_dir=str(workdir / "frames"),
+        transport=transport
+    )
+    publisher = DetectionPublisher(transport, LABELS, camera_id='bench',
+                                   batch_frames=batch_frames, json_messages=json_messages)
+
+    consumer = threading.Thread(target=transport.consume, args=(service.process_message,), kwargs={'idle_timeout': 1.0})
+    start = time.perf_counter()
+    consumer.start()
+    publish_time = 0.0
+    for frame_number, detections in enumerate(frames):
+        t0 = time.perf_counter()
+        publisher.add(frame_number, detections)
+        publish_time += time.perf_counter() - t0
+    publisher.flush()
+    while service.frames_processed < len(frames) and consumer.is_alive():
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    transport.stop()
+    consumer.join()
+    service.violation_store.flush()
+
+    metrics = publisher.metrics()
+    return {
+        'messages': metrics['messages'],
+        'bytes_per_frame': metrics['bytes_per_frame'],
+        'publish_us_per_frame': publish_time / len(frames) * 1e6,
+        'fps': service.frames_processed / elapsed,
+        'violations': service.violation_count
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--detections", type=int, default=6)
+    args = parser.parse_args()
+
+    frames = synthetic_frames(args.frames, args.detections)
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = Path(workdir)
+        results = {
+            'json, 1 frame/message': run(frames, 1, True, workdir),
+            f'binary, {args.batch} frames/message': run(frames, args.batch, False, workdir)
+        }
+
+    for name, result in results.items():
+        print(f"{name}: {result['messages']} messages, {result['bytes_per_frame']:.0f} bytes/frame, "
+              f"publish {result['publish_us_per_frame']:.1f} us/frame, {result['fps']:.0f} frames/s end to end, "
+              f"{result['violations']} violations")
+
+
+if __name__ == "__main__":
+    main()
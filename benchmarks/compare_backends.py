@@ -0,0 +1,172 @@
+"""
+Compare inference backends on the same clip: startup time, throughput and how closely
+each backend's detections and violations follow the first (reference) model.
+
+Each model runs over the same decoded frames, one frame per call as in
+VideoProcessor.run_video. Detections are matched to the reference per class at IoU
+>= --match-iou; precision and recall are against the reference, not ground truth.
+Violations come from replaying each backend's detections through the tracker with
+the default (or --config) stations.
+
+Usage:
+    python -m benchmarks.compare_backends clip.mp4 yolo12m-v2.pt yolo12m-v2.onnx yolo12m-v2_int8.onnx \\
+        [yolo12m-v2_openvino_model] [--frames 300] [--threads 4] [--imgsz 640]
+
+Export the models with `python -m src.detectors yolo12m-v2.pt --backend onnx --int8 --calibration clip.mp4`.
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from benchmarks.stub_detector import StubDetector
+from src.camera_config import load_camera_configs
+from src.detectors import load_detector, normalize_imgsz
+from src.video_processor import VideoProcessor
+
+
+def read_frames(video_path, max_frames):
+    cap = cv2.VideoCapture(str(video_path))
+    try:
+        count = 0
+        while max_frames is None or count < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            count += 1
+            yield frame
+    finally:
+        cap.release()
+
+
+def run_backend(model, video_path, max_frames, imgsz, threads, warmup):
+    """Load one model and time it over the clip; returns (stats, per-frame detections, names)"""
+    started = time.perf_counter()
+    detector = load_detector(model, imgsz=imgsz, threads=threads)
+    load_seconds = time.perf_counter() - started
+    detector.warmup(warmup)
+
+    detections = []
+    times = []
+    for frame in read_frames(video_path, max_frames):
+        started = time.perf_counter()
+        detections.append(detector.detect([frame])[0])
+        times.append(time.perf_counter() - started)
+
+    times = np.array(times) * 1000
+    stats = {
+        'model': str(model),
+        'backend': detector.backend,
+        'imgsz': detector.imgsz,
+        'load_s': round(load_seconds, 2),
+        'frames': len(times),
+        'ms_p50': round(float(np.percentile(times, 50)), 1) if len(times) else None,
+        'ms_p95': round(float(np.percentile(times, 95)), 1) if len(times) else None,
+        'fps': round(len(times) / (times.sum() / 1000), 1) if len(times) else None,
+        'detections': int(sum(len(d) for d in detections))
+    }
+    return stats, detections, detector.names
+
+
+def box_iou(a, b):
+    """IoU matrix of (N, 4) and (M, 4) x1, y1, x2, y2 boxes"""
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(bottom_right - top_left, 0, None).prod(2)
+    area_a = (a[:, 2:] - a[:, :2]).prod(1)
+    area_b = (b[:, 2:] - b[:, :2]).prod(1)
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def match_detections(reference, candidate, min_iou):
+    """Greedy same-class matching, best IoU first; returns the IoU of each matched pair"""
+    matched = []
+    for class_id in np.intersect1d(reference[:, 5], candidate[:, 5]):
+        ref = reference[reference[:, 5] == class_id, :4]
+        cand = candidate[candidate[:, 5] == class_id, :4]
+        ious = box_iou(ref, cand)
+        while ious.size and ious.max() >= min_iou:
+            i, j = np.unravel_index(ious.argmax(), ious.shape)
+            matched.append(float(ious[i, j]))
+            ious[i, :] = -1
+            ious[:, j] = -1
+    return matched
+
+
+def agreement(reference, candidate, min_iou):
+    matched, ref_total, cand_total = [], 0, 0
+    for ref, cand in zip(reference, candidate):
+        matched += match_detections(ref, cand, min_iou)
+        ref_total += len(ref)
+        cand_total += len(cand)
+    return {
+        'precision': round(len(matched) / cand_total, 4) if cand_total else 1.0,
+        'recall': round(len(matched) / ref_total, 4) if ref_total else 1.0,
+        'mean_iou': round(float(np.mean(matched)), 4) if matched else None
+    }
+
+
+def violation_frames(detections, names, video_path, max_frames, camera_config):
+    """Frame numbers with violations when the tracker sees these detections"""
+    processor = VideoProcessor(model=StubDetector(detections, names=names), db_path=None,
+                               camera_config=camera_config)
+    frames = []
+    with tempfile.TemporaryDirectory() as frames_dir:
+        processor.frames_dir = Path(frames_dir)
+        for frame_number, (frame, frame_detections) in enumerate(
+                zip(read_frames(video_path, max_frames), detections), start=1):
+            if processor.handle_frame(frame, frame_detections, frame_number):
+                frames.append(frame_number)
+        processor.flush_outputs()
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video")
+    parser.add_argument("models", nargs="+", help="Model files; the first is the reference")
+    parser.add_argument("--frames", type=int, default=300, help="Frames from the start of the clip (0: all)")
+    parser.add_argument("--imgsz", type=int, nargs="+", help="Input size for the PyTorch model and dynamic exports")
+    parser.add_argument("--threads", type=int, help="CPU threads for inference")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--match-iou", type=float, default=0.5)
+    parser.add_argument("--config", help="Camera config JSON with stations")
+    parser.add_argument("--camera", help="Camera id in --config")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args()
+
+    max_frames = args.frames or None
+    imgsz = normalize_imgsz(args.imgsz)
+    camera_config = load_camera_configs(args.config).get(args.camera) if args.config else None
+    results = []
+    reference = None
+    for model in args.models:
+        stats, detections, names = run_backend(model, args.video, max_frames, imgsz, args.threads, args.warmup)
+        violations = violation_frames(detections, names, args.video, max_frames, camera_config)
+        stats['violations'] = len(violations)
+        if reference is None:
+            reference = (detections, violations)
+        else:
+            stats.update(agreement(reference[0], detections, args.match_iou))
+            stats['violation_frames_match'] = violations == reference[1]
+        results.append(stats)
+
+    print(f"{'model':40} {'load s':>7} {'ms p50':>7} {'ms p95':>7} {'fps':>7} {'dets':>7} "
+          f"{'prec':>6} {'recall':>6} {'IoU':>6} {'viol':>5}  same violations")
+    for stats in results:
+        def column(key, width):
+            value = stats.get(key)
+            return f"{'-' if value is None else value:>{width}}"
+        print(f"{stats['model'][-40:]:40} {column('load_s', 7)} {column('ms_p50', 7)} {column('ms_p95', 7)} "
+              f"{column('fps', 7)} {column('detections', 7)} {column('precision', 6)} {column('recall', 6)} "
+              f"{column('mean_iou', 6)} {column('violations', 5)}  {stats.get('violation_frames_match', 'reference')}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
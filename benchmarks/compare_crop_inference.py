@@ -0,0 +1,99 @@
+"""
+Check that ROI-cropped inference finds the same violations as full-frame inference,
+and time both. Detections centered in a station are also matched between the two
+runs (IoU >= 0.5), which checks the crops independently of the model's class names.
+
+Usage:
+    python -m benchmarks.compare_crop_inference path/to/reference_clip.mp4 [--padding 200]
+"""
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from src.video_processor import VideoProcessor
+
+
+def run(video_path, model_path, **kwargs):
+    """Process the clip and return (violation frame numbers, detections in a station per frame, seconds taken)"""
+    frames_dir = tempfile.mkdtemp(prefix="crop_compare_")
+    processor = VideoProcessor(model_path=model_path, db_path=None, frames_dir=frames_dir, **kwargs)
+    station_mask = processor.camera_config.station_mask
+
+    violation_frames = []
+    station_detections = {}
+    handle_frame = processor.handle_frame
+
+    def record(frame, detections, frame_number):
+        violations = handle_frame(frame, detections, frame_number)
+        if violations:
+            violation_frames.append(frame_number)
+        centers = ((detections[:, :2] + detections[:, 2:4]) // 2).astype(np.int64)
+        station_detections[frame_number] = detections[station_mask.contains(centers)]
+        return violations
+
+    processor.handle_frame = record
+    start = time.perf_counter()
+    try:
+        processor.run_video(video_path)
+    finally:
+        shutil.rmtree(frames_dir, ignore_errors=True)
+    return violation_frames, station_detections, time.perf_counter() - start
+
+
+def box_iou(a, b):
+    """(len(a), len(b)) IoU matrix of x1, y1, x2, y2 boxes"""
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:4], b[None, :, 2:4])
+    inter = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def matched_detections(full, cropped, threshold=0.5):
+    """Detections of the same class found by both runs with IoU >= threshold, over all frames"""
+    matched = 0
+    for frame_number, a in full.items():
+        b = cropped.get(frame_number, np.zeros((0, 6)))
+        if not len(a) or not len(b):
+            continue
+        iou = box_iou(a, b) * (a[:, None, 5] == b[None, :, 5])
+        while iou.size and iou.max() >= threshold:
+            i, j = np.unravel_index(iou.argmax(), iou.shape)
+            matched += 1
+            iou[i, :] = 0
+            iou[:, j] = 0
+    return matched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video")
+    parser.add_argument("--model", default="yolo12m-v2.pt")
+    parser.add_argument("--padding", type=int, default=200)
+    args = parser.parse_args()
+
+    full, full_detections, full_time = run(args.video, args.model)
+    cropped, cropped_detections, cropped_time = run(args.video, args.model, crop_inference=True,
+                                                    crop_padding=args.padding)
+
+    print(f"full frame: {len(full)} violations in {full_time:.1f}s")
+    print(f"cropped:    {len(cropped)} violations in {cropped_time:.1f}s ({full_time / cropped_time:.2f}x)")
+    full_count = sum(len(d) for d in full_detections.values())
+    cropped_count = sum(len(d) for d in cropped_detections.values())
+    print(f"detections in a station: {full_count} full frame, {cropped_count} cropped, "
+          f"{matched_detections(full_detections, cropped_detections)} matched")
+    if full != cropped:
+        print(f"MISMATCH: only full frame {sorted(set(full) - set(cropped))}, "
+              f"only cropped {sorted(set(cropped) - set(full))}")
+        return 1
+    print("violation frames match")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,313 @@
+"""
+Offline benchmark suite for the video pipeline and its hot functions.
+
+YOLO is replaced by a stub detector that replays recorded detections (--detections,
+see benchmarks/stub_detector.py) or synthetic ones, so no weights are needed. The
+clip is --video, or a synthetic one rendered to a temporary file.
+
+Measured:
+- run_video (the body of process_video), sequential and pipelined: frames/s, p50/p99
+  time per frame, per-stage time, peak traced memory and peak RSS
+- track_hands_and_check_violations, update_hand_tracking and
+  DetectionService.check_violation_logic: p50/p99 per call and calls/s
+
+Usage:
+    python -m benchmarks.pipeline_suite [--frames 600] [--repeat 3] [--output results.json]
+    python -m benchmarks.pipeline_suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.pipeline_suite --baseline benchmarks/baseline.json [--threshold 0.2]
+
+In regression mode the exit code is 1 if any metric is worse than the baseline by
+more than --threshold (a fraction; per metric with --metric-threshold name=0.5).
+Each metric is the best of --repeat runs; on shared or single-core machines use a
+higher --repeat before trusting a p99.
+"""
+import argparse
+import gc
+import json
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from benchmarks.stub_detector import StubDetector, synthetic_detections
+from src.detection_codec import detections_to_dicts
+from src.detection_service import DetectionService
+from src.transport import InProcessTransport
+from src.video_processor import VideoProcessor
+
+# Metric name suffixes where larger is better; everything else (ms, us, mb) is a cost
+HIGHER_IS_BETTER = ('fps', 'per_s')
+
+
+def make_video(path, num_frames, width=1280, height=720, fps=30):
+    """Render a clip with a textured background and moving blobs, so decoding has real work"""
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    rng = np.random.default_rng(0)
+    background = cv2.GaussianBlur(rng.integers(0, 255, (height, width, 3), dtype=np.uint8), (0, 0), 5)
+    for i in range(num_frames):
+        frame = background.copy()
+        for j in range(3):
+            x = int((i * (7 + j * 3) + j * 300) % width)
+            cv2.circle(frame, (x, 300 + j * 120), 40, (40 * j, 200, 255 - 40 * j), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def percentile_ms(samples, q):
+    return float(np.percentile(samples, q) * 1000) if len(samples) else 0.0
+
+
+class StageTimer:
+    """Accumulates time spent in wrapped methods of one object"""
+    def __init__(self):
+        self.seconds = {}
+
+    def wrap(self, obj, method, stage):
+        original = getattr(obj, method)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.seconds[stage] = self.seconds.get(stage, 0.0) + time.perf_counter() - start
+
+        setattr(obj, method, timed)
+
+
+def make_processor(detections, pipelined, frames_dir, stub_latency_ms):
+    return VideoProcessor(
+        model=StubDetector(detections, per_image_ms=stub_latency_ms),
+        pipelined=pipelined,
+        db_path=None,
+        frames_dir=frames_dir
+    )
+
+
+def bench_run_video(video_path, detections, pipelined, frames_dir, stub_latency_ms):
+    """One timed pass and one traced pass of run_video"""
+    processor = make_processor(detections, pipelined, frames_dir, stub_latency_ms)
+    timer = StageTimer()
+    if not pipelined:
+        timer.wrap(processor, 'infer_batch', 'infer')
+        timer.wrap(processor, 'handle_frame', 'track')
+
+    done = []
+
+    def progress(frames_done, total_frames, fps, violations):
+        done.append(time.perf_counter())
+
+    start = time.perf_counter()
+    processor.run_video(video_path, progress_callback=progress)
+    elapsed = time.perf_counter() - start
+    frame_times = np.diff([start] + done)
+
+    if pipelined:
+        stages = dict(processor.last_run_stats['stage_busy_s'])
+    else:
+        stages = {stage: round(seconds, 3) for stage, seconds in timer.seconds.items()}
+        stages['decode_and_other'] = round(elapsed - sum(timer.seconds.values()), 3)
+
+    # Memory: a separate pass, since tracing slows allocation-heavy code down
+    processor = make_processor(detections, pipelined, frames_dir, stub_latency_ms)
+    tracemalloc.start()
+    processor.run_video(video_path)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'fps': len(done) / elapsed,
+        'frame_p50_ms': percentile_ms(frame_times, 50),
+        'frame_p99_ms': percentile_ms(frame_times, 99),
+        'traced_peak_mb': traced_peak / 2 ** 20,
+        'violations': processor.violation_count,
+        'stages_s': stages
+    }
+
+
+def time_calls(call, args_list):
+    """Per-call durations of call(*args) over args_list, with the garbage collector paused as timeit does"""
+    durations = np.empty(len(args_list))
+    gc.collect()
+    gc.disable()
+    try:
+        for i, args in enumerate(args_list):
+            start = time.perf_counter()
+            call(*args)
+            durations[i] = time.perf_counter() - start
+    finally:
+        gc.enable()
+    return durations
+
+
+def call_metrics(durations):
+    return {
+        'p50_us': float(np.percentile(durations, 50) * 1e6),
+        'p99_us': float(np.percentile(durations, 99) * 1e6),
+        'calls_per_s': len(durations) / durations.sum() if durations.sum() > 0 else 0.0
+    }
+
+
+def bench_hot_functions(detections, frames_dir, workdir, calls):
+    processor = make_processor(detections, False, frames_dir, 0.0)
+    frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+    results = {}
+    # Cycle through the clip's detections until there are enough calls for a stable p99
+    detections = [detections[i % len(detections)] for i in range(max(calls, len(detections)))]
+
+    processor.reset_state()
+    durations = time_calls(processor.track_hands_and_check_violations,
+                           [(frame, d, n) for n, d in enumerate(detections, start=1)])
+    results['track_hands_and_check_violations'] = call_metrics(durations)
+
+    # update_hand_tracking gets the centers track_hands_and_check_violations would extract
+    args = []
+    for n, d in enumerate(detections, start=1):
+        centers = ((d[:, :2] + d[:, 2:4]) // 2).astype(np.int64)
+        classes = d[:, 5].astype(np.int64)
+        args.append((centers[classes == processor.class_ids['hand']],
+                     centers[classes == processor.class_ids['scooper']], n))
+    processor.reset_state()
+    results['update_hand_tracking'] = call_metrics(time_calls(processor.update_hand_tracking, args))
+
+    service = DetectionService(db_path=str(workdir / "suite.db"), frames_dir=str(frames_dir),
+                               transport=InProcessTransport())
+    names = processor.model.names
+    args = [(detections_to_dicts(d, names), None) for d in detections]
+    results['check_violation_logic'] = call_metrics(time_calls(service.check_violation_logic, args))
+    return results
+
+
+def flatten(results):
+    """Flat {metric name: value} for baseline comparison"""
+    metrics = {}
+    for mode, run in results['run_video'].items():
+        for key in ('fps', 'frame_p50_ms', 'frame_p99_ms', 'traced_peak_mb'):
+            metrics[f"run_video.{mode}.{key}"] = run[key]
+    for name, values in results['functions'].items():
+        for key, value in values.items():
+            metrics[f"{name}.{key}"] = value
+    metrics['max_rss_mb'] = results['max_rss_mb']
+    return metrics
+
+
+def best_of(runs):
+    """Best value of each metric over repeated runs, to cut scheduling noise"""
+    best = dict(runs[0])
+    for run in runs[1:]:
+        for name, value in run.items():
+            if name.endswith(HIGHER_IS_BETTER):
+                best[name] = max(best[name], value)
+            else:
+                best[name] = min(best[name], value)
+    return best
+
+
+def compare(metrics, baseline, threshold, overrides):
+    """Print a comparison table; returns the names of metrics that regressed beyond their threshold"""
+    failures = []
+    print(f"{'metric':55} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, base in sorted(baseline.items()):
+        if name not in metrics or not base:
+            continue
+        current = metrics[name]
+        change = (current - base) / abs(base)
+        worse = -change if name.endswith(HIGHER_IS_BETTER) else change
+        limit = overrides.get(name, threshold)
+        flag = ""
+        if worse > limit:
+            failures.append(name)
+            flag = f"  REGRESSION (> {limit:.0%})"
+        print(f"{name:55} {base:12.3f} {current:12.3f} {change:+8.1%}{flag}")
+    return failures
+
+
+def run_suite(args):
+    workdir = Path(tempfile.mkdtemp(prefix="pipeline_suite_"))
+    frames_dir = workdir / "frames"
+    frames_dir.mkdir()
+    try:
+        if args.video:
+            video_path = args.video
+            num_frames = int(cv2.VideoCapture(str(video_path)).get(cv2.CAP_PROP_FRAME_COUNT))
+        else:
+            video_path = workdir / "synthetic.mp4"
+            num_frames = args.frames
+            make_video(video_path, num_frames)
+        if args.detections:
+            detections = StubDetector.from_file(args.detections).frames
+        else:
+            detections = synthetic_detections(num_frames, hands=args.hands)
+
+        runs = []
+        for _ in range(args.repeat):
+            results = {
+                'run_video': {
+                    'sequential': bench_run_video(video_path, detections, False, frames_dir, args.stub_latency_ms),
+                    'pipelined': bench_run_video(video_path, detections, True, frames_dir, args.stub_latency_ms)
+                },
+                'functions': bench_hot_functions(detections, frames_dir, workdir, args.calls),
+                'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            }
+            runs.append(flatten(results))
+        return results, best_of(runs)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", help="Clip to decode (default: synthetic)")
+    parser.add_argument("--detections", help="Recorded detections .npz (default: synthetic)")
+    parser.add_argument("--frames", type=int, default=600, help="Synthetic clip length")
+    parser.add_argument("--hands", type=int, default=2, help="Hands per synthetic frame")
+    parser.add_argument("--calls", type=int, default=5000, help="Calls per hot function")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0, help="Simulated model time per image")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per metric; the best is kept")
+    parser.add_argument("--output", help="Write results JSON here")
+    parser.add_argument("--save-baseline", help="Write the metrics as a new baseline JSON")
+    parser.add_argument("--baseline", help="Compare against this baseline JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed regression as a fraction")
+    parser.add_argument("--metric-threshold", action="append", default=[], metavar="NAME=FRACTION")
+    args = parser.parse_args()
+
+    results, metrics = run_suite(args)
+    print(json.dumps(results, indent=2))
+
+    meta = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'frames': args.frames if not args.video else None,
+        'video': args.video,
+        'detections': args.detections,
+        'stub_latency_ms': args.stub_latency_ms
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps({'meta': meta, 'results': results, 'metrics': metrics}, indent=2))
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps({'meta': meta, 'metrics': metrics}, indent=2))
+        print(f"Saved baseline to {args.save_baseline}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())['metrics']
+        overrides = {}
+        for item in args.metric_threshold:
+            name, _, value = item.partition("=")
+            overrides[name] = float(value)
+        failures = compare(metrics, baseline, args.threshold, overrides)
+        if failures:
+            print(f"{len(failures)} metric(s) regressed: {', '.join(failures)}")
+            return 1
+        print("No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
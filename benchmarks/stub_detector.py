@@ -0,0 +1,121 @@
+"""
+Stand-in for the YOLO model that replays recorded or synthetic detections, so the
+pipeline can be benchmarked without weights or a GPU.
+
+Record detections of a real clip once (needs the weights):
+    python -m benchmarks.stub_detector clip.mp4 clip_detections.npz [--model yolo12m-v2.pt]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from src.detectors import DEFAULT_MODEL, Detector, add_detector_arguments, detector_kwargs, load_detector
+
+# Class names of the pizza store model
+NAMES = {0: 'hand', 1: 'person', 2: 'pizza', 3: 'scooper'}
+
+
+class StubDetector(Detector):
+    """
+    Detector returning the next frame's (N, 6) detections for each image, cycling
+    through the sequence. latency_ms adds a fixed cost per batch and per_image_ms a
+    cost per image, to mimic a real model.
+    """
+    backend = 'stub'
+
+    def __init__(self, frames, names=None, latency_ms=0.0, per_image_ms=0.0, weights_path=None):
+        super().__init__(weights_path, names or NAMES)
+        self.frames = [np.asarray(f, dtype=np.float32).reshape(-1, 6) for f in frames]
+        self.latency_ms = latency_ms
+        self.per_image_ms = per_image_ms
+        self.index = 0
+
+    def detect(self, images, sizes=None):
+        delay = self.latency_ms + self.per_image_ms * len(images)
+        if delay:
+            time.sleep(delay / 1000)
+        detections = []
+        for _ in images:
+            detections.append(self.frames[self.index % len(self.frames)])
+            self.index += 1
+        return detections
+
+    def reset(self):
+        self.index = 0
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        """Load detections saved by record_detections"""
+        data = np.load(path)
+        ends = np.cumsum(data['counts'])
+        frames = [data['detections'][end - count:end] for count, end in zip(data['counts'], ends)]
+        names = {int(i): str(name) for i, name in enumerate(data['names'])} if 'names' in data else None
+        return cls(frames, names=names, **kwargs)
+
+
+def synthetic_detections(num_frames, hands=2, scoopers=1, clutter=3, width=1280, height=720, seed=0):
+    """
+    Detections for num_frames frames: hands sweeping through the default station and
+    out of view at both ends, scoopers following some of them, and static clutter
+    (pizzas, people) that the tracker has to skip over
+    """
+    rng = np.random.default_rng(seed)
+    x = rng.uniform(220, 660, hands)
+    step = rng.choice([-12.0, 12.0], hands)
+    y = rng.uniform(420, 640, hands)
+    clutter_boxes = [
+        [cx - 40, cy - 40, cx + 40, cy + 40, 0.8, rng.choice([1, 2])]
+        for cx, cy in rng.uniform([0, 0], [width, height], size=(clutter, 2))
+    ]
+
+    frames = []
+    for _ in range(num_frames):
+        x += step
+        turn = (x < 200) | (x > 700)
+        step[turn] = -step[turn]
+        detections = list(clutter_boxes)
+        for i in range(hands):
+            if 260 <= x[i] <= 640:
+                detections.append([x[i] - 20, y[i] - 20, x[i] + 20, y[i] + 20, 0.9, 0])
+                if i < scoopers:
+                    detections.append([x[i] + 10, y[i] - 15, x[i] + 50, y[i] + 15, 0.8, 3])
+        frames.append(np.array(detections, dtype=np.float32).reshape(-1, 6))
+    return frames
+
+
+def record_detections(video_path, output_path, model_path=DEFAULT_MODEL, **detector_kwargs):
+    """Run the real model over a clip and save its per-frame detections for StubDetector.from_file"""
+    import cv2
+
+    model = load_detector(model_path, **detector_kwargs)
+    cap = cv2.VideoCapture(str(video_path))
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(model.detect([frame])[0].astype(np.float32).reshape(-1, 6))
+    cap.release()
+
+    np.savez_compressed(
+        output_path,
+        detections=np.concatenate(frames) if frames else np.zeros((0, 6), dtype=np.float32),
+        counts=np.array([len(f) for f in frames], dtype=np.int64),
+        names=np.array([model.names[i] for i in sorted(model.names)])
+    )
+    return len(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video")
+    parser.add_argument("output")
+    add_detector_arguments(parser)
+    args = parser.parse_args()
+    count = record_detections(args.video, args.output, args.model, **detector_kwargs(args))
+    print(f"Recorded {count} frames to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from pathlib import Path
+
+from src.detectors import add_detector_arguments, detector_kwargs
+from src.upload_store import VIDEO_SUFFIXES
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Per worker process: the shared model, settings, and one VideoProcessor per camera
+_worker = None
+
+
+def video_key(path):
+    """
+    Identity of a video file for the results index: its absolute path, size and
+    modification time. Cheap for weeks of footage, and a changed file runs again.
+    """
+    stat = path.stat()
+    return hashlib.sha1(f"{path.resolve()}|{stat.st_size}|{stat.st_mtime_ns}".encode()).hexdigest()[:16]
+
+
+def find_videos(source, camera=None, camera_from_dir=False):
+    """
+    Videos to process as [{'path', 'camera_id'}]. source is a directory, searched
+    recursively, or a manifest with one path per line, optionally as camera_id=path.
+    Relative manifest paths are relative to the manifest. Blank lines and # comments
+    are skipped.
+    """
+    source = Path(source)
+    videos = []
+    if source.is_dir():
+        for path in sorted(source.rglob("*")):
+            if path.suffix.lower() in VIDEO_SUFFIXES and not path.name.startswith("."):
+                camera_id = path.parent.name if camera_from_dir and path.parent != source else camera
+                videos.append({'path': path, 'camera_id': camera_id})
+        return videos
+
+    for line in source.read_text().splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        camera_id, separator, path = line.partition("=")
+        if not separator or "/" in camera_id:
+            camera_id, path = camera, line
+        path = Path(path)
+        if not path.is_absolute():
+            path = source.parent / path
+        videos.append({'path': path, 'camera_id': camera_id or camera})
+    return videos
+
+
+class ResultsIndex:
+    """
+    Append-only JSON-lines record of finished videos in the output directory. Each
+    line is flushed and synced as its video finishes, so a crash loses at most the
+    videos in progress. The last entry per video key wins.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Partial line written when the previous run was killed
+                        continue
+                    self.entries[entry['key']] = entry
+        self.file = open(self.path, "a")
+
+    def completed(self, key):
+        entry = self.entries.get(key)
+        return entry is not None and entry['status'] == 'completed'
+
+    def add(self, entry):
+        self.entries[entry['key']] = entry
+        self.file.write(json.dumps(entry) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+def _init_worker(model_path, detector_options, processor_kwargs, config_path):
+    """Load the model once per worker process; processors for each camera share it"""
+    global _worker
+    from src.camera_config import load_camera_configs
+    from src.detectors import load_detector
+    started = time.perf_counter()
+    model = load_detector(model_path, **detector_options)
+    model.warmup()
+    _worker = {
+        'model': model,
+        'processor_kwargs': processor_kwargs,
+        'configs': load_camera_configs(config_path) if config_path else {},
+        'processors': {}
+    }
+    logger.info(f"Worker {os.getpid()} loaded {model_path} in {time.perf_counter() - started:.2f}s")
+
+
+def _processor_for(camera_id):
+    from src.video_processor import VideoProcessor
+    processor = _worker['processors'].get(camera_id)
+    if processor is None:
+        config = _worker['configs'].get(camera_id)
+        if camera_id is not None and config is None and _worker['configs']:
+            raise ValueError(f"Camera {camera_id} is not in the camera config")
+        processor = VideoProcessor(model=_worker['model'], camera_id=camera_id, camera_config=config,
+                                   **_worker['processor_kwargs'])
+        _worker['processors'][camera_id] = processor
+    return processor
+
+
+def _process_video(path, camera_id, key):
+    """Process one video in a worker process and return its results entry"""
+    started = time.perf_counter()
+    entry = {
+        'key': key,
+        'path': path,
+        'camera_id': camera_id,
+        'pid': os.getpid(),
+        'started_at': datetime.now().isoformat(timespec='seconds')
+    }
+    try:
+        from src.video_processor import video_fps
+        processor = _processor_for(camera_id)
+        processor.reset_state()
+        # Violations are keyed by the video, so reprocessing one cut short by a crash adds no duplicates
+        processor.run_id = key
+        violation_count = processor.run_video(path)
+        stats = processor.last_run_stats or {}
+        fps = video_fps(path)
+        entry.update({
+            'status': 'completed',
+            'violation_count': violation_count,
+            'frames': stats.get('frames', 0),
+            'video_seconds': round(stats.get('frames', 0) / fps, 2) if fps else None,
+            'fps': stats.get('fps', 0.0)
+        })
+        if 'clips' in stats:
+            entry['clips'] = stats['clips']['clips_written']
+    except Exception as e:
+        logger.error(f"Failed to process {path}: {e}")
+        entry.update({'status': 'failed', 'error': str(e) or type(e).__name__})
+    entry['elapsed_s'] = round(time.perf_counter() - started, 2)
+    return entry
+
+
+def summarize(entries, wall_seconds, workers):
+    """Throughput of this run's entries"""
+    completed = [e for e in entries if e['status'] == 'completed']
+    frames = sum(e['frames'] for e in completed)
+    video_seconds = sum(e['video_seconds'] or 0 for e in completed)
+    busy_seconds = sum(e['elapsed_s'] for e in entries)
+    return {
+        'videos_completed': len(completed),
+        'videos_failed': len(entries) - len(completed),
+        'violations': sum(e['violation_count'] for e in completed),
+        'frames': frames,
+        'video_hours': round(video_seconds / 3600, 3),
+        'wall_s': round(wall_seconds, 1),
+        'workers': workers,
+        'fps': round(frames / wall_seconds, 1) if wall_seconds > 0 else 0.0,
+        'fps_per_worker': round(frames / busy_seconds, 1) if busy_seconds > 0 else 0.0,
+        # Seconds of footage processed per second of wall time
+        'realtime_factor': round(video_seconds / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+        'worker_utilization': round(busy_seconds / (wall_seconds * workers), 3) if wall_seconds > 0 else 0.0
+    }
+
+
+def write_results(output_dir, index, summary, settings):
+    """Consolidated results of every video in the index, next to it as results.json"""
+    videos = sorted(index.entries.values(), key=lambda entry: entry['path'])
+    totals = {
+        'videos': len(videos),
+        'completed': sum(1 for e in videos if e['status'] == 'completed'),
+        'failed': sum(1 for e in videos if e['status'] == 'failed'),
+        'violations': sum(e.get('violation_count', 0) for e in videos if e['status'] == 'completed')
+    }
+    results = {'settings': settings, 'totals': totals, 'last_run': summary, 'videos': videos}
+    path = output_dir / "results.json"
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(results, indent=2))
+    os.replace(tmp_path, path)
+    return path
+
+
+def check_settings(output_dir, settings, force=False):
+    """Refuse to mix results of different settings in one output directory"""
+    path = output_dir / "settings.json"
+    if path.exists():
+        previous = json.loads(path.read_text())
+        if previous != settings and not force:
+            raise SystemExit(f"{output_dir} holds results from other settings ({path}); "
+                             f"use another --output, or --force to continue anyway")
+    path.write_text(json.dumps(settings, indent=2))
+
+
+def run_batch(videos, output_dir, workers, model_path, detector_options, processor_kwargs, config_path):
+    """
+    Process the videos not completed in output_dir's index across worker processes,
+    each with its own model. Returns (this run's entries, wall seconds, videos skipped, index).
+    """
+    index = ResultsIndex(output_dir / "index.jsonl")
+    pending = []
+    skipped = 0
+    for video in videos:
+        path = video['path']
+        if not path.exists():
+            logger.warning(f"Skipping missing video {path}")
+            continue
+        key = video_key(path)
+        if index.completed(key):
+            skipped += 1
+        else:
+            pending.append((path.stat().st_size, str(path), video['camera_id'], key))
+    # Longest first, so one long recording doesn't start last and hold up the end of the run
+    pending.sort(reverse=True)
+    total_bytes = sum(size for size, *_ in pending)
+    logger.info(f"{len(pending)} videos to process ({total_bytes / 2 ** 30:.1f} GB), "
+                f"{skipped} already done, {workers} workers")
+
+    entries = []
+    started = time.perf_counter()
+    done_bytes = 0
+    context = multiprocessing.get_context("spawn")
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(model_path, detector_options, processor_kwargs, config_path)
+    )
+    try:
+        futures = {executor.submit(_process_video, path, camera_id, key): size
+                   for size, path, camera_id, key in pending}
+        for future in as_completed(futures):
+            entry = future.result()
+            index.add(entry)
+            entries.append(entry)
+            done_bytes += futures[future]
+            elapsed = time.perf_counter() - started
+            eta = elapsed / done_bytes * (total_bytes - done_bytes) if done_bytes else 0
+            if entry['status'] == 'completed':
+                logger.info(f"[{len(entries)}/{len(pending)}] {entry['path']}: {entry['violation_count']} violations, "
+                            f"{entry['frames']} frames at {entry['fps']} fps (ETA {eta / 60:.0f} min)")
+            else:
+                logger.info(f"[{len(entries)}/{len(pending)}] {entry['path']} failed: {entry['error']}")
+    except BrokenProcessPool:
+        # A worker died (out of memory, killed) or failed to load the model; finished videos are in the index
+        logger.error("A worker process died; run the same command again to resume")
+    except KeyboardInterrupt:
+        logger.info("Interrupted; run the same command again to resume")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        index.close()
+    return entries, time.perf_counter() - started, skipped, index
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Process archived recordings offline across worker processes. "
+                    "Runs can be interrupted and resumed: videos already in the output's "
+                    "results index are skipped."
+    )
+    parser.add_argument("source", help="Directory of videos (searched recursively) or a manifest of paths")
+    parser.add_argument("--output", default="batch_results",
+                        help="Results index, results.json, violations.db and violation frames")
+    parser.add_argument("--workers", type=int, default=2, help="Worker processes, each with its own model")
+    add_detector_arguments(parser)
+    parser.add_argument("--config", help="Camera config JSON with stations")
+    parser.add_argument("--camera", help="Camera id for videos without one")
+    parser.add_argument("--camera-from-dir", action="store_true",
+                        help="Use each video's directory name as its camera id")
+    parser.add_argument("--pipelined", action="store_true")
+    parser.add_argument("--motion-gating", action="store_true")
+    parser.add_argument("--clips", action="store_true", help="Also write MP4 clips around violations")
+    parser.add_argument("--detection-cache", help="Detection cache directory, to replay videos after rule changes")
+    parser.add_argument("--force", action="store_true", help="Continue in an output directory with other settings")
+    args = parser.parse_args()
+
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    videos = find_videos(args.source, args.camera, args.camera_from_dir)
+    if not videos:
+        parser.error(f"no videos found in {args.source}")
+
+    detector_options = detector_kwargs(args)
+    processor_kwargs = {
+        'pipelined': args.pipelined,
+        'motion_gating': args.motion_gating,
+        'violation_clips': args.clips,
+        'detection_cache': args.detection_cache,
+        'db_path': str(output_dir / "violations.db"),
+        'frames_dir': str(output_dir / "violation_frames"),
+        'clips_dir': str(output_dir / "violation_clips")
+    }
+    # What the results depend on; the output directory keeps results of one set of these
+    settings = json.loads(json.dumps({
+        'model': args.model,
+        **{key: value for key, value in detector_options.items() if key != 'threads'},
+        'config': str(Path(args.config).resolve()) if args.config else None,
+        'motion_gating': args.motion_gating
+    }))
+    check_settings(output_dir, settings, args.force)
+
+    entries, wall_seconds, skipped, index = run_batch(videos, output_dir, args.workers, args.model,
+                                                       detector_options, processor_kwargs, args.config)
+    summary = summarize(entries, wall_seconds, args.workers)
+    summary['videos_skipped'] = skipped
+    results_path = write_results(output_dir, index, summary, settings)
+
+    print(f"{summary['videos_completed']} videos processed, {summary['videos_failed']} failed, "
+          f"{skipped} already done; {summary['violations']} violations")
+    print(f"{summary['frames']} frames ({summary['video_hours']} h of video) in {summary['wall_s']}s: "
+          f"{summary['fps']} fps, {summary['fps_per_worker']} fps per worker, "
+          f"{summary['realtime_factor']}x real time, {summary['worker_utilization']:.0%} worker utilization")
+    print(f"Results: {results_path}")
+    if summary['videos_failed'] or len(entries) + skipped < len(videos):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class BroadcastClient:
+    """
+    One WebSocket client with its own bounded send queue and sender task.
+    When the queue is full the oldest pending message is dropped.
+    """
+    def __init__(self, websocket, queue_size):
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.sent = 0
+        self.task = None
+        self.closed = False
+
+    def enqueue(self, message):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+
+class Broadcaster:
+    """
+    Fans events out to WebSocket clients: each event is serialized once, every
+    client drains its own queue, and clients that cannot keep up are disconnected
+    """
+    def __init__(self, queue_size=32, send_timeout=5.0, max_dropped=256):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout  # A single send taking longer marks the client as stuck
+        self.max_dropped = max_dropped  # Total drops after which a client counts as too slow
+        self.clients = set()
+        self.loop = None
+        self.events_published = 0
+        self.clients_disconnected = 0
+
+    def bind_loop(self, loop):
+        """Event loop that publish_threadsafe hands events to"""
+        self.loop = loop
+
+    async def connect(self, websocket):
+        """Accept a WebSocket and start its sender task"""
+        await websocket.accept()
+        self.loop = self.loop or asyncio.get_running_loop()
+        client = BroadcastClient(websocket, self.queue_size)
+        client.task = asyncio.create_task(self._sender(client))
+        self.clients.add(client)
+        return client
+
+    async def _sender(self, client):
+        try:
+            while True:
+                message = await client.queue.get()
+                await asyncio.wait_for(client.websocket.send_text(message), timeout=self.send_timeout)
+                client.sent += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.info(f"Dropping WebSocket client after failed send: {e!r}")
+            await self._close(client)
+
+    async def _close(self, client):
+        if self.remove(client):
+            try:
+                await client.websocket.close()
+            except Exception:
+                pass
+
+    def remove(self, client):
+        """Forget a client and stop its sender; returns False if it was already gone"""
+        if client.closed:
+            return False
+        client.closed = True
+        self.clients.discard(client)
+        self.clients_disconnected += 1
+        if client.task is not None and client.task is not asyncio.current_task():
+            client.task.cancel()
+        return True
+
+    def publish(self, event):
+        """Queue an event for every client; must be called on the event loop thread"""
+        message = event if isinstance(event, str) else json.dumps(event)
+        self.events_published += 1
+        for client in list(self.clients):
+            client.enqueue(message)
+            if client.dropped > self.max_dropped:
+                logger.info(f"Disconnecting slow WebSocket client ({client.dropped} events dropped)")
+                asyncio.ensure_future(self._close(client))
+
+    def publish_threadsafe(self, event):
+        """Queue an event from any thread (processors, job event pump)"""
+        if self.loop is None:
+            return
+        message = event if isinstance(event, str) else json.dumps(event)
+        self.loop.call_soon_threadsafe(self.publish, message)
+
+    def metrics(self):
+        return {
+            'clients': len(self.clients),
+            'events_published': self.events_published,
+            'clients_disconnected': self.clients_disconnected,
+            'events_dropped': sum(client.dropped for client in self.clients),
+            'max_queue_depth': max((client.queue.qsize() for client in self.clients), default=0)
+        }
@@ -0,0 +1,113 @@
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+
+from src.region_mask import RegionMask
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Thresholds used when neither the station nor the camera overrides them
+DEFAULT_THRESHOLDS = {
+    'hand_match_distance': 50,  # Maximum distance for the same hand between frames
+    'scooper_distance': 100,  # Scooper near a hand leaving the station
+    'bare_hand_scooper_distance': 80,  # Scooper near a hand inside the station (DetectionService)
+}
+
+DEFAULT_STATION = {
+    'name': 'ingredients',
+    'polygon': [(400, 260), (560, 260), (460, 740), (300, 740)],
+}
+
+
+def _threshold(owner, key, value, default):
+    """value, or default when unset; 0 is a valid setting, negative values are rejected"""
+    if value is None:
+        return default
+    if value < 0:
+        raise ValueError(f"{owner} has a negative {key}: {value}")
+    return value
+
+
+class Station:
+    """
+    A named ingredient area with its own polygon and distance thresholds
+    """
+    def __init__(self, name, polygon, hand_match_distance=None, scooper_distance=None,
+                 bare_hand_scooper_distance=None):
+        self.name = name
+        self.polygon = np.array(polygon, dtype=np.int32).reshape(-1, 2)
+        if len(self.polygon) < 3:
+            raise ValueError(f"Station {name} needs at least 3 polygon points")
+        owner = f"Station {name}"
+        self.hand_match_distance = _threshold(owner, 'hand_match_distance', hand_match_distance,
+                                              DEFAULT_THRESHOLDS['hand_match_distance'])
+        self.scooper_distance = _threshold(owner, 'scooper_distance', scooper_distance,
+                                           DEFAULT_THRESHOLDS['scooper_distance'])
+        self.bare_hand_scooper_distance = _threshold(owner, 'bare_hand_scooper_distance', bare_hand_scooper_distance,
+                                                     DEFAULT_THRESHOLDS['bare_hand_scooper_distance'])
+
+
+class CameraConfig:
+    """
+    Stations and violation settings for one camera, with a precomputed mask that
+    maps any point to the station containing it in O(1)
+    """
+    def __init__(self, camera_id, stations, violation_cooldown=30, source=None):
+        if not stations:
+            raise ValueError(f"Camera {camera_id} has no stations")
+        self.camera_id = camera_id
+        self.stations = stations
+        # Frames between violations at one station
+        self.violation_cooldown = _threshold(f"Camera {camera_id}", 'violation_cooldown', violation_cooldown, 30)
+        self.source = source
+        self.station_mask = RegionMask([station.polygon for station in stations])
+
+    @property
+    def polygons(self):
+        return [station.polygon for station in self.stations]
+
+    def station_names(self, indices):
+        """Map station indices from station_mask.lookup to names (None outside every station)"""
+        return [self.stations[i].name if i >= 0 else None for i in indices]
+
+    @classmethod
+    def from_roi(cls, camera_id=None, roi=None):
+        """Single-station config, the layout the processor used before config files existed"""
+        return cls(camera_id, [Station(DEFAULT_STATION['name'], roi if roi is not None else DEFAULT_STATION['polygon'])])
+
+    @classmethod
+    def from_dict(cls, camera_id, data, defaults=None):
+        thresholds = dict(DEFAULT_THRESHOLDS, **(defaults or {}))
+        thresholds.update({k: data[k] for k in DEFAULT_THRESHOLDS if k in data})
+        stations = []
+        for index, station in enumerate(data.get('stations', [])):
+            stations.append(Station(
+                station.get('name', f"station_{index + 1}"),
+                station['polygon'],
+                **{k: station.get(k, thresholds[k]) for k in DEFAULT_THRESHOLDS}
+            ))
+        return cls(
+            camera_id,
+            stations,
+            violation_cooldown=data.get('violation_cooldown', (defaults or {}).get('violation_cooldown', 30)),
+            source=data.get('source')
+        )
+
+
+def load_camera_configs(path):
+    """
+    Load {camera_id: CameraConfig} from a JSON file shaped like:
+    {"defaults": {...thresholds...}, "cameras": {"cam1": {"source": ..., "stations": [...]}}}
+    """
+    data = json.loads(Path(path).read_text())
+    defaults = data.get('defaults', {})
+    configs = {
+        str(camera_id): CameraConfig.from_dict(str(camera_id), camera, defaults)
+        for camera_id, camera in data.get('cameras', {}).items()
+    }
+    logger.info(f"Loaded {len(configs)} camera config(s) from {path}")
+    return configs
@@ -0,0 +1,266 @@
+import cv2
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from src import metrics
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CLIPS_WRITTEN = metrics.counter('pizza_violation_clips_total', 'Violation clips written')
+
+# Slots the encoder needs at least, so a clip can make progress while the ring holds the rest
+MIN_ENCODER_SLOTS = 4
+
+
+class FrameRing:
+    """
+    The most recent frames in one preallocated (capacity, H, W, 3) array. push() copies
+    a frame into the oldest slot, so keeping frames costs no allocation per frame.
+    """
+    def __init__(self, capacity, shape, dtype=np.uint8):
+        self.buffer = np.empty((capacity, *shape), dtype=dtype)
+        self.numbers = np.full(capacity, -1, dtype=np.int64)  # Frame number in each slot
+        self.capacity = capacity
+        self.next = 0
+
+    def push(self, frame_number, frame):
+        np.copyto(self.buffer[self.next], frame)
+        self.numbers[self.next] = frame_number
+        self.next = (self.next + 1) % self.capacity
+
+    def since(self, first_number):
+        """(frame_number, frame view) of the kept frames numbered first_number or later, oldest first"""
+        order = np.roll(np.arange(self.capacity), -self.next)
+        return [(int(self.numbers[i]), self.buffer[i]) for i in order if self.numbers[i] >= first_number]
+
+    def clear(self):
+        self.numbers.fill(-1)
+        self.next = 0
+
+
+class _Clip:
+    def __init__(self, path, first, end):
+        self.path = path
+        self.first = first  # First frame number in the clip
+        self.end = end  # Last frame number of the clip unless another violation extends it
+        self.written_until = first - 1  # Last frame number queued for encoding
+        self.violations = 0
+
+
+class ClipRecorder:
+    """
+    Writes a short MP4 around each violation from the frames already decoded for
+    processing, so the source video is never read again. Frames are kept in a
+    FrameRing. A violation opens a clip from pre_seconds before it to post_seconds
+    after it. A violation within pre_seconds of the clip's end extends the clip, so
+    overlapping violations share one, up to max_seconds per clip. Frames are copied
+    into a preallocated slot pool and encoded on a background thread.
+
+    Ring and pool together stay within max_bytes. When the budget can't hold
+    pre_seconds of frames, the lead-in gets shorter. When the encoder falls behind,
+    processing waits for a free slot rather than cutting frames from a clip.
+    """
+    def __init__(self, clips_dir="violation_clips", pre_seconds=2.0, post_seconds=2.0, max_seconds=30.0,
+                 max_bytes=256 * 2 ** 20, codec="mp4v"):
+        self.clips_dir = Path(clips_dir)
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self.fourcc = cv2.VideoWriter_fourcc(*codec)
+
+        self.fps = 30.0
+        self.camera_id = None
+        self.active = False
+        self.ring = None
+        self.pool = None  # Encoder slots: (slots, H, W, 3)
+        self.buffer_key = None  # (frame shape, pre_frames) the buffers were sized for
+        self.free_slots = queue.Queue()
+        self.clip = None
+        self.pre_frames = 0
+        self.post_frames = 0
+        self.max_frames = 0
+        self.disabled = False  # Frames of buffer_key's shape don't fit the budget
+        self.pending_annotation = None  # (frame_number, annotate) of a violation frame not added yet
+
+        self.queue = queue.Queue()
+        self.clips_written = 0
+        self.frames_encoded = 0
+        self.encode_time = 0.0
+        self.slot_waits = 0
+
+        self.thread = threading.Thread(target=self._run, name="clip-encoder", daemon=True)
+        self.thread.start()
+
+    def start_run(self, fps=None, camera_id=None):
+        """Begin a video or feed; fps sets the clip frame rate and how many frames pre/post_seconds are"""
+        self.finish()
+        self.fps = fps if fps and fps > 0 else 30.0
+        self.camera_id = camera_id
+        self.pre_frames = int(round(self.pre_seconds * self.fps))
+        self.post_frames = int(round(self.post_seconds * self.fps))
+        self.max_frames = int(round(self.max_seconds * self.fps))
+        if self.ring is not None:
+            self.ring.clear()
+        self.active = True
+
+    def _allocate(self, frame):
+        """Size the ring and slot pool for this frame shape within max_bytes"""
+        self.queue.join()  # The old pool may still be in use by the encoder
+        self.ring = self.pool = None
+        self.buffer_key = (frame.shape, self.pre_frames)
+        frames = self.max_bytes // frame.nbytes
+        if frames < MIN_ENCODER_SLOTS + 1:
+            logger.warning(f"Clip memory budget of {self.max_bytes / 2 ** 20:.0f} MB is too small "
+                           f"for {frame.shape[1]}x{frame.shape[0]} frames; violation clips are off")
+            self.disabled = True
+            return False
+        ring_frames = min(self.pre_frames + 1, frames - MIN_ENCODER_SLOTS)
+        if ring_frames < self.pre_frames + 1:
+            logger.warning(f"Clip memory budget holds {ring_frames - 1} frames of lead-in "
+                           f"instead of {self.pre_frames}")
+        self.ring = FrameRing(ring_frames, frame.shape, frame.dtype)
+        self.pool = np.empty((frames - ring_frames, *frame.shape), dtype=frame.dtype)
+        self.free_slots = queue.Queue()
+        for slot in range(len(self.pool)):
+            self.free_slots.put(slot)
+        self.disabled = False
+        logger.info(f"Clip buffers: {ring_frames} ring frames and {len(self.pool)} encoder slots, "
+                    f"{(self.ring.buffer.nbytes + self.pool.nbytes) / 2 ** 20:.0f} MB")
+        return True
+
+    def _ready_for(self, frame):
+        if not self.active or frame is None:
+            return False
+        if self.buffer_key != (frame.shape, self.pre_frames):
+            self._close()
+            return self._allocate(frame)
+        return not self.disabled
+
+    def violation(self, frame_number, frame, annotate=None):
+        """
+        Note a violation at frame_number, before add() is called for that frame. Returns
+        the path the clip will be written to, or None while clips are off.
+        """
+        if not self._ready_for(frame):
+            return None
+        clip = self.clip
+        if (clip is None or frame_number - self.ring.capacity + 1 > clip.end
+                or frame_number + self.post_frames - clip.first >= self.max_frames):
+            self._close()
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            suffix = f"_{self.camera_id}" if self.camera_id else ""
+            path = self.clips_dir / f"clip_{frame_number}_{timestamp}{suffix}.mp4"
+            clip = self.clip = _Clip(path, max(1, frame_number - self.pre_frames), frame_number + self.post_frames)
+            self.clips_dir.mkdir(parents=True, exist_ok=True)
+            self.queue.put(('open', path, frame.shape))
+        clip.end = max(clip.end, frame_number + self.post_frames)
+        clip.violations += 1
+        # Frames from the ring that aren't in the clip yet: the lead-in, or the gap since its last frame
+        for number, kept in self.ring.since(clip.written_until + 1):
+            self._queue_frame(number, kept)
+        self.pending_annotation = (frame_number, annotate)
+        return str(clip.path)
+
+    def add(self, frame_number, frame):
+        """Keep a processed frame; frames inside an open clip are queued for encoding"""
+        if not self._ready_for(frame):
+            return
+        self.ring.push(frame_number, frame)
+        clip = self.clip
+        if clip is None:
+            return
+        if frame_number <= clip.end:
+            annotate = None
+            if self.pending_annotation is not None and self.pending_annotation[0] == frame_number:
+                annotate = self.pending_annotation[1]
+                self.pending_annotation = None
+            self._queue_frame(frame_number, frame, annotate)
+        elif frame_number - clip.end >= self.ring.capacity - 1:
+            # Past the point where a new violation could still reach back into this clip
+            self._close()
+
+    def _queue_frame(self, frame_number, frame, annotate=None):
+        try:
+            slot = self.free_slots.get_nowait()
+        except queue.Empty:
+            self.slot_waits += 1
+            slot = self.free_slots.get()
+        np.copyto(self.pool[slot], frame)
+        self.queue.put(('frame', slot, annotate))
+        self.clip.written_until = frame_number
+
+    def _close(self):
+        if self.clip is not None:
+            self.queue.put(('close', self.clip.path, self.clip.violations))
+            self.clip = None
+
+    def finish(self):
+        """Close the open clip (cut short at the end of the video) and wait for the encoder"""
+        self._close()
+        self.active = False
+        self.pending_annotation = None
+        self.queue.join()
+
+    def _run(self):
+        writer = None
+        tmp_path = None
+        while True:
+            item = self.queue.get()
+            try:
+                if item[0] == 'open':
+                    _, path, shape = item
+                    # Written under a hidden name and renamed when complete
+                    tmp_path = path.with_name(f".{path.name}")
+                    writer = cv2.VideoWriter(str(tmp_path), self.fourcc, self.fps, (shape[1], shape[0]))
+                    if not writer.isOpened():
+                        logger.error(f"Failed to open clip writer for {path}")
+                        writer = None
+                elif item[0] == 'frame':
+                    _, slot, annotate = item
+                    try:
+                        if writer is not None:
+                            start = time.perf_counter()
+                            image = self.pool[slot]
+                            if annotate is not None:
+                                annotate(image)
+                            writer.write(image)
+                            self.encode_time += time.perf_counter() - start
+                            self.frames_encoded += 1
+                    finally:
+                        self.free_slots.put(slot)
+                elif item[0] == 'close':
+                    _, path, violations = item
+                    if writer is not None:
+                        writer.release()
+                        writer = None
+                        os.replace(tmp_path, path)
+                        self.clips_written += 1
+                        CLIPS_WRITTEN.inc()
+                        logger.info(f"Wrote violation clip {path} ({violations} violation(s))")
+            except Exception as e:
+                logger.error(f"Failed to write violation clip: {e}")
+            finally:
+                self.queue.task_done()
+
+    def metrics(self):
+        encoded = self.frames_encoded
+        memory = 0
+        if self.ring is not None:
+            memory = self.ring.buffer.nbytes + self.pool.nbytes
+        return {
+            'clips_written': self.clips_written,
+            'frames_encoded': encoded,
+            'encode_ms_avg': round(self.encode_time / encoded * 1000, 2) if encoded else 0.0,
+            'slot_waits': self.slot_waits,
+            'buffer_mb': round(memory / 2 ** 20, 1)
+        }
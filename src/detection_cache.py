@@ -0,0 +1,222 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_HASH_CHUNK = 4 * 1024 * 1024
+
+
+def file_digest(path):
+    """sha256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CacheEntry:
+    """
+    Cached detections of one video: a memory-mapped (N, 6) float32 array of
+    x1, y1, x2, y2, confidence, class rows and the row offsets of frames 1..frames
+    """
+    def __init__(self, path, meta):
+        self.path = path
+        self.meta = meta
+        self.detections = np.load(path / "detections.npy", mmap_mode="r")
+        self.offsets = np.load(path / "offsets.npy")
+        if (self.detections.ndim != 2 or self.detections.shape[1] != 6 or len(self.offsets) == 0
+                or self.offsets[-1] != len(self.detections) or self.frames != meta.get('frames', self.frames)):
+            raise ValueError(f"Detections and offsets of {path.name} do not match")
+
+    @property
+    def frames(self):
+        return len(self.offsets) - 1
+
+    def frame(self, frame_number):
+        """Detections of a frame (numbered from 1)"""
+        return self.detections[self.offsets[frame_number - 1]:self.offsets[frame_number]]
+
+
+class CacheRecorder:
+    """Collects one run's per-frame detections; commit() stores them only if every frame was seen"""
+    def __init__(self, cache, key, meta):
+        self.cache = cache
+        self.key = key
+        self.meta = meta
+        self.arrays = []
+        self.complete = True
+
+    def add(self, frame_number, detections):
+        if frame_number != len(self.arrays) + 1:
+            # Skipped frames (e.g. motion gating) cannot be replayed faithfully
+            self.complete = False
+            return
+        self.arrays.append(np.asarray(detections, dtype=np.float32).reshape(-1, 6))
+
+    def commit(self):
+        if not self.complete or not self.arrays:
+            return None
+        return self.cache.store(self.key, self.arrays, self.meta)
+
+
+class DetectionCache:
+    """
+    On-disk cache of per-frame model detections, keyed by video content hash, model
+    file hash and the inference settings that change detections. Entries are
+    evicted least recently used first once the cache exceeds max_bytes. Several
+    processes can share a cache directory: every file is written under a unique
+    temporary name and renamed into place, and no file is updated read-modify-write.
+    """
+    def __init__(self, cache_dir="detection_cache", max_bytes=2 * 1024 ** 3):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # One file per hashed path, so processes never rewrite each other's digests
+        self.digests_dir = self.cache_dir / "digests"
+        self.digests_dir.mkdir(exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def digest(self, path):
+        """Content hash of a file, remembered by (path, size, mtime) so large videos are hashed once"""
+        path = Path(path).resolve()
+        stat = path.stat()
+        fingerprint = f"{path}|{stat.st_size}|{stat.st_mtime_ns}"
+        digest_path = self.digests_dir / f"{hashlib.sha1(str(path).encode()).hexdigest()}.json"
+        known = self._read_json(digest_path)
+        if known is not None and known.get('fingerprint') == fingerprint:
+            return known['sha256']
+        value = file_digest(path)
+        # Replaces the digest of an older version of the file; concurrent writers write the same value
+        self._write_json(digest_path, {'fingerprint': fingerprint, 'sha256': value})
+        return value
+
+    def key(self, video_path, model_path, settings=None):
+        """
+        Cache key and metadata for a video/model pair, or (None, None) when the model
+        has no file to identify it by
+        """
+        if not model_path or not Path(model_path).is_file():
+            return None, None
+        meta = {
+            'video': str(video_path),
+            'video_sha256': self.digest(video_path),
+            'model': str(Path(model_path).resolve()),
+            'model_sha256': self.digest(model_path),
+            'settings': settings or {}
+        }
+        key_source = json.dumps([meta['video_sha256'], meta['model_sha256'], meta['settings']], sort_keys=True)
+        return hashlib.sha256(key_source.encode()).hexdigest()[:32], meta
+
+    def get(self, key):
+        """The entry for key, or None"""
+        if key is None:
+            return None
+        path = self.cache_dir / key
+        meta = self._read_json(path / "meta.json")
+        if meta is None:
+            self.misses += 1
+            return None
+        meta['last_used'] = time.time()
+        try:
+            entry = CacheEntry(path, meta)
+            self._write_json(path / "meta.json", meta)
+        except OSError:
+            # Replaced or evicted by another process in the meantime
+            self.misses += 1
+            return None
+        except (ValueError, EOFError) as e:
+            # Truncated or corrupt files; the next complete run stores the entry again
+            logger.warning(f"Ignoring broken cache entry {key}: {e}")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def recorder(self, key, meta):
+        return CacheRecorder(self, key, meta)
+
+    def store(self, key, arrays, meta):
+        """Write an entry atomically, drop stale entries of the same video and model file, then evict"""
+        detections = np.concatenate(arrays) if arrays else np.zeros((0, 6), dtype=np.float32)
+        offsets = np.zeros(len(arrays) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(a) for a in arrays])
+
+        tmp = self.cache_dir / f".{key}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        tmp.mkdir(parents=True)
+        np.save(tmp / "detections.npy", detections)
+        np.save(tmp / "offsets.npy", offsets)
+        meta = dict(meta, frames=len(arrays), created=time.time(), last_used=time.time(),
+                    bytes=detections.nbytes + offsets.nbytes)
+        self._write_json(tmp / "meta.json", meta)
+
+        path = self.cache_dir / key
+        with self.lock:
+            shutil.rmtree(path, ignore_errors=True)
+            try:
+                os.replace(tmp, path)
+            except OSError:
+                # Another process stored the same entry in the meantime; its detections are the same
+                shutil.rmtree(tmp, ignore_errors=True)
+            # The model file changed since these were recorded: they can never be hit again
+            for entry_key, entry in self._entries():
+                if (entry_key != key and entry.get('video_sha256') == meta['video_sha256']
+                        and entry.get('model') == meta['model']
+                        and entry.get('model_sha256') != meta['model_sha256']):
+                    logger.info(f"Dropping detections of {entry['video']} from a previous version of {entry['model']}")
+                    shutil.rmtree(self.cache_dir / entry_key, ignore_errors=True)
+            self._evict()
+        logger.info(f"Cached detections of {meta['frames']} frames ({meta['bytes'] / 2 ** 20:.1f} MB) as {key}")
+        return path
+
+    def _entries(self):
+        for path in self.cache_dir.iterdir():
+            if path.is_dir() and not path.name.startswith(".") and path != self.digests_dir:
+                meta = self._read_json(path / "meta.json")
+                if meta is not None:
+                    yield path.name, meta
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda item: item[1].get('last_used', 0))
+        total = sum(meta.get('bytes', 0) for _, meta in entries)
+        for key, meta in entries:
+            if total <= self.max_bytes:
+                break
+            logger.info(f"Evicting cached detections {key} ({meta['video']})")
+            shutil.rmtree(self.cache_dir / key, ignore_errors=True)
+            total -= meta.get('bytes', 0)
+
+    def total_bytes(self):
+        return sum(meta.get('bytes', 0) for _, meta in self._entries())
+
+    def clear(self):
+        with self.lock:
+            for key, _ in list(self._entries()):
+                shutil.rmtree(self.cache_dir / key, ignore_errors=True)
+
+    @staticmethod
+    def _read_json(path):
+        try:
+            return json.loads(Path(path).read_text())
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_json(path, data):
+        path = Path(path)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{uuid.uuid4().hex}.tmp")
+        tmp.write_text(json.dumps(data))
+        os.replace(tmp, path)
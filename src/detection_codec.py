@@ -0,0 +1,87 @@
+import json
+import struct
+
+import numpy as np
+
+# Binary batch layout (little endian):
+#   magic "PZD1" | header length u32 | JSON header {camera_id, run_id, labels, frames}
+#   | frame table: frames x (frame_number u32, timestamp f64, count u32)
+#   | detections: sum(count) x 6 float32 (x1, y1, x2, y2, confidence, class)
+MAGIC = b"PZD1"
+_PREFIX = struct.Struct("<4sI")
+FRAME_DTYPE = np.dtype([('frame_number', '<u4'), ('timestamp', '<f8'), ('count', '<u4')])
+
+
+def is_batch(body):
+    return body[:4] == MAGIC
+
+
+def encode_batch(camera_id, frames, labels, run_id=None):
+    """
+    Pack [(frame_number, timestamp, detections (N, 6))...] from one camera into a
+    single message. labels maps class ids to names so consumers need no model;
+    run_id identifies the video run the frame numbers belong to.
+    """
+    table = np.empty(len(frames), dtype=FRAME_DTYPE)
+    arrays = []
+    for i, (frame_number, timestamp, detections) in enumerate(frames):
+        detections = np.asarray(detections, dtype=np.float32).reshape(-1, 6)
+        table[i] = (frame_number, timestamp, len(detections))
+        arrays.append(detections)
+
+    header = json.dumps({
+        'camera_id': camera_id,
+        'run_id': run_id,
+        'labels': [labels[i] for i in sorted(labels)] if isinstance(labels, dict) else list(labels),
+        'frames': len(frames)
+    }, separators=(',', ':')).encode()
+    detections = np.concatenate(arrays) if arrays else np.zeros((0, 6), dtype=np.float32)
+    return b"".join([
+        _PREFIX.pack(MAGIC, len(header)), header,
+        table.tobytes(), np.ascontiguousarray(detections, dtype='<f4').tobytes()
+    ])
+
+
+def decode_batch(body):
+    """
+    Unpack a message from encode_batch. Returns (header dict, frame list) where each
+    frame is {'camera_id', 'run_id', 'frame_number', 'timestamp', 'detections'}; detection
+    arrays are read-only views into the message body.
+    """
+    magic, header_length = _PREFIX.unpack_from(body)
+    if magic != MAGIC:
+        raise ValueError("Not a detection batch")
+    offset = _PREFIX.size
+    header = json.loads(bytes(body[offset:offset + header_length]))
+    offset += header_length
+
+    table = np.frombuffer(body, dtype=FRAME_DTYPE, count=header['frames'], offset=offset)
+    offset += table.nbytes
+    total = int(table['count'].sum())
+    detections = np.frombuffer(body, dtype='<f4', count=total * 6, offset=offset).reshape(total, 6)
+
+    frames = []
+    ends = np.cumsum(table['count'])
+    for row, end in zip(table, ends):
+        frames.append({
+            'camera_id': header['camera_id'],
+            'run_id': header.get('run_id'),
+            'frame_number': int(row['frame_number']),
+            'timestamp': float(row['timestamp']),
+            'detections': detections[end - row['count']:end]
+        })
+    return header, frames
+
+
+def detections_to_dicts(detections, labels):
+    """Expand an (N, 6) array into the per-detection dicts of the JSON message format"""
+    result = []
+    for x1, y1, x2, y2, conf, cls in np.asarray(detections).tolist():
+        x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+        result.append({
+            'label': labels[int(cls)],
+            'bbox': [x1, y1, x2, y2],
+            'center': ((x1 + x2) // 2, (y1 + y2) // 2),
+            'confidence': conf
+        })
+    return result
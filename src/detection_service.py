@@ -1,141 +1,323 @@
-from fastapi import WebSocket
+import argparse
+import hashlib
 import json
 import logging
-import pika
-import sqlite3
+import multiprocessing
+import numpy as np
+from datetime import datetime
 from pathlib import Path
 
+from src import metrics
+from src.camera_config import CameraConfig, load_camera_configs
+from src.detection_codec import decode_batch, is_batch
+from src.hand_tracker import HandTracker, pairwise_distances
+from src.transport import RabbitMQTransport
+from src.violation_store import ViolationStore, make_violation_record
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SERVICE_FRAMES = metrics.counter('pizza_service_frames_total', 'Frames applied by DetectionService', ['partition'])
+SERVICE_VIOLATIONS = metrics.counter('pizza_service_violations_total', 'Violations recorded by DetectionService', ['partition'])
+
+
+def detections_from_dicts(detections):
+    """(N, 6) array and label list from the per-detection dicts of the JSON message format"""
+    labels = sorted({d['label'] for d in detections})
+    array = np.array([
+        [*d['bbox'], d.get('confidence', 0.0), labels.index(d['label'])] for d in detections
+    ], dtype=np.float32).reshape(-1, 6)
+    return array, labels
+
+
+class CameraState:
+    """
+    Enter/leave violation state of one camera, as VideoProcessor keeps it: the hand
+    tracker, per-station cooldowns and the last frame applied in the current run
+    """
+    def __init__(self, config):
+        self.config = config
+        self.tracker = HandTracker(config.stations)
+        self.last_violation_time = {}
+        self.run_id = None
+        self.last_frame = -1
+        self.frames = 0
+        self.violations = 0
+
+    def apply(self, run_id, frame_number, detections, labels):
+        """
+        Advance the tracker by one frame. Returns [(detection row, station index)] for
+        each violation, or None for a frame of this run that was already applied.
+        """
+        if run_id is not None and run_id == self.run_id and frame_number <= self.last_frame:
+            return None
+        if run_id != self.run_id:
+            # A new video run restarts frame numbers and tracks
+            self.tracker.reset()
+            self.last_violation_time = {}
+            self.run_id = run_id
+        self.last_frame = frame_number
+        self.frames += 1
+
+        classes = detections[:, 5].astype(np.int64)
+        boxes = detections[:, :4].astype(np.int64)
+        centers = (boxes[:, :2] + boxes[:, 2:]) // 2
+        hand_rows = np.flatnonzero(classes == labels.index('hand')) if 'hand' in labels else np.zeros(0, np.int64)
+        scooper_rows = np.flatnonzero(classes == labels.index('scooper')) if 'scooper' in labels else np.zeros(0, np.int64)
+
+        violators = []
+        for hand_index, station in self.tracker.update(centers[hand_rows], centers[scooper_rows]):
+            if frame_number - self.last_violation_time.get(station, 0) >= self.config.violation_cooldown:
+                self.last_violation_time[station] = frame_number
+                violators.append((hand_rows[hand_index], station))
+        self.violations += len(violators)
+        return violators
+
+    def state_dict(self):
+        return {
+            'tracker': self.tracker.state_dict(),
+            'last_violation_time': {str(station): frame for station, frame in self.last_violation_time.items()}
+        }
+
+    def load_checkpoint(self, checkpoint):
+        self.tracker.load_state_dict(checkpoint['state']['tracker'])
+        self.last_violation_time = {
+            int(station): frame for station, frame in checkpoint['state']['last_violation_time'].items()
+        }
+        self.run_id = checkpoint['run_id']
+        self.last_frame = checkpoint['frame_number']
+        self.frames = checkpoint['frames']
+        self.violations = checkpoint['violations']
+
+
 class DetectionService:
     """
-    Service that receives detection data, applies business logic, and stores violations
+    Service that receives detection data, applies business logic, and stores violations.
+    Each instance consumes one partition of the cameras and owns their tracker state,
+    which is checkpointed before messages are acknowledged.
     """
-    def __init__(self, db_path="violations.db", frames_dir="violation_frames"):
+    def __init__(self, db_path="violations.db", frames_dir="violation_frames", camera_config_path=None,
+                 transport=None, partition=0, partitions=1):
         self.db_path = db_path
         self.frames_dir = Path(frames_dir)
         self.frames_dir.mkdir(exist_ok=True)
-        
+
+        # Per-camera stations; cameras without an entry use the default single ROI
+        self.camera_configs = load_camera_configs(camera_config_path) if camera_config_path else {}
+        self.default_camera_config = CameraConfig.from_roi()
+
         # Setup database
         self.setup_database()
-        
-        # Setup RabbitMQ consumer
-        self.setup_rabbitmq()
-        
+
+        # Detection messages arrive through this partition's RabbitMQ queue unless another transport is given
+        self.partition = partition
+        self.partitions = partitions
+        if transport is None:
+            transport = RabbitMQTransport('detections' if partitions == 1 else f"detections.{partition}")
+        self.transport = transport
+
         # Violation tracking
+        self.cameras = {}  # camera_id -> CameraState
+        self.dirty = set()  # Cameras changed since the last checkpoint
         self.violation_count = 0
-        
+        self.frames_processed = 0
+
     def setup_database(self):
         """Initialize SQLite database for violations"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS violations (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                violation_id TEXT UNIQUE,
-                timestamp TEXT,
-                frame_number INTEGER,
-                frame_path TEXT,
-                hand_bbox TEXT,
-                hand_position TEXT,
-                violation_type TEXT,
-                confidence REAL,
-                roi_coordinates TEXT,
-                metadata TEXT
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        logger.info(f"Database initialized: {self.db_path}")
-    
-    def setup_rabbitmq(self):
-        """Setup RabbitMQ consumer for receiving detection data"""
-        try:
-            self.connection = pika.BlockingConnection(
-                pika.ConnectionParameters('localhost')
-            )
-            self.channel = self.connection.channel()
-            
-            # Declare queues
-            self.channel.queue_declare(queue='detections', durable=True)
-            logger.info("RabbitMQ consumer connected successfully")
-        except Exception as e:
-            logger.error(f"Failed to connect to RabbitMQ: {e}")
-            raise
-    
-    def check_violation_logic(self, detections):
+        self.violation_store = ViolationStore(self.db_path)
+
+    def get_camera_config(self, camera_id):
+        return self.camera_configs.get(camera_id, self.default_camera_config)
+
+    def get_camera_state(self, camera_id):
+        """Tracker state of a camera, resumed from its last checkpoint the first time it is seen"""
+        state = self.cameras.get(camera_id)
+        if state is None:
+            state = self.cameras[camera_id] = CameraState(self.get_camera_config(camera_id))
+            checkpoint = self.violation_store.load_checkpoint(camera_id or '')
+            if checkpoint is not None:
+                state.load_checkpoint(checkpoint)
+                logger.info(f"Resumed camera {camera_id} at frame {state.last_frame} of run {state.run_id}")
+        return state
+
+    def check_violation_logic(self, detections, camera_id=None):
         """
-        Apply business logic to check for violations
-        Logic: Hand took ingredient without scooper
+        Per-frame check without tracking: hands inside a station with no scooper
+        within the station's bare_hand_scooper_distance
         """
-        hands = [d for d in detections if d['label'] == 'hand' and d['inside_roi']]
+        config = self.get_camera_config(camera_id)
+        hands = [d for d in detections if d['label'] == 'hand']
         scoopers = [d for d in detections if d['label'] == 'scooper']
-        
+        if not hands:
+            return []
+
+        # Station lookup for all hands at once through the camera's station mask
+        hand_centers = np.array([hand['center'] for hand in hands], dtype=np.int64).reshape(-1, 2)
+        stations = config.station_mask.lookup(hand_centers)
+        radii = np.array([station.bare_hand_scooper_distance for station in config.stations])[stations]
+
+        # Check if any scooper is nearby (within the station's radius)
+        if scoopers:
+            scooper_centers = np.array([scooper['center'] for scooper in scoopers]).reshape(-1, 2)
+            has_scooper = (pairwise_distances(hand_centers, scooper_centers) < radii[:, None]).any(axis=1)
+        else:
+            has_scooper = np.zeros(len(hands), dtype=bool)
+
         violations = []
-        
-        for hand in hands:
-            hx, hy = hand['center']
-            
-            # Check if any scooper is nearby (within 80 pixels)
-            has_scooper = False
-            for scooper in scoopers:
-                sx, sy = scooper['center']
-                if np.hypot(sx - hx, sy - hy) < 80:
-                    has_scooper = True
-                    break
-            
-            if not has_scooper:
-                violations.append({
-                    'hand_detection': hand,
-                    'violation_type': 'bare_hand_contact',
-                    'severity': 'HIGH'
-                })
-        
+        for index in np.flatnonzero((stations >= 0) & ~has_scooper):
+            violations.append({
+                'hand_detection': hands[index],
+                'station': config.stations[stations[index]].name,
+                'violation_type': 'bare_hand_contact',
+                'severity': 'HIGH'
+            })
+
         return violations
-    
-    def process_detection_data(self, ch, method, properties, body):
-        """Process incoming detection data and check for violations"""
-        try:
-            frame_data = json.loads(body)
-            
-            # Apply violation detection logic
-            violations = self.check_violation_logic(frame_data['detections'])
-            self.violation_count += len(violations)
-            
-            # Prepare result data for streaming service
-            result_data = {
-                'timestamp': frame_data['timestamp'],
-                'frame_number': frame_data['frame_number'],
-                'detections': frame_data['detections'],
-                'violations': len(violations),
-                'violation_count': self.violation_count
-            }
-            
-            # Acknowledge message
-            ch.basic_ack(delivery_tag=method.delivery_tag)
-            
-            logger.info(f"Processed frame {frame_data['frame_number']} with {len(violations)} violations")
-            
-        except Exception as e:
-            logger.error(f"Error processing detection data: {e}")
-            ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
-    
-    def start_consuming(self):
-        """Start consuming detection data from message broker"""
-        self.channel.basic_qos(prefetch_count=1)
-        self.channel.basic_consume(
-            queue='detections',
-            on_message_callback=self.process_detection_data
+
+    def process_frame(self, camera_id, run_id, frame_number, detections, labels, timestamp=None):
+        """Track one frame of a camera and record its violations; returns the number recorded"""
+        state = self.get_camera_state(camera_id)
+        violators = state.apply(run_id, frame_number, detections, labels)
+        if violators is None:
+            return 0
+        self.frames_processed += 1
+        SERVICE_FRAMES.inc(1, str(self.partition))
+        self.dirty.add(camera_id)
+        if not violators:
+            return 0
+
+        boxes = detections[:, :4].astype(np.int64)
+        centers = (boxes[:, :2] + boxes[:, 2:]) // 2
+        when = datetime.fromtimestamp(timestamp) if timestamp else None
+        for row, station in violators:
+            station = state.config.stations[station]
+            # Same id for the same event, so a replayed frame cannot be stored twice
+            violation_id = None
+            if run_id is not None:
+                key = f"{camera_id}|{run_id}|{frame_number}|{station.name}|{row}"
+                violation_id = hashlib.sha1(key.encode()).hexdigest()[:32]
+            self.violation_store.add(make_violation_record(
+                'left_roi_without_scooper',
+                frame_number,
+                hand={
+                    'bbox': boxes[row].tolist(),
+                    'center': centers[row].tolist(),
+                    'confidence': float(detections[row, 4])
+                },
+                camera_id=camera_id,
+                station=station.name,
+                roi=station.polygon,
+                metadata={'run_id': run_id, 'partition': self.partition},
+                timestamp=when,
+                violation_id=violation_id
+            ))
+        self.violation_count += len(violators)
+        SERVICE_VIOLATIONS.inc(len(violators), str(self.partition))
+        return len(violators)
+
+    def process_message(self, body):
+        """
+        Handle one message: a binary batch of frames (detection_codec) or a single JSON frame.
+        Raises on malformed messages so the transport rejects them.
+        """
+        if is_batch(body):
+            header, frames = decode_batch(body)
+            total = 0
+            for frame in frames:
+                total += self.process_frame(
+                    frame['camera_id'], frame['run_id'], frame['frame_number'],
+                    frame['detections'], header['labels'], frame['timestamp']
+                )
+            logger.debug(f"Processed {len(frames)} frames from {header['camera_id']} with {total} violations")
+            return total
+
+        frame_data = json.loads(body)
+        detections, labels = detections_from_dicts(frame_data['detections'])
+        total = self.process_frame(
+            frame_data.get('camera_id'), frame_data.get('run_id'), frame_data['frame_number'],
+            detections, labels, frame_data.get('timestamp')
         )
-        
-        logger.info("Detection Service started. Waiting for detection data...")
+        logger.debug(f"Processed frame {frame_data['frame_number']} with {total} violations")
+        return total
+
+    def checkpoint(self):
+        """
+        Commit the tracker state of every changed camera after the violations that led
+        to it; the transport calls this before it acknowledges the handled messages
+        """
+        now = datetime.now().isoformat(timespec='milliseconds')
+        for camera_id in self.dirty:
+            state = self.cameras[camera_id]
+            self.violation_store.add_checkpoint({
+                'camera_id': camera_id or '',
+                'partition': self.partition,
+                'run_id': state.run_id,
+                'frame_number': state.last_frame,
+                'frames': state.frames,
+                'violations': state.violations,
+                'state': json.dumps(state.state_dict()),
+                'updated_at': now
+            })
+        self.dirty.clear()
+        self.violation_store.flush()
+
+    def start_consuming(self):
+        """Start consuming detection data from the transport"""
+        logger.info(f"Detection Service started on partition {self.partition + 1}/{self.partitions}. "
+                    f"Waiting for detection data...")
         try:
-            self.channel.start_consuming()
+            self.transport.consume(self.process_message, before_ack=self.checkpoint)
         except KeyboardInterrupt:
             logger.info("Stopping Detection Service...")
-            self.channel.stop_consuming()
-            self.connection.close()
\ No newline at end of file
+        finally:
+            self.transport.close()
+            self.checkpoint()
+
+    def stop(self):
+        self.transport.stop()
+
+
+def run_worker(partition, partitions, db_path, camera_config_path, metrics_port=None):
+    if metrics_port:
+        # One port per worker: metrics_port + partition
+        metrics.enable()
+        metrics.serve(metrics_port + partition)
+    DetectionService(db_path=db_path, camera_config_path=camera_config_path,
+                     partition=partition, partitions=partitions).start_consuming()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run DetectionService consumers, one process per partition. Producers publish "
+                    "each camera to transport.partition_queue(camera_id, workers)."
+    )
+    parser.add_argument("--workers", type=int, default=1, help="Number of partitions / worker processes")
+    parser.add_argument("--config", help="Camera/station JSON config")
+    parser.add_argument("--db", default="violations.db")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics of worker i on this port + i")
+    args = parser.parse_args()
+
+    if args.workers == 1:
+        run_worker(0, 1, args.db, args.config, args.metrics_port)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=run_worker, args=(partition, args.workers, args.db, args.config, args.metrics_port),
+                        name=f"detection-worker-{partition}")
+        for partition in range(args.workers)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        logger.info("Stopping detection workers...")
+        for worker in workers:
+            worker.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,494 @@
+import argparse
+import ast
+import logging
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from src import metrics
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "yolo12m-v2.pt"
+BACKENDS = ('pytorch', 'onnx', 'openvino')
+
+# Offset per class id, so one NMS pass never suppresses boxes of different classes
+MAX_WH = 7680
+# Candidates kept for NMS and detections kept per image, as in ultralytics
+MAX_NMS = 30000
+MAX_DET = 300
+
+
+class Detector:
+    """
+    Object detector interface. detect() returns, for each BGR image, an (N, 6) float32
+    array of x1, y1, x2, y2, confidence, class rows in that image's pixel coordinates,
+    the same arrays VideoProcessor.track_hands_and_check_violations consumes.
+    """
+    backend = None
+    fixed_input = False  # True when every image is run at imgsz, whatever sizes detect() gets
+
+    def __init__(self, weights_path=None, names=None, imgsz=640, conf=0.25, iou=0.7, threads=None):
+        # Weights file identifying the model's detections (detection cache key)
+        self.weights_path = str(weights_path) if weights_path is not None else None
+        self.names = dict(names or {})  # class id -> class name
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.threads = threads
+
+    def detect(self, images, sizes=None):
+        """
+        sizes optionally gives each image its own model input (height, width), a
+        multiple of the stride, instead of imgsz (None entries keep imgsz)
+        """
+        raise NotImplementedError
+
+    def settings(self):
+        """Settings other than the weights that change what the detector returns"""
+        return {'backend': self.backend, 'imgsz': self.imgsz, 'conf': self.conf, 'iou': self.iou}
+
+    def warmup(self, runs=1):
+        """Run a blank frame through the model, so the first real frame doesn't pay for setup"""
+        height, width = _pair(self.imgsz)
+        for _ in range(runs):
+            self.detect([np.zeros((height, width, 3), dtype=np.uint8)])
+
+
+class TorchDetector(Detector):
+    """The ultralytics YOLO model on PyTorch"""
+    backend = 'pytorch'
+
+    def __init__(self, weights_path=DEFAULT_MODEL, model=None, imgsz=640, conf=0.25, iou=0.7, threads=None):
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        if model is None:
+            from ultralytics import YOLO
+            model = YOLO(weights_path)
+        else:
+            # ultralytics keeps the weights file of a loaded model as ckpt_path
+            weights_path = getattr(model, 'ckpt_path', None)
+        super().__init__(weights_path, model.names, imgsz, conf, iou, threads)
+        self.model = model
+
+    def detect(self, images, sizes=None):
+        detections = [None] * len(images)
+        for size, indices in _size_groups(sizes, len(images)):
+            with metrics.STAGE_SECONDS.time('inference'):
+                results = self.model([images[i] for i in indices], imgsz=size or self.imgsz,
+                                     conf=self.conf, iou=self.iou, verbose=False)
+            with metrics.STAGE_SECONDS.time('to_numpy'):
+                for i, r in zip(indices, results):
+                    detections[i] = r.boxes.data.cpu().numpy()
+        return detections
+
+
+class ExportedDetector(Detector):
+    """
+    Base for models exported from ultralytics (ONNX, OpenVINO). Images are letterboxed
+    to the model's input size, and the raw (4 + classes, anchors) output is decoded
+    with per-class NMS the way ultralytics does it, so boxes match the PyTorch model's.
+    """
+    def __init__(self, weights_path, names, imgsz, conf, iou, threads, batch):
+        super().__init__(weights_path, names, imgsz, conf, iou, threads)
+        self.batch = batch  # Images per model call; None when the batch axis is dynamic
+
+    def forward(self, blob):
+        """Raw model output for an (N, 3, H, W) float32 blob"""
+        raise NotImplementedError
+
+    def detect(self, images, sizes=None):
+        if self.fixed_input:
+            sizes = None
+        outputs = [None] * len(images)
+        prepared = [None] * len(images)
+        for size, indices in _size_groups(sizes, len(images)):
+            with metrics.STAGE_SECONDS.time('preprocess'):
+                for i in indices:
+                    prepared[i] = letterbox(images[i], size or self.imgsz)
+            with metrics.STAGE_SECONDS.time('inference'):
+                blobs = np.stack([prepared[i][0] for i in indices])
+                if self.batch is None or self.batch == len(blobs):
+                    group = self.forward(blobs)
+                else:
+                    group = np.concatenate([self.forward(blobs[i:i + 1]) for i in range(len(blobs))])
+            for i, output in zip(indices, group):
+                outputs[i] = output
+        with metrics.STAGE_SECONDS.time('postprocess'):
+            return [
+                decode_output(output, gain, pad, image.shape, self.conf, self.iou)
+                for output, image, (_, gain, pad) in zip(outputs, images, prepared)
+            ]
+
+    def _resolve_imgsz(self, input_shape, metadata_imgsz, imgsz):
+        """Input size of a model: fixed by a static export, else requested, else the export size"""
+        height, width = input_shape[2:4]
+        if isinstance(height, int) and isinstance(width, int) and height > 0 and width > 0:
+            self.fixed_input = True
+            if imgsz is not None and _pair(imgsz) != (height, width):
+                raise ValueError(
+                    f"{self.weights_path} was exported for {height}x{width} input; "
+                    f"export it again with --imgsz to run at {imgsz}"
+                )
+            return (height, width) if height != width else height
+        return imgsz or metadata_imgsz or 640
+
+
+class OnnxDetector(ExportedDetector):
+    """An exported ONNX model (FP32 or INT8) on ONNX Runtime's CPU provider"""
+    backend = 'onnx'
+
+    def __init__(self, weights_path, imgsz=None, conf=0.25, iou=0.7, threads=None, names=None):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise ImportError("The onnx backend needs onnxruntime: pip install onnxruntime")
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(str(weights_path), options, providers=['CPUExecutionProvider'])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        if names is None and 'names' in metadata:
+            names = ast.literal_eval(metadata['names'])
+        metadata_imgsz = ast.literal_eval(metadata['imgsz']) if 'imgsz' in metadata else None
+        batch = model_input.shape[0] if isinstance(model_input.shape[0], int) else None
+        super().__init__(weights_path, names, None, conf, iou, threads, batch)
+        self.imgsz = self._resolve_imgsz(model_input.shape, normalize_imgsz(metadata_imgsz), imgsz)
+
+    def forward(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVINODetector(ExportedDetector):
+    """An exported OpenVINO IR model (FP32 or INT8) on the OpenVINO CPU plugin"""
+    backend = 'openvino'
+
+    def __init__(self, weights_path, imgsz=None, conf=0.25, iou=0.7, threads=None, names=None):
+        try:
+            import openvino as ov
+        except ImportError:
+            raise ImportError("The openvino backend needs OpenVINO: pip install openvino")
+
+        xml_path = _openvino_xml(weights_path)
+        core = ov.Core()
+        model = core.read_model(str(xml_path))
+        config = {'PERFORMANCE_HINT': 'LATENCY'}
+        if threads:
+            config['INFERENCE_NUM_THREADS'] = threads
+        self.compiled = core.compile_model(model, 'CPU', config)
+        self.output = self.compiled.output(0)
+
+        # ultralytics writes class names and the export size next to the IR
+        metadata = {}
+        metadata_path = xml_path.parent / "metadata.yaml"
+        if metadata_path.exists():
+            import yaml
+            metadata = yaml.safe_load(metadata_path.read_text()) or {}
+        if names is None:
+            names = metadata.get('names')
+        input_shape = [dim.get_length() if dim.is_static else None for dim in model.inputs[0].partial_shape]
+        batch = input_shape[0]
+        super().__init__(xml_path, names, None, conf, iou, threads, batch)
+        self.imgsz = self._resolve_imgsz(input_shape, normalize_imgsz(metadata.get('imgsz')), imgsz)
+
+    def forward(self, blob):
+        return self.compiled({0: blob})[self.output]
+
+
+def _pair(imgsz):
+    """(height, width) of an int or (height, width) input size"""
+    if isinstance(imgsz, int):
+        return imgsz, imgsz
+    height, width = imgsz
+    return int(height), int(width)
+
+
+def _size_groups(sizes, count):
+    """(size, image indices) for each distinct input size, in first-seen order; one model call each"""
+    groups = {}
+    for i, size in enumerate(sizes or [None] * count):
+        groups.setdefault(tuple(size) if size is not None else None, []).append(i)
+    return groups.items()
+
+
+def normalize_imgsz(imgsz):
+    """Normalize an input size from metadata or the command line: int if square, else (height, width)"""
+    if imgsz is None:
+        return None
+    if isinstance(imgsz, int):
+        return imgsz
+    sizes = [int(s) for s in imgsz]
+    if len(sizes) == 1 or sizes[0] == sizes[1]:
+        return sizes[0]
+    return sizes[0], sizes[1]
+
+
+def _openvino_xml(path):
+    path = Path(path)
+    if path.is_dir():
+        xml_files = sorted(path.glob("*.xml"))
+        if not xml_files:
+            raise FileNotFoundError(f"No OpenVINO .xml model in {path}")
+        return xml_files[0]
+    return path
+
+
+def letterbox(image, imgsz):
+    """
+    Resize a BGR image to fit imgsz keeping its aspect ratio, pad it with gray as
+    ultralytics' LetterBox does, and convert it to a (3, H, W) RGB float32 blob in [0, 1].
+    Returns (blob, gain, (pad_x, pad_y)).
+    """
+    height, width = _pair(imgsz)
+    shape = image.shape[:2]
+    gain = min(height / shape[0], width / shape[1])
+    new_width, new_height = int(round(shape[1] * gain)), int(round(shape[0] * gain))
+    dw, dh = (width - new_width) / 2, (height - new_height) / 2
+    if (shape[1], shape[0]) != (new_width, new_height):
+        image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    image = cv2.copyMakeBorder(image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+    blob = image[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+    return np.ascontiguousarray(blob), gain, (left, top)
+
+
+def nms(boxes, scores, iou_threshold):
+    """Indices of the boxes kept by greedy NMS, highest score first"""
+    x1, y1, x2, y2 = boxes.T
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+
+def decode_output(output, gain, pad, image_shape, conf, iou):
+    """
+    Turn one image's raw YOLO output, (4 + classes, anchors) of center-xywh boxes and
+    class scores in letterboxed pixels, into (N, 6) detections in image pixels
+    """
+    predictions = output.T
+    scores = predictions[:, 4:]
+    classes = scores.argmax(1)
+    confidences = scores[np.arange(len(scores)), classes]
+    keep = confidences > conf
+    if not keep.any():
+        return np.zeros((0, 6), dtype=np.float32)
+    xywh, classes, confidences = predictions[keep, :4], classes[keep], confidences[keep]
+    if len(confidences) > MAX_NMS:
+        top = confidences.argsort()[::-1][:MAX_NMS]
+        xywh, classes, confidences = xywh[top], classes[top], confidences[top]
+
+    boxes = np.empty_like(xywh)
+    boxes[:, :2] = xywh[:, :2] - xywh[:, 2:] / 2
+    boxes[:, 2:] = xywh[:, :2] + xywh[:, 2:] / 2
+    kept = nms(boxes + classes[:, None] * MAX_WH, confidences, iou)[:MAX_DET]
+    boxes, classes, confidences = boxes[kept], classes[kept], confidences[kept]
+
+    # Undo the letterbox
+    boxes[:, [0, 2]] = (boxes[:, [0, 2]] - pad[0]) / gain
+    boxes[:, [1, 3]] = (boxes[:, [1, 3]] - pad[1]) / gain
+    boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, image_shape[1])
+    boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, image_shape[0])
+    return np.column_stack([boxes, confidences, classes]).astype(np.float32)
+
+
+def backend_for(model_path):
+    """Backend implied by a model file: .onnx, an OpenVINO .xml or *_openvino_model directory, else PyTorch"""
+    path = Path(model_path)
+    if path.suffix == ".onnx":
+        return 'onnx'
+    if path.suffix == ".xml" or path.name.endswith("_openvino_model") or (path.is_dir() and any(path.glob("*.xml"))):
+        return 'openvino'
+    return 'pytorch'
+
+
+def load_detector(model_path=DEFAULT_MODEL, backend=None, imgsz=None, threads=None, conf=0.25, iou=0.7):
+    """
+    Load a detector for a weights file. backend defaults to the one implied by the file.
+    imgsz=None keeps the PyTorch default (640) or an exported model's own input size.
+    """
+    backend = backend or backend_for(model_path)
+    started = time.perf_counter()
+    if backend == 'pytorch':
+        detector = TorchDetector(model_path, imgsz=imgsz or 640, conf=conf, iou=iou, threads=threads)
+    elif backend == 'onnx':
+        detector = OnnxDetector(model_path, imgsz=imgsz, conf=conf, iou=iou, threads=threads)
+    elif backend == 'openvino':
+        detector = OpenVINODetector(model_path, imgsz=imgsz, conf=conf, iou=iou, threads=threads)
+    else:
+        raise ValueError(f"Unknown detector backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    logger.info(f"Loaded {backend} detector {model_path} (imgsz {detector.imgsz}, "
+                f"threads {threads or 'default'}) in {time.perf_counter() - started:.2f}s")
+    return detector
+
+
+def calibration_frames(video_path, count=100):
+    """count frames spread evenly over a clip, for INT8 calibration"""
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise ValueError(f"Failed to open calibration video: {video_path}")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or count
+    wanted = set(np.linspace(0, total - 1, min(count, total)).astype(int).tolist())
+    frames = []
+    for index in range(total):
+        if not cap.grab():
+            break
+        if index in wanted:
+            ret, frame = cap.retrieve()
+            if ret:
+                frames.append(frame)
+    cap.release()
+    if not frames:
+        raise ValueError(f"No frames read from calibration video: {video_path}")
+    return frames
+
+
+def export_model(weights_path=DEFAULT_MODEL, backend='onnx', imgsz=640, int8=False, calibration=None,
+                 calibration_count=100):
+    """
+    Export PyTorch weights for the onnx or openvino backend with ultralytics, at a fixed
+    imgsz (int or (height, width)). int8=True also writes a statically quantized copy
+    calibrated on frames of the calibration clip, and returns its path.
+    """
+    if int8 and calibration is None:
+        raise ValueError("INT8 export needs a calibration clip from the camera it will run on")
+    from ultralytics import YOLO
+
+    exported = Path(YOLO(weights_path).export(format=backend, imgsz=imgsz, dynamic=False))
+    logger.info(f"Exported {weights_path} to {exported}")
+    if not int8:
+        return exported
+
+    frames = calibration_frames(calibration, calibration_count)
+    if backend == 'onnx':
+        return _quantize_onnx(exported, frames, imgsz)
+    if backend == 'openvino':
+        return _quantize_openvino(exported, frames, imgsz)
+    raise ValueError(f"INT8 export is supported for onnx and openvino, not {backend!r}")
+
+
+def _detect_head_prefix(node_names):
+    """Name prefix of the last module (the Detect head) in an ultralytics export, e.g. '/model.22/'"""
+    indexes = []
+    for name in node_names:
+        parts = name.split("/")
+        if len(parts) > 2 and parts[1].startswith("model.") and parts[1][6:].isdigit():
+            indexes.append(int(parts[1][6:]))
+    return f"/model.{max(indexes)}/" if indexes else None
+
+
+def _quantize_onnx(fp32_path, frames, imgsz):
+    import onnx
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    graph = onnx.load(str(fp32_path)).graph
+    input_name = graph.input[0].name
+    # Box decoding in the head mixes pixel coordinates and 0-1 scores in one tensor,
+    # which a single 8-bit scale can't hold; only its convolutions are quantized
+    head = _detect_head_prefix(node.name for node in graph.node)
+    exclude = [node.name for node in graph.node if head and node.name.startswith(head) and node.op_type != 'Conv']
+
+    class FrameReader(CalibrationDataReader):
+        def __init__(self):
+            self.frames = iter(frames)
+
+        def get_next(self):
+            frame = next(self.frames, None)
+            return None if frame is None else {input_name: letterbox(frame, imgsz)[0][None]}
+
+    int8_path = fp32_path.with_name(f"{fp32_path.stem}_int8.onnx")
+    quantize_static(
+        str(fp32_path), str(int8_path), FrameReader(),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        nodes_to_exclude=exclude
+    )
+    # Keep the class names and input size for OnnxDetector
+    fp32_model = onnx.load(str(fp32_path))
+    int8_model = onnx.load(str(int8_path))
+    del int8_model.metadata_props[:]
+    int8_model.metadata_props.extend(fp32_model.metadata_props)
+    onnx.save(int8_model, str(int8_path))
+    logger.info(f"Wrote INT8 model calibrated on {len(frames)} frames to {int8_path}")
+    return int8_path
+
+
+def _quantize_openvino(fp32_dir, frames, imgsz):
+    import shutil
+    import nncf
+    import openvino as ov
+
+    xml_path = _openvino_xml(fp32_dir)
+    model = ov.Core().read_model(str(xml_path))
+    dataset = nncf.Dataset(frames, lambda frame: letterbox(frame, imgsz)[0][None])
+    quantized = nncf.quantize(
+        model, dataset,
+        preset=nncf.QuantizationPreset.MIXED,
+        subset_size=len(frames),
+        # Same reason as for ONNX: leave the head's box decoding in floating point
+        ignored_scope=nncf.IgnoredScope(types=["Multiply", "Subtract", "Sigmoid"])
+    )
+    int8_dir = Path(str(fp32_dir).replace("_openvino_model", "_int8_openvino_model"))
+    int8_dir.mkdir(parents=True, exist_ok=True)
+    ov.save_model(quantized, str(int8_dir / xml_path.name))
+    if (xml_path.parent / "metadata.yaml").exists():
+        shutil.copy(xml_path.parent / "metadata.yaml", int8_dir / "metadata.yaml")
+    logger.info(f"Wrote INT8 model calibrated on {len(frames)} frames to {int8_dir}")
+    return int8_dir
+
+
+def add_detector_arguments(parser, model=True):
+    """--model, --backend, --imgsz and --threads for command line tools"""
+    if model:
+        parser.add_argument("--model", default=DEFAULT_MODEL, help="Weights: .pt, .onnx or an OpenVINO model directory")
+    parser.add_argument("--backend", choices=BACKENDS, help="Defaults to the one implied by the model file")
+    parser.add_argument("--imgsz", type=int, nargs="+", help="Model input size: 640, or height width")
+    parser.add_argument("--threads", type=int, help="CPU threads for inference")
+
+
+def detector_kwargs(args):
+    """VideoProcessor/load_detector keyword arguments from add_detector_arguments options"""
+    return {'backend': args.backend, 'imgsz': normalize_imgsz(args.imgsz), 'threads': args.threads}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export the detection model for the onnx or openvino backend, optionally as INT8"
+    )
+    parser.add_argument("weights", nargs="?", default=DEFAULT_MODEL)
+    parser.add_argument("--backend", choices=('onnx', 'openvino'), default='onnx')
+    parser.add_argument("--imgsz", type=int, nargs="+", default=[640], help="Input size: 640, or height width")
+    parser.add_argument("--int8", action="store_true", help="Also write an INT8 model")
+    parser.add_argument("--calibration", help="Clip to calibrate INT8 activations on")
+    parser.add_argument("--calibration-frames", type=int, default=100)
+    args = parser.parse_args()
+    path = export_model(args.weights, args.backend, normalize_imgsz(args.imgsz), args.int8, args.calibration,
+                        args.calibration_frames)
+    print(path)
+
+
+if __name__ == "__main__":
+    main()
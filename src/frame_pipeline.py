@@ -0,0 +1,229 @@
+import cv2
+import logging
+import queue
+import threading
+import time
+
+from src import metrics
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's output
+_END = object()
+
+
+class PipelineStats:
+    """
+    Collects throughput, busy time and queue depth samples for each pipeline stage
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.frames = 0
+        self.frames_inferred = 0
+        self.batches = 0
+        self.stage_time = {'decode': 0.0, 'infer': 0.0, 'track': 0.0}
+        self.depth_samples = {}
+
+    def add_time(self, stage, seconds):
+        self.stage_time[stage] += seconds
+
+    def sample_depth(self, name, depth):
+        metrics.QUEUE_DEPTH.set(depth, f"pipeline_{name}")
+        samples = self.depth_samples.setdefault(name, [0, 0, 0])  # [count, total, max]
+        samples[0] += 1
+        samples[1] += depth
+        samples[2] = max(samples[2], depth)
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    def summary(self):
+        """Return a plain dict suitable for logging or JSON responses"""
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        return {
+            'frames': self.frames,
+            'frames_inferred': self.frames_inferred,
+            'batches': self.batches,
+            'elapsed_s': round(elapsed, 3),
+            'fps': round(self.frames / elapsed, 2) if elapsed > 0 else 0.0,
+            'stage_busy_s': {k: round(v, 3) for k, v in self.stage_time.items()},
+            'queue_depth': {
+                name: {
+                    'mean': round(total / count, 2) if count else 0.0,
+                    'max': peak
+                }
+                for name, (count, total, peak) in self.depth_samples.items()
+            }
+        }
+
+
+class FramePipeline:
+    """
+    Runs a VideoProcessor as three stages: a decoder thread feeding a bounded
+    frame queue, an inference thread running YOLO over frame batches, and the
+    tracking/violation stage on the calling thread, which sees frames in order.
+
+    With a motion gate, whether a frame needs YOLO depends on the tracker state
+    after the previous frame. The track stage then makes the gate decision and runs
+    inference one frame at a time, so the results match sequential mode exactly,
+    and only decoding runs ahead on its own thread.
+    """
+    def __init__(self, processor, batch_size=4, queue_size=32):
+        self.processor = processor
+        self.batch_size = max(1, int(batch_size))
+        self.frame_queue = queue.Queue(maxsize=queue_size)
+        self.result_queue = queue.Queue(maxsize=max(2, queue_size // self.batch_size))
+        self.stop_event = threading.Event()
+        self.stats = PipelineStats()
+        self.error = None
+        self.gated = processor.motion_gate is not None
+
+    def _put(self, q, item):
+        """Put into a bounded queue without blocking forever once the pipeline stops"""
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fail(self, stage, error):
+        logger.error(f"Pipeline {stage} stage failed: {error}")
+        if self.error is None:
+            self.error = error
+        self.stop_event.set()
+
+    def _decode(self, cap):
+        try:
+            frame_number = 0
+            while not self.stop_event.is_set():
+                start = time.perf_counter()
+                ret, frame = cap.read()
+                elapsed = time.perf_counter() - start
+                self.stats.add_time('decode', elapsed)
+                metrics.STAGE_SECONDS.observe(elapsed, 'decode')
+                if not ret:
+                    break
+
+                frame_number += 1
+                self.stats.frames += 1
+                if not self._put(self.frame_queue, (frame_number, frame)):
+                    break
+        except Exception as e:
+            self._fail('decode', e)
+        finally:
+            cap.release()
+            self._put(self.frame_queue, _END)
+
+    def _infer(self):
+        try:
+            done = False
+            while not done and not self.stop_event.is_set():
+                try:
+                    item = self.frame_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                self.stats.sample_depth('frames', self.frame_queue.qsize())
+                if item is _END:
+                    break
+
+                # Fill the batch with whatever is already decoded, never wait for more
+                batch = [item]
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self.frame_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _END:
+                        done = True
+                        break
+                    batch.append(item)
+
+                start = time.perf_counter()
+                detections = self.processor.infer_batch([frame for _, frame in batch])
+                self.stats.add_time('infer', time.perf_counter() - start)
+                self.stats.batches += 1
+
+                for (frame_number, frame), frame_detections in zip(batch, detections):
+                    if not self._put(self.result_queue, (frame_number, frame, frame_detections)):
+                        return
+        except Exception as e:
+            self._fail('infer', e)
+        finally:
+            self._put(self.result_queue, _END)
+
+    def run(self, video_path, progress_callback=None, should_stop=None):
+        """Process the whole video and return the run summary"""
+        cap = cv2.VideoCapture(str(video_path))
+        if not cap.isOpened():
+            cap.release()
+            raise ValueError(f"Failed to open video file: {video_path}")
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        decoder = threading.Thread(target=self._decode, args=(cap,), name="pipeline-decode", daemon=True)
+        decoder.start()
+        inferer = None
+        if not self.gated:
+            inferer = threading.Thread(target=self._infer, name="pipeline-infer", daemon=True)
+            inferer.start()
+        # Gated frames go straight from the decoder to the track stage
+        results = self.frame_queue if self.gated else self.result_queue
+
+        try:
+            while True:
+                if should_stop and should_stop():
+                    logger.info(f"Stopped pipeline for {video_path} after {self.stats.frames} frames")
+                    break
+                try:
+                    item = results.get(timeout=0.1)
+                except queue.Empty:
+                    if self.stop_event.is_set():
+                        break
+                    continue
+                self.stats.sample_depth('frames' if self.gated else 'results', results.qsize())
+                if item is _END:
+                    break
+
+                if self.gated:
+                    frame_number, frame = item
+                    if not self.processor.should_infer(frame):
+                        self.processor.skip_frame(frame, frame_number)
+                        continue
+                    start = time.perf_counter()
+                    detections = self.processor.infer_batch([frame])[0]
+                    self.stats.add_time('infer', time.perf_counter() - start)
+                    self.stats.batches += 1
+                else:
+                    frame_number, frame, detections = item
+                start = time.perf_counter()
+                self.processor.handle_frame(frame, detections, frame_number)
+                self.stats.add_time('track', time.perf_counter() - start)
+                self.stats.frames_inferred += 1
+
+                if progress_callback:
+                    elapsed = time.perf_counter() - self.stats.started
+                    progress_callback(frame_number, total_frames, frame_number / elapsed,
+                                      self.processor.violation_count)
+        except Exception as e:
+            self._fail('track', e)
+        finally:
+            self.stop_event.set()
+            decoder.join()
+            if inferer is not None:
+                inferer.join()
+            self.stats.finish()
+
+        if self.error is not None:
+            raise self.error
+
+        summary = self.stats.summary()
+        logger.info(
+            f"Pipeline processed {summary['frames']} frames ({summary['frames_inferred']} inferred) "
+            f"in {summary['batches']} batches "
+            f"at {summary['fps']} fps; stage busy time {summary['stage_busy_s']}; "
+            f"queue depth {summary['queue_depth']}"
+        )
+        return summary
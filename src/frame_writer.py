@@ -0,0 +1,126 @@
+import cv2
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+from src import metrics
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FRAMES_DROPPED = metrics.counter('pizza_violation_frames_dropped_total', 'Violation frames dropped by a full writer queue')
+
+
+def thumbnail_path(frame_path):
+    """Where the thumbnail of a violation frame is written"""
+    frame_path = Path(frame_path)
+    return frame_path.parent / "thumbnails" / frame_path.name
+
+
+class FrameWriter:
+    """
+    Background writer for violation frames: annotation, JPEG encoding and disk
+    writes happen on a worker thread fed by a bounded queue
+    """
+    def __init__(self, jpeg_quality=90, thumbnail_width=None, queue_size=64, block_when_full=False):
+        self.jpeg_quality = jpeg_quality
+        self.thumbnail_width = thumbnail_width  # Also write a downscaled copy when set
+        self.block_when_full = block_when_full  # Backpressure instead of dropping when behind
+        self.queue = queue.Queue(maxsize=queue_size)
+
+        self.frames_written = 0
+        self.frames_dropped = 0
+        self.max_queue_depth = 0
+        self.encode_time = 0.0
+        self.max_encode_time = 0.0
+        self.write_time = 0.0
+
+        self.thread = threading.Thread(target=self._run, name="frame-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, frame_path, frame, annotate=None):
+        """
+        Queue a frame for writing and return its final path right away, or None if the
+        queue is full and frames are being dropped. annotate(image) draws on a private
+        copy of the frame on the writer thread.
+        """
+        job = (Path(frame_path), frame.copy(), annotate)
+        try:
+            if self.block_when_full:
+                self.queue.put(job)
+            else:
+                self.queue.put_nowait(job)
+        except queue.Full:
+            self.frames_dropped += 1
+            FRAMES_DROPPED.inc()
+            if self.frames_dropped == 1 or self.frames_dropped % 50 == 0:
+                logger.warning(f"Frame writer behind, dropped {frame_path} "
+                               f"({self.frames_dropped} dropped so far)")
+            return None
+        depth = self.queue.qsize()
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+        metrics.QUEUE_DEPTH.set(depth, 'frame_writer')
+        return str(frame_path)
+
+    def _write(self, path, data):
+        # Write under a temporary name first so readers never see a partial JPEG
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _encode(self, image):
+        ok, data = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        return data.tobytes()
+
+    def _run(self):
+        while True:
+            path, image, annotate = self.queue.get()
+            try:
+                start = time.perf_counter()
+                if annotate is not None:
+                    with metrics.STAGE_SECONDS.time('annotate'):
+                        annotate(image)
+                with metrics.STAGE_SECONDS.time('encode'):
+                    encoded = [(path, self._encode(image))]
+                if self.thumbnail_width and image.shape[1] > self.thumbnail_width:
+                    scale = self.thumbnail_width / image.shape[1]
+                    thumb = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+                    encoded.append((thumbnail_path(path), self._encode(thumb)))
+                encode_time = time.perf_counter() - start
+                self.encode_time += encode_time
+                self.max_encode_time = max(self.max_encode_time, encode_time)
+
+                start = time.perf_counter()
+                for target, data in encoded:
+                    self._write(target, data)
+                write_time = time.perf_counter() - start
+                self.write_time += write_time
+                metrics.STAGE_SECONDS.observe(write_time, 'write')
+                self.frames_written += 1
+            except Exception as e:
+                logger.error(f"Failed to write violation frame {path}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """Block until every queued frame is on disk"""
+        self.queue.join()
+
+    def metrics(self):
+        written = self.frames_written
+        return {
+            'frames_written': written,
+            'frames_dropped': self.frames_dropped,
+            'queue_depth': self.queue.qsize(),
+            'max_queue_depth': self.max_queue_depth,
+            'encode_ms_avg': round(self.encode_time / written * 1000, 2) if written else 0.0,
+            'encode_ms_max': round(self.max_encode_time * 1000, 2),
+            'write_ms_avg': round(self.write_time / written * 1000, 2) if written else 0.0
+        }
@@ -0,0 +1,174 @@
+from operator import itemgetter
+
+import numpy as np
+
+from src.region_mask import RegionMask
+
+# close_pairs() compares up to this many point pairs in plain Python and vectorizes above
+# it; 64 is about 8 tracked hands (see HandTracker for the benchmark numbers)
+LOOP_MAX_PAIRS = 64
+
+
+def pairwise_distances(a, b):
+    """(len(a), len(b)) matrix of Euclidean distances between two sets of points"""
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 2)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 2)
+    return np.hypot(a[:, None, 0] - b[None, :, 0], a[:, None, 1] - b[None, :, 1])
+
+
+def close_pairs(a, b, max_distance, loop_max_pairs=LOOP_MAX_PAIRS):
+    """
+    (i, j) for each integer point a[i] closer than max_distance[i] to b[j], closest
+    pairs first and in (i, j) order among equal distances. Squared distances are
+    compared as integers, so the loop and NumPy versions return the same pairs.
+    """
+    if len(a) * len(b) <= loop_max_pairs:
+        pairs = []
+        for i, ((ax, ay), limit) in enumerate(zip(a, max_distance)):
+            limit *= limit
+            for j, (bx, by) in enumerate(b):
+                distance = (bx - ax) ** 2 + (by - ay) ** 2
+                if distance < limit:
+                    pairs.append((distance, i, j))
+        pairs.sort(key=itemgetter(0))  # Stable, like the argsort below
+        return [(i, j) for _, i, j in pairs]
+
+    a = np.asarray(a, dtype=np.int64).reshape(-1, 2)
+    b = np.asarray(b, dtype=np.int64).reshape(-1, 2)
+    distances = ((a[:, None, :] - b[None, :, :]) ** 2).sum(axis=2)
+    limits = np.asarray(max_distance, dtype=np.float64) ** 2
+    rows, cols = np.nonzero(distances < limits[:, None])
+    order = np.argsort(distances[rows, cols], kind='stable')
+    return list(zip(rows[order].tolist(), cols[order].tolist()))
+
+
+class HandTracker:
+    """
+    Tracks hands that entered any station and matches tracks to detections one-to-one
+    by distance, closest pairs first.
+
+    The track x hand distances are the only part that grows quadratically, and
+    close_pairs() vectorizes them once a frame has more than loop_max_pairs pairs.
+    Everything else runs per track or per hand in Python. Per frame, measured with
+    benchmarks/bench_hand_tracker.py (best of 3):
+    - 1-2 hands: the loops take 7-8 us against 18-21 us for NumPy.
+    - 8 hands (about 64 pairs): 39-41 us against 50-53 us.
+    - Around 12 hands the two break even, and from 16 hands NumPy wins.
+    """
+    def __init__(self, stations, loop_max_pairs=LOOP_MAX_PAIRS):
+        self.stations = stations
+        self.station_mask = RegionMask([station.polygon for station in stations])
+        # Per-station thresholds, indexed by each track's station
+        self.match_distances = [float(s.hand_match_distance) for s in stations]
+        self.scooper_distances = [float(s.scooper_distance) for s in stations]
+        self.loop_max_pairs = loop_max_pairs
+        self.reset()
+
+    def reset(self):
+        self._drop_tracks()
+        self.next_id = 0
+
+    def _drop_tracks(self):
+        # Per-track state, one entry per track in creation order
+        self.ids = []
+        self.positions = []  # [x, y]
+        self.station = []
+        self.entered_with_scooper = []
+        self.left_checked = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def state_dict(self):
+        """JSON-serializable track state, for checkpoints"""
+        return {
+            'ids': list(self.ids),
+            'positions': [list(position) for position in self.positions],
+            'station': list(self.station),
+            'entered_with_scooper': list(self.entered_with_scooper),
+            'left_checked': list(self.left_checked),
+            'next_id': self.next_id
+        }
+
+    def load_state_dict(self, state):
+        self.ids = [int(v) for v in state['ids']]
+        self.positions = [[int(x), int(y)] for x, y in state['positions']]
+        self.station = [int(v) for v in state['station']]
+        self.entered_with_scooper = [bool(v) for v in state['entered_with_scooper']]
+        self.left_checked = [bool(v) for v in state['left_checked']]
+        self.next_id = state['next_id']
+
+    @staticmethod
+    def _near_scooper(hand, scoopers, radius):
+        x, y = hand
+        limit = radius * radius
+        return any((sx - x) ** 2 + (sy - y) ** 2 < limit for sx, sy in scoopers)
+
+    def update(self, hand_centers, scooper_centers):
+        """
+        Advance tracks by one frame of hand and scooper centers.
+        Returns (hand index, station index) for each hand that just left its station
+        without a scooper nearby, in track order.
+        """
+        hands = _point_list(hand_centers)
+        if not hands:
+            # Every track lost its hand
+            self._drop_tracks()
+            return []
+        scoopers = _point_list(scooper_centers)
+        hand_station = [self.station_mask.lookup_point(x, y) for x, y in hands]
+
+        # Match existing tracks to current hands
+        track_for_hand = [-1] * len(hands)
+        hand_for_track = [-1] * len(self.ids)
+        limits = [self.match_distances[station] for station in self.station]
+        for track, hand in close_pairs(self.positions, hands, limits, self.loop_max_pairs):
+            if hand_for_track[track] < 0 and track_for_hand[hand] < 0:
+                hand_for_track[track] = hand
+                track_for_hand[hand] = track
+
+        violators = []
+        kept = []
+        for track, hand in enumerate(hand_for_track):
+            if hand < 0:
+                # Drop tracks that found no hand this frame
+                continue
+            self.positions[track] = list(hands[hand])
+            station = self.station[track]
+            # Matched hands that are now outside their station and have not been checked yet
+            if hand_station[hand] != station and not self.left_checked[track]:
+                self.left_checked[track] = True
+                if not self._near_scooper(hands[hand], scoopers, self.scooper_distances[station]):
+                    violators.append((hand, station))
+            kept.append(track)
+        if len(kept) < len(self.ids):
+            self.ids = [self.ids[t] for t in kept]
+            self.positions = [self.positions[t] for t in kept]
+            self.station = [self.station[t] for t in kept]
+            self.entered_with_scooper = [self.entered_with_scooper[t] for t in kept]
+            self.left_checked = [self.left_checked[t] for t in kept]
+
+        # Unmatched hands inside a station and away from every track start new tracks
+        new = [hand for hand, station in enumerate(hand_station) if station >= 0 and track_for_hand[hand] < 0]
+        if new and self.positions:
+            crowded = {i for i, _ in close_pairs([hands[hand] for hand in new], self.positions,
+                                                 [self.match_distances[hand_station[hand]] for hand in new],
+                                                 self.loop_max_pairs)}
+            new = [hand for i, hand in enumerate(new) if i not in crowded]
+        for hand in new:
+            station = hand_station[hand]
+            self.ids.append(self.next_id)
+            self.next_id += 1
+            self.positions.append(list(hands[hand]))
+            self.station.append(station)
+            self.entered_with_scooper.append(
+                self._near_scooper(hands[hand], scoopers, self.scooper_distances[station]))
+            self.left_checked.append(False)
+        return violators
+
+
+def _point_list(points):
+    """(x, y) integer pairs from an (N, 2) array or a sequence of points"""
+    if isinstance(points, np.ndarray):
+        return np.asarray(points, dtype=np.int64).reshape(-1, 2).tolist()
+    return [(int(x), int(y)) for x, y in points]
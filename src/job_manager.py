@@ -0,0 +1,278 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+
+from src import metrics
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds between progress updates sent back from a worker process
+PROGRESS_INTERVAL = 0.5
+
+# One VideoProcessor (and therefore one loaded model) per worker process
+_worker_processor = None
+# Shared dict the worker's metrics snapshots go to, keyed by pid
+_worker_metrics = None
+# Cold-start timings of this worker
+_worker_startup = {}
+
+
+def _init_worker(processor_kwargs, worker_metrics=None, worker_status=None):
+    """
+    Load the model once when a worker process starts and run a first inference, so
+    the first job doesn't pay for it. Timings (or the error) go to worker_status by pid.
+    """
+    global _worker_processor, _worker_metrics
+    pid = os.getpid()
+    try:
+        started = time.perf_counter()
+        from src.video_processor import VideoProcessor
+        imported = time.perf_counter()
+        _worker_processor = VideoProcessor(**processor_kwargs)
+        loaded = time.perf_counter()
+        _worker_processor.model.warmup()
+        warmed = time.perf_counter()
+    except Exception as e:
+        if worker_status is not None:
+            worker_status[pid] = {'pid': pid, 'status': 'failed', 'error': str(e)}
+        raise
+    _worker_startup.update({
+        'pid': pid,
+        'status': 'ready',
+        'backend': _worker_processor.model.backend,
+        'import_s': round(imported - started, 3),
+        'model_load_s': round(loaded - imported, 3),
+        'first_inference_s': round(warmed - loaded, 3)
+    })
+    logger.info(f"Worker {pid} cold start: imports {imported - started:.2f}s, "
+                f"model {loaded - imported:.2f}s, first inference {warmed - loaded:.2f}s")
+    if worker_status is not None:
+        worker_status[pid] = dict(_worker_startup)
+    _worker_metrics = worker_metrics
+    if os.environ.get("PROFILE_DIR"):
+        from src.sampling_profiler import install_signal_toggle
+        install_signal_toggle(os.environ["PROFILE_DIR"])
+
+
+def _warm_up():
+    """No-op job: submitting it makes the pool start a worker, which loads the model"""
+    return dict(_worker_startup)
+
+
+def _publish_metrics():
+    """Hand this worker's metrics to the web process, which serves them on /metrics"""
+    if _worker_metrics is not None and metrics.registry.enabled:
+        _worker_metrics[os.getpid()] = metrics.registry.snapshot()
+
+
+def _run_job(job_id, video_path, progress, cancelled, events, live=False, realtime=False):
+    """Process one video (or live feed, until cancelled) inside a worker process, publishing throttled progress"""
+    processor = _worker_processor
+    processor.reset_state()
+    # Violation events go straight back to the web process, tagged with the job
+    processor.event_callback = lambda event: events.put(dict(event, job_id=job_id))
+    state = {'last_report': 0.0, 'stop': False}
+
+    def report(frames_done, total_frames, fps, violation_count):
+        now = time.monotonic()
+        if now - state['last_report'] < PROGRESS_INTERVAL:
+            return
+        state['last_report'] = now
+        progress[job_id] = {
+            'status': 'running',
+            'frames_done': frames_done,
+            'total_frames': total_frames,
+            'fps': round(fps, 2),
+            'violation_count': violation_count
+        }
+        # Piggyback the cancel check and metrics on the progress round trip
+        state['stop'] = cancelled.get(job_id, False)
+        _publish_metrics()
+
+    def should_stop():
+        return state['stop']
+
+    progress[job_id] = {'status': 'running', 'frames_done': 0, 'total_frames': 0, 'fps': 0.0, 'violation_count': 0}
+    if live:
+        violation_count = processor.run_live(video_path, progress_callback=report, should_stop=should_stop,
+                                             realtime=realtime)
+    else:
+        violation_count = processor.run_video(video_path, progress_callback=report, should_stop=should_stop)
+    _publish_metrics()
+    stats = processor.last_run_stats or {}
+    result = {
+        'cancelled': state['stop'],
+        'frames_done': stats.get('frames', 0),
+        'fps': stats.get('fps', 0.0),
+        'violation_count': violation_count
+    }
+    if live:
+        for key in ('frames_captured', 'frames_dropped', 'reconnects', 'frame_latency_ms', 'capture_to_alert_ms'):
+            result[key] = stats.get(key)
+    return result
+
+
+class JobManager:
+    """
+    Runs video processing jobs in a pool of worker processes and tracks their progress
+    """
+    def __init__(self, max_workers=2, processor_kwargs=None):
+        self.max_workers = max_workers
+        context = multiprocessing.get_context("spawn")
+        self.manager = context.Manager()
+        self.progress = self.manager.dict()
+        self.cancelled = self.manager.dict()
+        self.events = self.manager.Queue()
+        self.worker_metrics = self.manager.dict()
+        self.worker_status = self.manager.dict()
+        self.executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(processor_kwargs or {}, self.worker_metrics, self.worker_status)
+        )
+        self.jobs = {}
+        self.lock = threading.Lock()
+        logger.info(f"Job manager started with {max_workers} worker processes")
+
+    def submit(self, video_path, file_name=None, live=False, realtime=False, on_done=None):
+        """
+        Queue a video for processing and return its job id. live=True processes a feed on
+        its freshest frames until it ends or the job is cancelled; it holds a worker meanwhile.
+        on_done(job) is called with the final status snapshot.
+        """
+        job_id = uuid.uuid4().hex
+        with self.lock:
+            self.jobs[job_id] = {
+                'job_id': job_id,
+                'file_name': file_name or str(video_path),
+                'status': 'queued',
+                'created_at': time.time(),
+                'finished_at': None,
+                'result': None,
+                'error': None,
+                'live': live,
+                'on_done': on_done,
+                'future': self.executor.submit(_run_job, job_id, video_path if live else str(video_path),
+                                               self.progress, self.cancelled, self.events, live, realtime)
+            }
+            future = self.jobs[job_id]['future']
+        future.add_done_callback(lambda f: self._on_done(job_id, f))
+        logger.info(f"Queued job {job_id} for {video_path}")
+        return job_id
+
+    def _on_done(self, job_id, future):
+        with self.lock:
+            job = self.jobs[job_id]
+            job['finished_at'] = time.time()
+            try:
+                result = future.result()
+                job['result'] = result
+                job['status'] = 'cancelled' if result['cancelled'] else 'completed'
+            except CancelledError:
+                job['status'] = 'cancelled'
+            except Exception as e:
+                job['status'] = 'failed'
+                job['error'] = str(e)
+                logger.error(f"Job {job_id} failed: {e}")
+        self.cancelled.pop(job_id, None)
+        self.progress.pop(job_id, None)
+        logger.info(f"Job {job_id} {job['status']}")
+        if job['on_done'] is not None:
+            try:
+                job['on_done'](self.get(job_id))
+            except Exception as e:
+                logger.error(f"Job {job_id} completion callback failed: {e}")
+
+    def get(self, job_id):
+        """Return a JSON-serializable status snapshot, or None for an unknown job"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            snapshot = {k: v for k, v in job.items() if k not in ('future', 'on_done')}
+
+        if snapshot['status'] == 'queued' and job_id in self.progress:
+            snapshot['status'] = 'running'
+        if snapshot['result'] is not None:
+            snapshot.update(snapshot.pop('result'))
+        else:
+            snapshot.pop('result')
+            live = self.progress.get(job_id, {})
+            snapshot.update({k: v for k, v in live.items() if k != 'status'})
+        return snapshot
+
+    def cancel(self, job_id):
+        """Cancel a queued job or ask a running one to stop; returns False for unknown jobs"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return False
+            if job['status'] in ('completed', 'failed', 'cancelled'):
+                return True
+        if not job['future'].cancel():
+            self.cancelled[job_id] = True
+        logger.info(f"Cancellation requested for job {job_id}")
+        return True
+
+    def forward_events(self, callback):
+        """Call callback(event) for every violation event from the workers, on a daemon thread"""
+        def pump():
+            while True:
+                try:
+                    event = self.events.get()
+                except (EOFError, OSError):
+                    break  # Manager shut down
+                try:
+                    callback(event)
+                except Exception as e:
+                    logger.error(f"Failed to forward violation event: {e}")
+
+        threading.Thread(target=pump, name="job-events", daemon=True).start()
+
+    def warm_up(self, timeout=300.0):
+        """
+        Start every worker process now instead of on the first jobs, and wait until
+        they have loaded the model. Returns their cold-start timings; raises if a
+        worker failed to load it.
+        """
+        futures = [self.executor.submit(_warm_up) for _ in range(self.max_workers)]
+        for future in futures:
+            future.result()
+        # A fast worker can take several warm-up jobs; wait for the others to finish loading too
+        deadline = time.monotonic() + timeout
+        while len(self.worker_status) < self.max_workers and time.monotonic() < deadline:
+            time.sleep(0.1)
+        return self.worker_startup()
+
+    def worker_startup(self):
+        """Cold-start timings or load error of each worker process started so far"""
+        try:
+            return list(self.worker_status.values())
+        except (EOFError, OSError):
+            return []  # Manager shut down
+
+    def metrics_snapshots(self):
+        """Latest metrics snapshot of every worker process"""
+        try:
+            return list(self.worker_metrics.values())
+        except (EOFError, OSError):
+            return []  # Manager shut down
+
+    def total_violations(self):
+        """Sum of violations over all jobs, including those still running"""
+        with self.lock:
+            job_ids = list(self.jobs)
+        return sum(self.get(job_id).get('violation_count', 0) for job_id in job_ids)
+
+    def shutdown(self):
+        for job_id in list(self.jobs):
+            self.cancel(job_id)
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.manager.shutdown()
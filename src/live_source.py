@@ -0,0 +1,186 @@
+import argparse
+import cv2
+import json
+import logging
+import threading
+import time
+
+from src import metrics
+from src.detectors import add_detector_arguments, detector_kwargs
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FRAMES_DROPPED = metrics.counter('pizza_frames_dropped_total', 'Live frames dropped because inference fell behind', ['camera'])
+
+
+def is_live_source(source):
+    """URLs (rtsp://, http://, ...) and webcam indexes are treated as live feeds, everything else as a file"""
+    return isinstance(source, int) or "://" in str(source)
+
+
+class LiveCapture:
+    """
+    Reads a video feed on a background thread and keeps only the newest frame, so a
+    consumer slower than the camera always gets the freshest frame instead of a
+    growing backlog. Frames replaced before they were read count as dropped.
+
+    A lost feed is reopened with exponential backoff (by default for URLs and webcams).
+    realtime=True plays a file at its own frame rate, as a stand-in for a camera.
+    """
+    def __init__(self, source, realtime=False, reconnect=None, backoff_initial=0.5, backoff_max=10.0,
+                 max_reconnects=None, camera_id=None):
+        self.source = source
+        self.realtime = realtime
+        self.reconnect = is_live_source(source) if reconnect is None else reconnect
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.max_reconnects = max_reconnects  # None: keep trying until stopped
+        self.metrics_camera = str(camera_id or '')
+
+        self.condition = threading.Condition()
+        self.latest = None  # (frame_number, frame, captured_at)
+        self.ended = False
+        self.stop_event = threading.Event()
+        self.thread = None
+
+        self.connected = False
+        self.fps = None
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.reconnects = 0
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="live-capture", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.source if isinstance(self.source, int) else str(self.source))
+        if not cap.isOpened():
+            cap.release()
+            raise ConnectionError(f"Failed to open video source: {self.source}")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps and fps > 0 else 30.0
+        return cap
+
+    def _run(self):
+        backoff = self.backoff_initial
+        frame_number = 0
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    cap = self._open()
+                except ConnectionError as e:
+                    logger.error(str(e))
+                    cap = None
+                if cap is not None:
+                    if self.reconnects:
+                        logger.info(f"Reconnected to {self.source}")
+                    self.connected = True
+                    backoff = self.backoff_initial
+                    try:
+                        frame_number = self._read_frames(cap, frame_number)
+                    finally:
+                        cap.release()
+                        self.connected = False
+
+                if self.stop_event.is_set() or not self.reconnect:
+                    break
+                if self.max_reconnects is not None and self.reconnects >= self.max_reconnects:
+                    logger.error(f"Giving up on {self.source} after {self.reconnects} reconnects")
+                    break
+                self.reconnects += 1
+                logger.warning(f"Lost {self.source}; reconnecting in {backoff:.1f}s")
+                self.stop_event.wait(backoff)
+                backoff = min(backoff * 2, self.backoff_max)
+        except Exception as e:
+            logger.error(f"Live capture of {self.source} failed: {e}")
+        finally:
+            with self.condition:
+                self.ended = True
+                self.condition.notify_all()
+
+    def _read_frames(self, cap, frame_number):
+        """Read until the feed ends or fails; frame numbers continue across reconnects"""
+        started = time.monotonic()
+        played = 0
+        while not self.stop_event.is_set():
+            if self.realtime:
+                # Frame n of the file is "captured" n / fps seconds after it was opened
+                delay = started + played / self.fps - time.monotonic()
+                if delay > 0 and self.stop_event.wait(delay):
+                    break
+            ret, frame = cap.read()
+            if not ret:
+                break
+            played += 1
+            frame_number += 1
+            captured_at = time.monotonic()
+            with self.condition:
+                if self.latest is not None:
+                    self.frames_dropped += 1
+                    FRAMES_DROPPED.inc(1, self.metrics_camera)
+                self.latest = (frame_number, frame, captured_at)
+                self.frames_captured += 1
+                self.condition.notify()
+        return frame_number
+
+    def read(self, timeout=None):
+        """
+        Newest frame not read yet as (frame_number, frame, captured_at), captured_at on
+        the time.monotonic() clock. Returns None on timeout or once the feed has ended
+        (check .ended).
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.latest is not None or self.ended or self.stop_event.is_set(),
+                                    timeout)
+            item, self.latest = self.latest, None
+            return item
+
+    def metrics(self):
+        return {
+            'connected': self.connected,
+            'frames_captured': self.frames_captured,
+            'frames_dropped': self.frames_dropped,
+            'reconnects': self.reconnects
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Process a live feed (RTSP/HTTP URL or webcam index) on the freshest frame. "
+                    "--realtime plays a file at its frame rate as a stand-in for a camera."
+    )
+    parser.add_argument("source", help="rtsp://..., http://..., a webcam index or a file with --realtime")
+    parser.add_argument("--realtime", action="store_true", help="Play a file at its own frame rate")
+    parser.add_argument("--config", help="Camera config JSON with stations")
+    parser.add_argument("--camera", help="Camera id in --config")
+    add_detector_arguments(parser)
+    args = parser.parse_args()
+
+    from src.camera_config import load_camera_configs
+    from src.video_processor import VideoProcessor
+
+    camera_config = load_camera_configs(args.config).get(args.camera) if args.config else None
+    source = int(args.source) if args.source.isdigit() else args.source
+    processor = VideoProcessor(model_path=args.model, camera_id=args.camera, camera_config=camera_config,
+                               **detector_kwargs(args))
+    try:
+        processor.run_live(source, realtime=args.realtime)
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(processor.last_run_stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
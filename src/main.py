@@ -1,14 +1,25 @@
+import time
+# Cold-start timings of the web app are measured from here
+IMPORT_STARTED = time.perf_counter()
 from fastapi import FastAPI, Request, UploadFile, File, HTTPException, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, PlainTextResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from src.detection_service import DetectionService
-from src.video_processor import VideoProcessor
-import shutil
+from src import metrics
+from src.broadcaster import Broadcaster
+from src.job_manager import JobManager
+from src.live_source import is_live_source
+from src.readiness import Readiness
+from src.sampling_profiler import SamplingProfiler, install_signal_toggle
+from src.transport import check_broker
+from src.upload_store import UploadStore
+from src.violation_store import ViolationStore
 import os
 import asyncio
 import logging
+import threading
 from pathlib import Path
+from typing import Optional
 
 # Set up logging
 logging.basicConfig(
@@ -23,57 +34,221 @@ app = FastAPI()
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
-# Initialize services
-detection_service = DetectionService()
-video_processor = VideoProcessor()
+# Initialize services. Only cheap objects are created here: the model, database and
+# broker are started or checked in the background once the app is serving (see /ready)
+readiness = Readiness(required=('db', 'model'))
+# Uploads are processed in worker processes, each holding its own model
+processor_kwargs = {}
+# Inference backend: DETECTOR_MODEL=model.onnx (or an OpenVINO model directory) runs without PyTorch
+if os.environ.get("DETECTOR_MODEL"):
+    processor_kwargs['model_path'] = os.environ["DETECTOR_MODEL"]
+if os.environ.get("DETECTOR_BACKEND"):
+    processor_kwargs['backend'] = os.environ["DETECTOR_BACKEND"]
+if os.environ.get("DETECTOR_IMGSZ"):
+    processor_kwargs['imgsz'] = int(os.environ["DETECTOR_IMGSZ"])
+if os.environ.get("DETECTOR_THREADS"):
+    processor_kwargs['threads'] = int(os.environ["DETECTOR_THREADS"])
+# MP4 clips around violations from frames already in memory; CLIP_MEMORY_MB=0 turns them off
+clip_memory_mb = float(os.environ.get("CLIP_MEMORY_MB", 256))
+if clip_memory_mb > 0:
+    processor_kwargs['violation_clips'] = True
+    processor_kwargs['clip_memory_mb'] = clip_memory_mb
+# Downscaled copies of violation frames for the dashboard; THUMBNAIL_WIDTH=0 turns them off
+thumbnail_width = int(os.environ.get("THUMBNAIL_WIDTH", 320))
+if thumbnail_width > 0:
+    processor_kwargs['thumbnail_width'] = thumbnail_width
+if os.environ.get("DETECTION_CACHE_DIR"):
+    # Re-uploading a video after changing rules replays cached detections instead of running YOLO
+    processor_kwargs['detection_cache'] = os.environ["DETECTION_CACHE_DIR"]
+job_manager = JobManager(max_workers=int(os.environ.get("MAX_CONCURRENT_JOBS", 2)), processor_kwargs=processor_kwargs)
 
-# Store active websocket connections
-active_connections = []
+# Uploaded videos, stored once per content hash with the result of the job that processed them
+upload_store = UploadStore("uploaded_videos")
+
+# Violations recorded by the processors, read through indexed queries and counters
+DB_PATH = "violations.db"
+_violation_store = None
+_violation_store_lock = threading.Lock()
+
+def get_violation_store():
+    """Open the violations database on first use"""
+    global _violation_store
+    with _violation_store_lock:
+        if _violation_store is None:
+            _violation_store = ViolationStore(DB_PATH)
+        return _violation_store
+
+# RabbitMQ is optional for the web app (detection streams go to DetectionService workers),
+# so it is only reported by /ready, rechecked every BROKER_CHECK_INTERVAL seconds
+RABBITMQ_HOST = os.environ.get("RABBITMQ_HOST", "localhost")
+BROKER_CHECK_INTERVAL = 30.0
+
+# Live violation events fan out to dashboard WebSockets
+broadcaster = Broadcaster()
+
+# Read when /metrics is scraped, so they cost nothing in between
+metrics.gauge('pizza_websocket_clients', 'Connected dashboard WebSocket clients').set_function(
+    lambda: len(broadcaster.clients))
+metrics.gauge('pizza_websocket_events_dropped', 'Events dropped for connected slow WebSocket clients').set_function(
+    lambda: broadcaster.metrics()['events_dropped'])
+
+# PROFILE_DIR enables the sampling profiler: /debug/profile here, `kill -USR2` twice for any process
+if os.environ.get("PROFILE_DIR"):
+    install_signal_toggle(os.environ["PROFILE_DIR"])
+
+def start_db():
+    with readiness.starting('db') as details:
+        details['violation_count'] = get_violation_store().count()
+
+def start_model():
+    """Start the job workers, which load the model and run a first inference"""
+    with readiness.starting('model') as details:
+        try:
+            details['workers'] = job_manager.warm_up()
+        except Exception:
+            # The pool only says a worker died; the workers record why
+            details['workers'] = job_manager.worker_startup()
+            raise
+
+def watch_broker():
+    while True:
+        with readiness.starting('broker', failed_status='unavailable') as details:
+            details['host'] = RABBITMQ_HOST
+            check_broker(RABBITMQ_HOST)
+        time.sleep(BROKER_CHECK_INTERVAL)
+
+@app.on_event("startup")
+async def start_event_forwarding():
+    broadcaster.bind_loop(asyncio.get_running_loop())
+    job_manager.forward_events(broadcaster.publish_threadsafe)
+    # Serve at once; the slow components start on their own threads
+    for target in (start_db, start_model, watch_broker):
+        threading.Thread(target=target, name=target.__name__, daemon=True).start()
+    readiness.set('web', 'ready', time.perf_counter() - IMPORT_STARTED)
+
+@app.get("/health")
+async def health():
+    """Liveness: the web app is up, whatever the state of its components"""
+    return {"status": "ok"}
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness with the status and cold-start seconds of the model workers, database
+    and broker; 503 until the model and database are ready
+    """
+    snapshot = readiness.snapshot()
+    return JSONResponse(snapshot, status_code=200 if snapshot['ready'] else 503)
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
 
 @app.get("/violations/count")
-async def get_violation_count():
-    frames_dir = Path("violation_frames")
-    frames = []
-    if frames_dir.exists():
-        frames = sorted(
-            [f.name for f in frames_dir.glob("*.jpg")],
-            key=lambda x: os.path.getctime(frames_dir / x),
-            reverse=True
-        )
-    
+def get_violation_count(limit: int = 100):
+    frames = [Path(path).name for path in get_violation_store().recent_frames(limit)]
     return {
-        "violation_count": video_processor.violation_count,
+        "violation_count": get_violation_store().count(),
         "frames": frames
     }
 
-@app.post("/process_video_upload")
-async def process_video_upload(file: UploadFile = File(...)):
+def etag_matches(request, etag):
+    """Whether the request's If-None-Match names this ETag (weak comparison)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag.removeprefix("W/") for tag in header.split(","))
+
+def cached_file_response(request, path, media_type=None):
+    """
+    Serve a violation frame or clip. They are written atomically under unique names and
+    never change, so browsers may keep them; a revalidation gets 304 without the file.
+    """
+    stat = path.stat()
+    headers = {
+        "ETag": f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"',
+        "Cache-Control": "public, max-age=31536000, immutable"
+    }
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers, stat_result=stat)
+
+def dashboard_entry(item):
+    """A violation row as the dashboard shows it, with the URLs of its frame, thumbnail and clip"""
+    frame_name = Path(item['frame_path']).name if item['frame_path'] else None
+    clip = (item['metadata'] or {}).get('clip')
+    return {
+        "id": item['id'],
+        "timestamp": item['timestamp'],
+        "frame_number": item['frame_number'],
+        "camera_id": item['camera_id'],
+        "station": item['station'],
+        "violation_type": item['violation_type'],
+        "frame_name": frame_name,
+        "frame_url": f"/violation_frames/{frame_name}" if frame_name else None,
+        "thumbnail_url": f"/violation_frames/thumbnails/{frame_name}" if frame_name else None,
+        "clip_url": f"/violation_clips/{Path(clip).name}" if clip else None
+    }
+
+@app.get("/violations/since")
+def get_violations_since(request: Request, after_id: Optional[int] = None, limit: int = 100):
+    """
+    Violations committed after the row id after_id (the last_id of the previous response),
+    oldest first; without after_id, the newest `limit`. The ETag is the newest row id, so
+    polling with nothing new costs one rowid lookup and returns 304.
+    """
+    store = get_violation_store()
+    etag = f'W/"{store.latest_id()}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    page = store.since(after_id, limit)
+    return JSONResponse({
+        "violation_count": store.count(),
+        "last_id": page['last_id'],
+        "items": [dashboard_entry(item) for item in page['items']]
+    }, headers=headers)
+
+@app.get("/violations/counts")
+def get_violation_counts():
+    return {
+        "violation_count": get_violation_store().count(),
+        "by_camera": get_violation_store().counts_by_camera(),
+        # Frames and violations per DetectionService worker, from their checkpoints
+        "by_partition": get_violation_store().partition_summary()
+    }
+
+@app.get("/violations")
+def list_violations(
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    camera_id: Optional[str] = None,
+    violation_type: Optional[str] = None,
+    station: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = 50
+):
     try:
-        if not file.filename.lower().endswith(('.mp4', '.avi', '.mov')):
-            return JSONResponse(
-                {"error": "Invalid file type. Please upload a video file."},
-                status_code=400
-            )
-
-        upload_dir = Path("uploaded_videos")
-        upload_dir.mkdir(exist_ok=True)
-        file_path = upload_dir / file.filename
-        
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        violation_count = await video_processor.process_video(file_path)
-        
-        return JSONResponse({
-            "message": "Video processing completed",
-            "violation_count": violation_count,
-            "file_name": file.filename
-        })
+        return get_violation_store().query(start, end, camera_id, violation_type, station, cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
+async def store_and_submit(chunks, file_name, force=False):
+    """
+    Stream an upload into the store and queue it, unless the same video was already
+    processed or is being processed: then that job is returned at once (force=True
+    processes it again, e.g. after changing stations)
+    """
+    suffix = UploadStore.suffix_for(file_name)
+    if suffix is None:
+        return JSONResponse(
+            {"error": "Invalid file type. Please upload a video file."},
+            status_code=400
+        )
+    try:
+        file_path, sha256, size = await upload_store.save(chunks, suffix)
     except Exception as e:
         logger.error(f"Error processing video upload: {e}")
         return JSONResponse(
@@ -81,36 +256,141 @@ async def process_video_upload(file: UploadFile = File(...)):
             status_code=500
         )
 
-async def run_video_processing(video_path: str):
-    try:
-        await video_processor.process_video(video_path)
-        logger.info(f"Finished processing video: {video_path}")
-    except Exception as e:
-        logger.error(f"Error in video processing task: {e}")
-        raise
+    response = {"file_name": file_name, "video": file_path.name, "sha256": sha256, "size": size}
+    entry = upload_store.get(sha256)
+    if entry is not None and not force:
+        job = job_manager.get(entry['job_id']) or entry['result']
+        if job is not None and job['status'] not in ('failed', 'cancelled'):
+            done = job['status'] == 'completed'
+            return JSONResponse(dict(
+                response,
+                message="Video already processed" if done else "Video already being processed",
+                job_id=entry['job_id'],
+                deduplicated=True,
+                job=job
+            ))
+
+    job_id = job_manager.submit(file_path, file_name=file_name,
+                                on_done=lambda job: upload_store.record_result(sha256, job))
+    upload_store.record_job(sha256, job_id, file_name)
+    return JSONResponse(dict(response, message="Video queued for processing", job_id=job_id, deduplicated=False),
+                        status_code=202)
+
+async def upload_file_chunks(file, chunk_size=1024 * 1024):
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+@app.post("/process_video_upload")
+async def process_video_upload(file: UploadFile = File(...), force: bool = False):
+    """Multipart upload (form field "file")"""
+    return await store_and_submit(upload_file_chunks(file), file.filename, force)
+
+@app.post("/process_video_stream")
+async def process_video_stream(request: Request, filename: str, force: bool = False):
+    """
+    Raw upload: the request body is the video itself, written to disk as it arrives
+    instead of being spooled by the multipart parser first
+    """
+    return await store_and_submit(request.stream(), filename, force)
+
+@app.post("/live_streams")
+async def start_live_stream(source: Optional[str] = None, video: Optional[str] = None):
+    """
+    Process a live feed (source=rtsp://...) on its freshest frames until the job is
+    cancelled, or play an uploaded video (video=name) at real-time rate as a stand-in.
+    Job status includes dropped frames, reconnects and capture-to-alert latency.
+    """
+    if source is not None:
+        if not is_live_source(source):
+            raise HTTPException(status_code=400, detail="source must be a stream URL such as rtsp://...")
+        job_id = job_manager.submit(source, file_name=source, live=True)
+    elif video is not None:
+        file_path = Path("uploaded_videos") / Path(video).name
+        if not file_path.exists():
+            raise HTTPException(status_code=404, detail="Video not found")
+        job_id = job_manager.submit(file_path, file_name=file_path.name, live=True, realtime=True)
+    else:
+        raise HTTPException(status_code=400, detail="Give a source URL or an uploaded video name")
+    return JSONResponse({"message": "Live processing started", "job_id": job_id}, status_code=202)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        # Finished upload jobs from before a restart are kept with their video
+        entry = upload_store.find_job(job_id)
+        if entry is None or entry['result'] is None:
+            raise HTTPException(status_code=404, detail="Job not found")
+        job = entry['result']
+    return job
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    if not job_manager.cancel(job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_manager.get(job_id)
+
+@app.on_event("shutdown")
+async def shutdown_jobs():
+    job_manager.shutdown()
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus metrics of the web process and the job workers (needs METRICS_ENABLED=1)"""
+    if not metrics.registry.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled; set METRICS_ENABLED=1")
+    return Response(metrics.registry.render(job_manager.metrics_snapshots()), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/debug/profile")
+async def get_profile(seconds: float = 10.0, interval: float = 0.005):
+    """Sample the web process's stacks for a while and return them folded, for flamegraph.pl or speedscope"""
+    if not os.environ.get("PROFILE_DIR"):
+        raise HTTPException(status_code=404, detail="Profiling is disabled; set PROFILE_DIR")
+    profiler = SamplingProfiler(interval=max(interval, 0.001))
+    folded = await asyncio.to_thread(profiler.capture, min(seconds, 120.0))
+    return PlainTextResponse(folded)
 
 @app.get("/violation_frames/{frame_name}")
-async def get_violation_frame(frame_name: str):
-    frame_path = Path("violation_frames") / frame_name
+async def get_violation_frame(request: Request, frame_name: str):
+    frame_path = Path("violation_frames") / Path(frame_name).name
     if not frame_path.exists():
         raise HTTPException(status_code=404, detail="Frame not found")
-    return FileResponse(frame_path)
+    return cached_file_response(request, frame_path)
+
+@app.get("/violation_frames/thumbnails/{frame_name}")
+async def get_violation_thumbnail(request: Request, frame_name: str):
+    frame_path = Path("violation_frames") / "thumbnails" / Path(frame_name).name
+    if not frame_path.exists():
+        # Frames no wider than THUMBNAIL_WIDTH (or written with thumbnails off) have none
+        frame_path = Path("violation_frames") / Path(frame_name).name
+    if not frame_path.exists():
+        raise HTTPException(status_code=404, detail="Frame not found")
+    return cached_file_response(request, frame_path)
+
+@app.get("/violation_clips/{clip_name}")
+async def get_violation_clip(request: Request, clip_name: str):
+    clip_path = Path("violation_clips") / Path(clip_name).name
+    if not clip_path.exists():
+        # Clips are written once post_seconds of frames after the last violation in them are in
+        raise HTTPException(status_code=404, detail="Clip not found or not written yet")
+    return cached_file_response(request, clip_path, media_type="video/mp4")
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
-    active_connections.append(websocket)
+    client = await broadcaster.connect(websocket)
     try:
         while True:
             await websocket.receive_text()  # Keep connection alive
     except WebSocketDisconnect:
-        active_connections.remove(websocket)
+        pass
+    finally:
+        broadcaster.remove(client)
 
 @app.post("/violation_event")
 async def violation_event(event_data: dict):
-    # Broadcast violation event to all connected clients
-    for connection in active_connections:
-        try:
-            await connection.send_json(event_data)
-        except:
-            active_connections.remove(connection)
\ No newline at end of file
+    # Events from out-of-process producers; in-process ones reach the broadcaster directly
+    broadcaster.publish(event_data)
+    return {"clients": len(broadcaster.clients)}
@@ -0,0 +1,272 @@
+import bisect
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from sub-millisecond tracking up to slow CPU inference
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class Metric:
+    """
+    One named metric with optional labels. Label values are passed positionally after
+    the value, in the order of label_names. Every update returns at once while the
+    registry is disabled.
+    """
+    kind = None
+
+    def __init__(self, registry, name, help_text, label_names=()):
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.values = {}  # label values -> value
+        self.lock = threading.Lock()
+
+    def samples(self):
+        with self.lock:
+            return [(labels, value) for labels, value in self.values.items()]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, *labels):
+        if not self.registry.enabled:
+            return
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """A value that goes up and down; set_function reads it at scrape time instead"""
+    kind = 'gauge'
+
+    def __init__(self, registry, name, help_text, label_names=()):
+        super().__init__(registry, name, help_text, label_names)
+        self.function = None
+
+    def set(self, value, *labels):
+        if not self.registry.enabled:
+            return
+        self.values[labels] = value
+
+    def set_function(self, function):
+        """function() returns the value, or {label values tuple: value}"""
+        self.function = function
+
+    def samples(self):
+        if self.function is None:
+            return super().samples()
+        value = self.function()
+        return list(value.items()) if isinstance(value, dict) else [((), value)]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help_text, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        if not self.registry.enabled:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(labels)
+            if state is None:
+                state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]  # counts, sum, count
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, *labels):
+        """Context manager observing the seconds spent inside it"""
+        if not self.registry.enabled:
+            return _NULL_TIMER
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self.lock:
+            return [(labels, [list(counts), total, count]) for labels, (counts, total, count) in self.values.items()]
+
+
+class MetricsRegistry:
+    """
+    Counters, gauges and histograms rendered in the Prometheus text format. Snapshots
+    from other processes (see snapshot()) can be merged in when rendering: counters and
+    histograms are summed, and so are gauges, which makes queue depths totals.
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, label_names, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(self, name, help_text, label_names, **kwargs)
+            return metric
+
+    def counter(self, name, help_text, label_names=()):
+        return self._get(Counter, name, help_text, label_names)
+
+    def gauge(self, name, help_text, label_names=()):
+        return self._get(Gauge, name, help_text, label_names)
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, label_names, buckets=buckets)
+
+    def snapshot(self):
+        """Picklable copy of every metric, for shipping to the process that serves /metrics"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        snapshot = {}
+        for metric in metrics:
+            samples = metric.samples()
+            if samples:
+                snapshot[metric.name] = {
+                    'kind': metric.kind,
+                    'help': metric.help,
+                    'label_names': metric.label_names,
+                    'buckets': getattr(metric, 'buckets', None),
+                    'samples': samples
+                }
+        return snapshot
+
+    def render(self, snapshots=()):
+        """Prometheus text exposition of this registry merged with snapshots from other processes"""
+        merged = {}
+        for snapshot in [self.snapshot(), *snapshots]:
+            for name, metric in snapshot.items():
+                target = merged.setdefault(name, dict(metric, samples={}))
+                for labels, value in metric['samples']:
+                    labels = tuple(labels)
+                    current = target['samples'].get(labels)
+                    if current is None:
+                        target['samples'][labels] = value if metric['kind'] != 'histogram' else \
+                            [list(value[0]), value[1], value[2]]
+                    elif metric['kind'] == 'histogram':
+                        current[0] = [a + b for a, b in zip(current[0], value[0])]
+                        current[1] += value[1]
+                        current[2] += value[2]
+                    else:
+                        target['samples'][labels] = current + value
+
+        lines = []
+        for name in sorted(merged):
+            metric = merged[name]
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['kind']}")
+            for labels, value in sorted(metric['samples'].items()):
+                pairs = [f'{key}="{_escape(val)}"' for key, val in zip(metric['label_names'], labels)]
+                if metric['kind'] != 'histogram':
+                    lines.append(f"{name}{_braces(pairs)} {_number(value)}")
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(list(metric['buckets']) + ['+Inf'], counts):
+                    cumulative += bucket_count
+                    le = 'le="%s"' % (bound if bound == '+Inf' else _number(bound))
+                    lines.append(f"{name}_bucket{_braces(pairs + [le])} {cumulative}")
+                lines.append(f"{name}_sum{_braces(pairs)} {_number(total)}")
+                lines.append(f"{name}_count{_braces(pairs)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _braces(pairs):
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Process-wide registry; METRICS_ENABLED=1 turns collection on (inherited by worker processes)
+registry = MetricsRegistry(enabled=os.environ.get("METRICS_ENABLED", "").lower() in ("1", "true", "yes"))
+
+
+def counter(name, help_text, label_names=()):
+    return registry.counter(name, help_text, label_names)
+
+
+def gauge(name, help_text, label_names=()):
+    return registry.gauge(name, help_text, label_names)
+
+
+def histogram(name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+    return registry.histogram(name, help_text, label_names, buckets)
+
+
+def enable(enabled=True):
+    registry.enabled = enabled
+
+
+def serve(port, host="0.0.0.0"):
+    """Serve /metrics of this process on a daemon thread, for processes without the web app"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
+
+
+# Shared by the pipeline modules: decode, preprocess, inference, to_numpy, postprocess, track, annotate, encode,
+# write, publish
+STAGE_SECONDS = histogram('pizza_stage_seconds', 'Seconds per call of each processing stage', ['stage'])
+QUEUE_DEPTH = gauge('pizza_queue_depth', 'Items waiting in a queue when last sampled', ['queue'])
@@ -0,0 +1,66 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Cheap frame-difference check over the ROI's bounding box that decides
+    whether a frame needs a full YOLO pass
+    """
+    def __init__(self, roi, pixel_threshold=25, min_changed_fraction=0.01, idle_stride=0, downscale=4):
+        self.bbox = cv2.boundingRect(np.asarray(roi, dtype=np.int32))  # x, y, w, h
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.idle_stride = idle_stride  # 0: skip static frames entirely, N: still infer every Nth
+        self.downscale = max(1, int(downscale))
+        self.reset()
+
+    def reset(self):
+        self.reference = None  # ROI patch of the last inferred frame
+        self.frames_seen = 0
+        self.frames_inferred = 0
+        self.frames_since_inference = 0
+
+    def _patch(self, frame):
+        x, y, w, h = self.bbox
+        crop = frame[max(y, 0):y + h, max(x, 0):x + w]
+        if self.downscale > 1:
+            crop = cv2.resize(crop, None, fx=1 / self.downscale, fy=1 / self.downscale,
+                              interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def has_motion(self, patch):
+        """True when the ROI changed noticeably since the last inferred frame"""
+        if self.reference is None or self.reference.shape != patch.shape:
+            return True
+        diff = cv2.absdiff(patch, self.reference)
+        changed = np.count_nonzero(diff > self.pixel_threshold)
+        return changed >= self.min_changed_fraction * diff.size
+
+    def should_infer(self, frame, force=False):
+        """
+        Decide whether to run inference on this frame. force is set while the
+        tracker holds hands, so skipped frames can never break an ongoing track.
+        """
+        self.frames_seen += 1
+        patch = self._patch(frame)
+
+        infer = force or self.has_motion(patch)
+        if not infer and self.idle_stride > 0:
+            infer = self.frames_since_inference + 1 >= self.idle_stride
+
+        if infer:
+            self.reference = patch
+            self.frames_inferred += 1
+            self.frames_since_inference = 0
+        else:
+            self.frames_since_inference += 1
+        return infer
+
+    def summary(self):
+        return {
+            'frames_seen': self.frames_seen,
+            'frames_inferred': self.frames_inferred,
+            'inferred_fraction': round(self.frames_inferred / self.frames_seen, 4) if self.frames_seen else 1.0
+        }
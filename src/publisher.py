@@ -0,0 +1,400 @@
+import collections
+import logging
+import queue
+import random
+import struct
+import threading
+import time
+from pathlib import Path
+
+import pika
+
+from src.metrics import QUEUE_DEPTH
+from src.transport import PUBLISH_FAILURES, Transport
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_RECORD = struct.Struct("<I")
+
+
+class SpillBuffer:
+    """
+    Append-only on-disk message buffer in numbered segment files. Messages that
+    cannot be delivered are appended here and replayed oldest segment first;
+    segments left over from a previous run are replayed too. When max_bytes is
+    exceeded the oldest segments are dropped.
+    """
+    def __init__(self, directory="detection_spill", segment_bytes=8 * 1024 * 1024, max_bytes=512 * 1024 * 1024):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.segments = collections.OrderedDict(
+            (path, path.stat().st_size) for path in sorted(self.directory.glob("*.spill"))
+        )
+        self.next_index = int(next(reversed(self.segments)).stem) + 1 if self.segments else 0
+        self.active = None
+        self.active_path = None
+        self.appended = 0
+        self.dropped_bytes = 0
+        if self.segments:
+            logger.info(f"Found {len(self.segments)} spilled segment(s) to replay in {self.directory}")
+
+    @property
+    def pending_bytes(self):
+        return sum(self.segments.values())
+
+    def __len__(self):
+        """Number of segments holding undelivered messages"""
+        return len(self.segments)
+
+    def append(self, body):
+        record = _RECORD.pack(len(body)) + body
+        with self.lock:
+            if self.active is None or self.segments[self.active_path] >= self.segment_bytes:
+                self._rotate()
+            self.active.write(record)
+            self.active.flush()
+            self.segments[self.active_path] += len(record)
+            self.appended += 1
+            self._enforce_limit()
+
+    def _rotate(self):
+        self._seal()
+        self.active_path = self.directory / f"{self.next_index:012d}.spill"
+        self.next_index += 1
+        self.active = open(self.active_path, "ab")
+        self.segments[self.active_path] = 0
+
+    def _seal(self):
+        if self.active is not None:
+            self.active.close()
+            self.active = None
+            self.active_path = None
+
+    def _enforce_limit(self):
+        while self.pending_bytes > self.max_bytes and len(self.segments) > 1:
+            path, size = next(iter(self.segments.items()))
+            if path == self.active_path:
+                break
+            logger.warning(f"Spill buffer over {self.max_bytes} bytes, dropping {path.name}")
+            self._remove(path)
+            self.dropped_bytes += size
+
+    def take_oldest(self):
+        """(segment path, [messages]) of the oldest segment, or None; it stays on disk until remove()"""
+        with self.lock:
+            if not self.segments:
+                return None
+            path = next(iter(self.segments))
+            if path == self.active_path:
+                self._seal()
+            data = path.read_bytes()
+
+        bodies = []
+        offset = 0
+        while offset + _RECORD.size <= len(data):
+            (length,) = _RECORD.unpack_from(data, offset)
+            offset += _RECORD.size
+            if offset + length > len(data):
+                logger.warning(f"Truncated record at the end of {path.name}")
+                break
+            bodies.append(data[offset:offset + length])
+            offset += length
+        return path, bodies
+
+    def remove(self, path):
+        """Delete a segment once all of its messages are delivered"""
+        with self.lock:
+            self._remove(path)
+
+    def _remove(self, path):
+        if path == self.active_path:
+            self._seal()
+        self.segments.pop(path, None)
+        path.unlink(missing_ok=True)
+
+    def close(self):
+        with self.lock:
+            self._seal()
+
+
+class RabbitMQConfirmLink:
+    """
+    One RabbitMQ connection with publisher confirms, driven by ReliablePublisher's
+    thread: send() returns the delivery tag, poll() does the I/O and returns the
+    (delivery_tag, multiple, acked) confirms received since the last call
+    """
+    def __init__(self, queue_name='detections', host='localhost', persistent=True, connect_timeout=5.0):
+        self.queue_name = queue_name
+        self.host = host
+        self.properties = pika.BasicProperties(delivery_mode=2) if persistent else None
+        self.connect_timeout = connect_timeout
+        self.connection = None
+        self.channel = None
+        self.ready = False
+        self.error = None
+        self.next_tag = 1
+        self.confirms = []
+
+    def open(self):
+        self.connection = pika.SelectConnection(
+            pika.ConnectionParameters(host=self.host, heartbeat=60, blocked_connection_timeout=300),
+            on_open_callback=self._on_connection_open,
+            on_open_error_callback=self._on_error,
+            on_close_callback=self._on_error
+        )
+        # The publisher thread drives this connection's I/O loop itself instead of ioloop.start()
+        self.connection.ioloop.activate_poller()
+        deadline = time.monotonic() + self.connect_timeout
+        while not self.ready:
+            if self.error is not None:
+                raise ConnectionError(f"RabbitMQ connection failed: {self.error!r}")
+            if time.monotonic() > deadline:
+                raise ConnectionError("Timed out connecting to RabbitMQ")
+            self._poll(0.1)
+
+    def _on_connection_open(self, connection):
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_channel_open(self, channel):
+        self.channel = channel
+        channel.add_on_close_callback(self._on_error)
+        channel.queue_declare(self.queue_name, durable=True, callback=self._on_queue_declared)
+
+    def _on_queue_declared(self, _frame):
+        self.channel.confirm_delivery(self._on_confirm, callback=self._on_confirm_selected)
+
+    def _on_confirm_selected(self, _frame):
+        self.ready = True
+
+    def _on_confirm(self, frame):
+        method = frame.method
+        self.confirms.append((method.delivery_tag, method.multiple, isinstance(method, pika.spec.Basic.Ack)))
+
+    def _on_error(self, _source, error):
+        self.error = error
+
+    def send(self, body):
+        if self.error is not None:
+            raise ConnectionError(f"RabbitMQ connection lost: {self.error!r}")
+        self.channel.basic_publish('', self.queue_name, body, self.properties)
+        tag = self.next_tag
+        self.next_tag += 1
+        return tag
+
+    def poll(self, timeout):
+        self._poll(timeout)
+        if self.error is not None:
+            raise ConnectionError(f"RabbitMQ connection lost: {self.error!r}")
+        confirms, self.confirms = self.confirms, []
+        return confirms
+
+    def _poll(self, timeout):
+        # The timer bounds how long poll() may wait for socket events
+        ioloop = self.connection.ioloop
+        timer = ioloop.call_later(timeout, lambda: None)
+        ioloop.poll()
+        ioloop.process_timeouts()
+        ioloop.remove_timeout(timer)
+
+    def close(self):
+        if self.connection is None:
+            return
+        try:
+            if self.connection.is_open:
+                self.connection.close()
+                deadline = time.monotonic() + 1.0
+                while not self.connection.is_closed and time.monotonic() < deadline:
+                    self._poll(0.05)
+            self.connection.ioloop.deactivate_poller()
+            self.connection.ioloop.close()
+        except Exception as e:
+            logger.error(f"Error closing RabbitMQ connection: {e}")
+
+
+class ReliablePublisher(Transport):
+    """
+    Publisher thread that owns a long-lived broker connection. publish() only
+    enqueues and never blocks; the thread sends with asynchronous confirms and at
+    most max_in_flight unconfirmed messages, reconnects with exponential backoff,
+    and spills to disk whatever cannot be delivered (full queue, broker down,
+    nacks), replaying it once the broker is back. Delivery is at least once.
+
+    connect() returns a link with open/send/poll/close (RabbitMQConfirmLink by default).
+    """
+    def __init__(self, connect=None, spill_dir="detection_spill", queue_size=1024, max_in_flight=256,
+                 backoff_initial=0.5, backoff_max=30.0, poll_interval=0.01, spill_max_bytes=512 * 1024 * 1024):
+        self.connect = connect or RabbitMQConfirmLink
+        self.spill = SpillBuffer(spill_dir, max_bytes=spill_max_bytes)
+        self.outbox = queue.Queue(maxsize=queue_size)
+        self.max_in_flight = max_in_flight
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+
+        self.in_flight = {}  # delivery tag -> (body, spill segment it came from or None)
+        self.replay = collections.deque()
+        self.replay_segment = None
+        self.replay_outstanding = 0
+
+        self.connected = False
+        self.reconnects = 0
+        self.confirmed = 0
+        self.nacked = 0
+        self.replayed = 0
+        self.stopping = threading.Event()
+        self.stop_deadline = None
+
+        self.thread = threading.Thread(target=self._run, name="detection-publisher", daemon=True)
+        self.thread.start()
+
+    def publish(self, body):
+        """Queue a message for delivery; spills to disk instead of blocking when the queue is full"""
+        try:
+            self.outbox.put_nowait(body)
+            QUEUE_DEPTH.set(self.outbox.qsize(), 'publisher_outbox')
+        except queue.Full:
+            PUBLISH_FAILURES.inc(1, 'outbox_full')
+            self.spill.append(body)
+
+    def _run(self):
+        backoff = self.backoff_initial
+        while not self.stopping.is_set():
+            link = None
+            try:
+                link = self.connect()
+                link.open()
+                if self.reconnects:
+                    logger.info("Publisher reconnected")
+                self.connected = True
+                backoff = self.backoff_initial
+                self._run_link(link)
+            except Exception as e:
+                PUBLISH_FAILURES.inc(1, 'connection')
+                logger.warning(f"Publisher connection failed: {e}; retrying in up to {backoff:.1f}s")
+            finally:
+                self.connected = False
+                self._requeue_in_flight()
+                if link is not None:
+                    link.close()
+
+            if self.stopping.is_set():
+                break
+            self.reconnects += 1
+            self.stopping.wait(backoff * random.uniform(0.5, 1.0))
+            backoff = min(backoff * 2, self.backoff_max)
+
+    def _run_link(self, link):
+        while True:
+            self._fill_window(link)
+            if self.stopping.is_set():
+                idle = not self.in_flight and not self.replay and self.outbox.empty()
+                if idle or time.monotonic() > self.stop_deadline:
+                    return
+            for tag, multiple, acked in link.poll(self.poll_interval):
+                self._settle(tag, multiple, acked)
+
+    def _fill_window(self, link):
+        while len(self.in_flight) < self.max_in_flight:
+            if self.replay_segment is None and len(self.spill):
+                self._load_replay()
+            if self.replay:
+                body, source = self.replay.popleft(), self.replay_segment
+            else:
+                try:
+                    body, source = self.outbox.get_nowait(), None
+                except queue.Empty:
+                    return
+            try:
+                tag = link.send(body)
+            except Exception:
+                # Replayed messages are still in their segment; live ones go to disk
+                if source is None:
+                    self.spill.append(body)
+                raise
+            self.in_flight[tag] = (body, source)
+
+    def _load_replay(self):
+        segment = self.spill.take_oldest()
+        if segment is None:
+            return
+        path, bodies = segment
+        if not bodies:
+            self.spill.remove(path)
+            return
+        self.replay_segment = path
+        self.replay.extend(bodies)
+        self.replay_outstanding = len(bodies)
+        logger.debug(f"Replaying {len(bodies)} spilled messages from {path.name}")
+
+    def _settle(self, tag, multiple, acked):
+        tags = [t for t in self.in_flight if t <= tag] if multiple else [tag]
+        for t in tags:
+            entry = self.in_flight.pop(t, None)
+            if entry is None:
+                continue
+            body, source = entry
+            if acked:
+                self.confirmed += 1
+            else:
+                self.nacked += 1
+                PUBLISH_FAILURES.inc(1, 'nack')
+                self.spill.append(body)
+            if source is not None:
+                self.replay_outstanding -= 1
+                if self.replay_outstanding == 0 and not self.replay:
+                    self.spill.remove(source)
+                    self.replayed += 1
+                    self.replay_segment = None
+
+    def _requeue_in_flight(self):
+        """Unconfirmed live messages go to disk; a half-replayed segment is simply replayed again"""
+        for body, source in self.in_flight.values():
+            if source is None:
+                self.spill.append(body)
+        self.in_flight.clear()
+        self.replay.clear()
+        self.replay_segment = None
+        self.replay_outstanding = 0
+
+    def flush(self, timeout=None):
+        """Wait until everything queued and spilled is confirmed; returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.in_flight or not self.outbox.empty() or len(self.spill):
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self):
+        self.close()
+
+    def close(self, timeout=5.0):
+        """Deliver what can be delivered within timeout and keep the rest on disk for the next run"""
+        self.stop_deadline = time.monotonic() + timeout
+        self.stopping.set()
+        self.thread.join(timeout + 1.0)
+        while True:
+            try:
+                self.spill.append(self.outbox.get_nowait())
+            except queue.Empty:
+                break
+        self.spill.close()
+
+    def metrics(self):
+        return {
+            'connected': self.connected,
+            'reconnects': self.reconnects,
+            'confirmed': self.confirmed,
+            'nacked': self.nacked,
+            'in_flight': len(self.in_flight),
+            'queued': self.outbox.qsize(),
+            'spilled': self.spill.appended,
+            'spill_bytes': self.spill.pending_bytes,
+            'spill_dropped_bytes': self.spill.dropped_bytes,
+            'segments_replayed': self.replayed
+        }
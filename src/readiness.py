@@ -0,0 +1,59 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class Readiness:
+    """
+    Startup state of the service's components for the readiness endpoint. Each one is
+    starting, ready or failed (optional components report unavailable instead), with
+    the seconds its last start or check took. The service is ready once every required
+    component is.
+    """
+    def __init__(self, required=()):
+        self.required = tuple(required)
+        self.components = {}
+        self.lock = threading.Lock()
+
+    def set(self, name, status, seconds=None, **details):
+        with self.lock:
+            previous = self.components.get(name, {}).get('status')
+            self.components[name] = dict(details, status=status,
+                                         seconds=round(seconds, 3) if seconds is not None else None)
+        # Periodic checks only log when the status changes
+        if status != previous and seconds is not None:
+            message = f"Cold start: {name} {status} in {seconds:.2f}s"
+            if status == 'ready':
+                logger.info(message)
+            else:
+                logger.error(f"{message}: {details.get('error')}")
+
+    @contextmanager
+    def starting(self, name, failed_status='failed'):
+        """
+        Time a component's start. The block can add details to the yielded dict. An
+        exception marks the component failed_status with the error and is not re-raised.
+        """
+        with self.lock:
+            first = name not in self.components
+        if first:
+            self.set(name, 'starting')
+        details = {}
+        started = time.perf_counter()
+        try:
+            yield details
+        except Exception as e:
+            self.set(name, failed_status, time.perf_counter() - started, **details, error=str(e) or type(e).__name__)
+        else:
+            self.set(name, 'ready', time.perf_counter() - started, **details)
+
+    def snapshot(self):
+        with self.lock:
+            components = {name: dict(component) for name, component in self.components.items()}
+        ready = all(components.get(name, {}).get('status') == 'ready' for name in self.required)
+        return {'ready': ready, 'components': components}
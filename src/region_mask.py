@@ -0,0 +1,65 @@
+import numpy as np
+
+
+def rasterize_polygon(polygon, x0, y0, width, height):
+    """
+    Boolean (height, width) mask of the integer points inside or on the polygon,
+    with pixel (0, 0) at (x0, y0). Points on an edge count as inside, the same as
+    cv2.pointPolygonTest(...) >= 0.
+    """
+    xs = np.arange(x0, x0 + width, dtype=np.int64)[None, :]
+    ys = np.arange(y0, y0 + height, dtype=np.int64)[:, None]
+    inside = np.zeros((height, width), dtype=bool)
+    on_edge = np.zeros((height, width), dtype=bool)
+
+    points = np.asarray(polygon, dtype=np.int64).reshape(-1, 2)
+    for (xi, yi), (xj, yj) in zip(points, np.roll(points, -1, axis=0)):
+        # Crossing-number test for a ray towards +x
+        if yi != yj:
+            spans = (yi > ys) != (yj > ys)
+            x_cross = xi + (xj - xi) * (ys - yi) / (yj - yi)
+            inside ^= spans & (xs < x_cross)
+        # Exact integer test for points lying on the edge itself
+        collinear = (xj - xi) * (ys - yi) - (yj - yi) * (xs - xi) == 0
+        on_edge |= (collinear
+                    & (xs >= min(xi, xj)) & (xs <= max(xi, xj))
+                    & (ys >= min(yi, yj)) & (ys <= max(yi, yj)))
+    return inside | on_edge
+
+
+class RegionMask:
+    """
+    Rasterized lookup table over the bounding box of one or more polygons.
+    Answers "which polygon contains this point" for many points with a single
+    array index, matching cv2.pointPolygonTest(...) >= 0 on integer points.
+    """
+    def __init__(self, polygons):
+        polygons = [np.asarray(p, dtype=np.int32).reshape(-1, 2) for p in polygons]
+        points = np.concatenate(polygons, axis=0)
+        # One pixel of empty border lets lookups clip out-of-range points instead of masking them
+        self.x0, self.y0 = (int(v) - 1 for v in points.min(axis=0))
+        x1, y1 = (int(v) + 1 for v in points.max(axis=0))
+        self.width = x1 - self.x0 + 1
+        self.height = y1 - self.y0 + 1
+
+        # 0 = outside every polygon, i + 1 = polygon i (later polygons win where they overlap)
+        self.labels = np.zeros((self.height, self.width), dtype=np.int16)
+        for index, polygon in enumerate(polygons):
+            self.labels[rasterize_polygon(polygon, self.x0, self.y0, self.width, self.height)] = index + 1
+
+    def lookup(self, points):
+        """Polygon index for each (x, y) point, -1 where no polygon contains it"""
+        points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+        x = np.clip(points[:, 0] - self.x0, 0, self.width - 1)
+        y = np.clip(points[:, 1] - self.y0, 0, self.height - 1)
+        return self.labels[y, x].astype(np.int64) - 1
+
+    def lookup_point(self, x, y):
+        """lookup() for a single integer point, without the array overhead"""
+        x = min(max(x - self.x0, 0), self.width - 1)
+        y = min(max(y - self.y0, 0), self.height - 1)
+        return int(self.labels[y, x]) - 1
+
+    def contains(self, points):
+        """Boolean array: is each point inside any polygon"""
+        return self.lookup(points) >= 0
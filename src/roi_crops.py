@@ -0,0 +1,84 @@
+import math
+
+import cv2
+import numpy as np
+
+# Default padding around each ROI, in pixels. A hand is checked for a scooper when
+# its center is just outside the ROI (up to the 50px tracking step), the scooper may
+# be another 100px away, and about half of a scooper box sticks out beyond its center.
+DEFAULT_CROP_PADDING = 200
+
+# Model input sizes are multiples of the YOLO stride
+STRIDE = 32
+
+
+def _overlaps(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def crop_regions(polygons, frame_shape, padding=DEFAULT_CROP_PADDING):
+    """
+    Return padded (x1, y1, x2, y2) boxes around the given polygons, clipped to the
+    frame and merged wherever they overlap so no pixel is inferred twice
+    """
+    height, width = frame_shape[:2]
+    boxes = []
+    for polygon in polygons:
+        x, y, w, h = cv2.boundingRect(np.asarray(polygon, dtype=np.int32))
+        boxes.append([
+            max(0, x - padding), max(0, y - padding),
+            min(width, x + w + padding), min(height, y + h + padding)
+        ])
+
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(boxes)):
+            for j in range(i + 1, len(boxes)):
+                if _overlaps(boxes[i], boxes[j]):
+                    a, b = boxes[i], boxes.pop(j)
+                    boxes[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(box) for box in boxes]
+
+
+def crop_input_sizes(regions, frame_shape, imgsz, stride=STRIDE):
+    """
+    Model input (height, width) for each crop that keeps it at the scale the whole
+    frame is inferred at with input size imgsz, so objects look the same to the model
+    and a small crop costs a small input. Sizes are rounded up to the stride and
+    capped at imgsz.
+    """
+    input_height, input_width = (imgsz, imgsz) if isinstance(imgsz, int) else imgsz
+    height, width = frame_shape[:2]
+    gain = min(input_height / height, input_width / width)
+    sizes = []
+    for x1, y1, x2, y2 in regions:
+        sizes.append((
+            min(input_height, math.ceil((y2 - y1) * gain / stride) * stride),
+            min(input_width, math.ceil((x2 - x1) * gain / stride) * stride)
+        ))
+    return sizes
+
+
+def crop_input_fraction(sizes, frame_shape, imgsz, stride=STRIDE):
+    """Model input pixels of the crops as a fraction of the full frame's (stride-padded) input"""
+    full_height, full_width = crop_input_sizes([(0, 0, frame_shape[1], frame_shape[0])], frame_shape, imgsz, stride)[0]
+    return sum(h * w for h, w in sizes) / float(full_height * full_width)
+
+
+def merge_crop_detections(crop_detections, regions):
+    """Shift each crop's (N, 6) detections back into full-frame coordinates and stack them"""
+    shifted = []
+    for detections, (x1, y1, _, _) in zip(crop_detections, regions):
+        if len(detections):
+            detections = detections.copy()
+            detections[:, [0, 2]] += x1
+            detections[:, [1, 3]] += y1
+            shifted.append(detections)
+    if not shifted:
+        return np.zeros((0, 6), dtype=np.float32)
+    return np.concatenate(shifted, axis=0)
@@ -0,0 +1,99 @@
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    """
+    Samples the Python stack of every thread each interval seconds on a daemon thread
+    and counts identical stacks. folded() returns them in the collapsed-stack format
+    read by flamegraph.pl and speedscope: "thread;outer;...;inner count" per line.
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self.stacks.clear()
+        self.samples = 0
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop sampling and return the folded stacks"""
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        return self.folded()
+
+    def capture(self, seconds):
+        """Sample for the given number of seconds (blocking) and return the folded stacks"""
+        self.start()
+        time.sleep(seconds)
+        return self.stop()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self.stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def install_signal_toggle(directory="profiles", signum=signal.SIGUSR2, interval=0.005):
+    """
+    Start the profiler on the first signal and write the folded stacks to
+    directory/profile_<pid>_<time>.folded on the next, e.g. `kill -USR2 <pid>` twice.
+    Must be called from the main thread.
+    """
+    profiler = SamplingProfiler(interval)
+    directory = Path(directory)
+
+    def toggle(_signum, _frame):
+        if not profiler.running:
+            profiler.start()
+            logger.info(f"Sampling profiler started in process {os.getpid()}")
+            return
+        # Write from a thread: joining the sampler inside a signal handler could deadlock
+        def dump():
+            folded = profiler.stop()
+            directory.mkdir(parents=True, exist_ok=True)
+            path = directory / f"profile_{os.getpid()}_{time.strftime('%Y%m%d_%H%M%S')}.folded"
+            path.write_text(folded)
+            logger.info(f"Wrote {profiler.samples} profile samples to {path}")
+
+        threading.Thread(target=dump, name="sampling-profiler-dump", daemon=True).start()
+
+    signal.signal(signum, toggle)
+    return profiler
@@ -0,0 +1,366 @@
+import argparse
+import cv2
+import json
+import logging
+import queue
+import threading
+import time
+
+from src import metrics
+from src.camera_config import load_camera_configs
+from src.detectors import DEFAULT_MODEL, add_detector_arguments, detector_kwargs, load_detector
+from src.live_source import FRAMES_DROPPED, is_live_source
+from src.video_processor import VideoProcessor
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stream's frames
+_END = object()
+
+
+class CameraStream:
+    """
+    One video source: a decoder thread feeding a small frame queue, plus the
+    VideoProcessor that owns this camera's ROI, tracker and violation count
+    """
+    def __init__(self, stream_id, source, processor, queue_size=4):
+        self.stream_id = stream_id
+        self.source = source
+        self.processor = processor
+        self.live = is_live_source(source)
+        # The gate decision needs the tracker after the previous frame, so a gated stream
+        # gets at most one frame per batch and is gated where frames are dequeued
+        self.gated = processor.motion_gate is not None
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.finished = False
+        self.flushed = False
+        self.error = None
+
+        self.frames_decoded = 0
+        self.frames_processed = 0
+        self.frames_skipped = 0  # Rejected by the motion gate
+        self.frames_dropped = 0  # Live frames discarded because inference fell behind
+        self.started = None
+        self.ended = None
+
+    def start(self, notify, stop_event):
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(
+            target=self._decode, args=(notify, stop_event),
+            name=f"decode-{self.stream_id}", daemon=True
+        )
+        self.thread.start()
+
+    def _decode(self, notify, stop_event):
+        cap = cv2.VideoCapture(str(self.source))
+        try:
+            if not cap.isOpened():
+                raise ValueError(f"Failed to open video source: {self.source}")
+            self._start_run(cap.get(cv2.CAP_PROP_FPS))
+
+            frame_number = 0
+            while not stop_event.is_set():
+                with metrics.STAGE_SECONDS.time('decode'):
+                    ret, frame = cap.read()
+                if not ret:
+                    break
+
+                frame_number += 1
+                self.frames_decoded += 1
+                self._put((frame_number, frame), stop_event)
+                metrics.QUEUE_DEPTH.set(self.frames.qsize(), f"stream_{self.stream_id}")
+                notify()
+        except Exception as e:
+            logger.error(f"Stream {self.stream_id} failed: {e}")
+            self.error = str(e)
+        finally:
+            cap.release()
+            self._put(_END, stop_event)
+            notify()
+
+    def _start_run(self, fps):
+        """Start a new publisher run and clip run before the first frame is queued, as run_video does"""
+        processor = self.processor
+        processor.current_video = str(self.source)
+        if processor.detection_publisher is not None:
+            processor.detection_publisher.start_run()
+        if processor.clip_recorder is not None:
+            processor.clip_recorder.start_run(fps or None, processor.camera_id)
+
+    def _put(self, item, stop_event):
+        """Queue a frame; live feeds drop their oldest frame instead of waiting for room"""
+        while not stop_event.is_set():
+            if not self.live:
+                try:
+                    self.frames.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+            try:
+                self.frames.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self.frames.get_nowait()
+                    self.frames_dropped += 1
+                    FRAMES_DROPPED.inc(1, self.stream_id)
+                except queue.Empty:
+                    pass
+
+    def flush(self):
+        """Write out the processor's queued violation records, frames and detection batches, once"""
+        if self.flushed:
+            return
+        self.flushed = True
+        try:
+            self.processor.flush_outputs()
+        except Exception as e:
+            logger.error(f"Stream {self.stream_id} failed to flush its outputs: {e}")
+
+    def metrics(self):
+        elapsed = ((self.ended or time.perf_counter()) - self.started) if self.started else 0.0
+        return {
+            'source': str(self.source),
+            'live': self.live,
+            'finished': self.finished,
+            'error': self.error,
+            'frames_decoded': self.frames_decoded,
+            'frames_processed': self.frames_processed,
+            'frames_skipped': self.frames_skipped,
+            'frames_dropped': self.frames_dropped,
+            'fps': round(self.frames_decoded / elapsed, 2) if elapsed > 0 else 0.0,
+            'inference_fps': round(self.frames_processed / elapsed, 2) if elapsed > 0 else 0.0,
+            'queue_depth': self.frames.qsize(),
+            'violation_count': self.processor.violation_count
+        }
+
+
+class StreamManager:
+    """
+    Runs many camera streams against one shared model: each source is decoded on
+    its own thread, frames are batched across streams into a single inference call,
+    and results are routed back to each stream's tracker and ROI
+    """
+    def __init__(self, model_path=DEFAULT_MODEL, batch_size=8, queue_size=4, max_wait=0.02,
+                 processor_kwargs=None, backend=None, imgsz=None, threads=None):
+        self.model = load_detector(model_path, backend, imgsz=imgsz, threads=threads)
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.max_wait = max_wait  # Seconds to wait for a fuller batch once one frame is ready
+        self.processor_kwargs = processor_kwargs or {}
+        self.streams = {}
+        self.stop_event = threading.Event()
+        self.frames_ready = threading.Condition()
+        self.thread = None
+        self.error = None  # Inference failure that stopped every stream; raised from wait()
+        self.batches = 0
+        self._next_stream = 0
+
+    def add_stream(self, stream_id, source, roi=None, camera_config=None, **processor_kwargs):
+        """Register a source; its processor shares this manager's model"""
+        if stream_id in self.streams:
+            raise ValueError(f"Stream already exists: {stream_id}")
+        kwargs = dict(self.processor_kwargs, **processor_kwargs)
+        processor = VideoProcessor(model=self.model, camera_id=stream_id, roi=roi,
+                                   camera_config=camera_config, **kwargs)
+        stream = CameraStream(stream_id, source, processor, queue_size=self.queue_size)
+        self.streams[stream_id] = stream
+        if self.thread is not None:
+            stream.start(self._notify, self.stop_event)
+        logger.info(f"Added stream {stream_id}: {source}")
+        return stream
+
+    def _notify(self):
+        with self.frames_ready:
+            self.frames_ready.notify()
+
+    def _collect_batch(self):
+        """Take up to batch_size frames, round-robin across streams; None once all streams ended"""
+        batch = []
+        taken = set()  # Gated streams that already have their frame in this batch
+        deadline = None
+        while not self.stop_event.is_set():
+            streams = [s for s in list(self.streams.values()) if not s.finished]
+            if not streams:
+                return batch or None
+            streams = [s for s in streams if s not in taken]
+            if not streams:
+                return batch
+
+            before = len(batch)
+            for offset in range(len(streams)):
+                if len(batch) >= self.batch_size:
+                    break
+                stream = streams[(self._next_stream + offset) % len(streams)]
+                try:
+                    item = stream.frames.get_nowait()
+                except queue.Empty:
+                    continue
+                if item is _END:
+                    stream.finished = True
+                    stream.ended = time.perf_counter()
+                    logger.info(f"Stream {stream.stream_id} finished: {stream.metrics()}")
+                    continue
+                batch.append((stream, *item))
+                if stream.gated:
+                    taken.add(stream)
+            self._next_stream += 1
+
+            if len(batch) >= self.batch_size:
+                return batch
+            if batch:
+                deadline = deadline or time.monotonic() + self.max_wait
+                if time.monotonic() >= deadline:
+                    return batch
+            if len(batch) > before:
+                # Queues may hold more frames already; only sleep once a pass comes up empty
+                continue
+            with self.frames_ready:
+                self.frames_ready.wait(timeout=self.max_wait)
+        return None
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                break
+            batch = self._gate(batch)
+            if not batch:
+                continue
+
+            try:
+                inputs = [stream.processor.prepare_inputs(frame) for stream, _, frame in batch]
+                outputs = batch[0][0].processor.run_model([item for items in inputs for item in items])
+            except Exception as e:
+                # The model is shared, so every stream stops rather than each failing batch by batch
+                self.error = f"Inference failed: {e}"
+                logger.error(f"{self.error}; stopping all streams")
+                for stream in {stream for stream, _, _ in batch}:
+                    stream.error = self.error
+                self.stop_event.set()
+                break
+            self.batches += 1
+
+            for (stream, frame_number, frame), items in zip(batch, inputs):
+                try:
+                    detections = stream.processor.collect_detections(frame, outputs[:len(items)])
+                    stream.processor.handle_frame(frame, detections, frame_number)
+                except Exception as e:
+                    logger.error(f"Stream {stream.stream_id} failed to handle frame {frame_number}: {e}")
+                outputs = outputs[len(items):]
+                stream.frames_processed += 1
+            self._flush_finished()
+        self._flush_finished()
+        logger.info(f"Stream manager stopped after {self.batches} batches")
+
+    def _gate(self, batch):
+        """
+        Drop frames the motion gate keeps from the model. This runs on the inference
+        thread, after the stream's previous frame was tracked, like sequential mode.
+        """
+        kept = []
+        for stream, frame_number, frame in batch:
+            try:
+                if stream.processor.should_infer(frame):
+                    kept.append((stream, frame_number, frame))
+                    continue
+                stream.processor.skip_frame(frame, frame_number)
+            except Exception as e:
+                logger.error(f"Stream {stream.stream_id} failed to skip frame {frame_number}: {e}")
+            stream.frames_skipped += 1
+        return kept
+
+    def _flush_finished(self):
+        """Flush streams that ended; their last frames were handled in the batch before"""
+        for stream in list(self.streams.values()):
+            if stream.finished:
+                stream.flush()
+
+    def start(self):
+        """Start decoding every registered stream and the shared inference loop"""
+        self.stop_event.clear()
+        self.error = None
+        for stream in self.streams.values():
+            stream.start(self._notify, self.stop_event)
+        self.thread = threading.Thread(target=self._run, name="stream-inference", daemon=True)
+        self.thread.start()
+
+    def wait(self):
+        """
+        Block until every stream has ended (file sources) or stop() is called, then
+        flush every stream's outputs so nothing queued is lost when the process exits.
+        Raises RuntimeError when a failed inference stopped the streams.
+        """
+        if self.thread is not None:
+            self.thread.join()
+        # The inference loop is done; decoders of streams that haven't ended exit too
+        self.stop_event.set()
+        for stream in self.streams.values():
+            if stream.thread is not None:
+                stream.thread.join()
+            stream.flush()
+        if self.error is not None:
+            raise RuntimeError(self.error)
+
+    def stop(self):
+        self.stop_event.set()
+        self._notify()
+        self.wait()
+
+    def metrics(self):
+        """Per-stream violation counts and fps, plus totals"""
+        streams = {stream_id: stream.metrics() for stream_id, stream in self.streams.items()}
+        return {
+            'batches': self.batches,
+            'violation_count': sum(m['violation_count'] for m in streams.values()),
+            'streams': streams
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Process several camera sources with one shared model. "
+                    "Sources are files or URLs; a file served by 'python -m http.server' "
+                    "works as a stand-in for a network camera."
+    )
+    parser.add_argument("sources", nargs="*", help="camera_id=path_or_url")
+    parser.add_argument("--config", help="camera config JSON with stations (and optionally sources)")
+    add_detector_arguments(parser)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this port")
+    args = parser.parse_args()
+
+    configs = load_camera_configs(args.config) if args.config else {}
+    sources = {camera_id: config.source for camera_id, config in configs.items() if config.source}
+    for spec in args.sources:
+        stream_id, _, source = spec.partition("=")
+        sources[stream_id] = source
+    if not sources:
+        parser.error("no sources given on the command line or in --config")
+
+    if args.metrics_port:
+        metrics.enable()
+        metrics.serve(args.metrics_port)
+
+    manager = StreamManager(model_path=args.model, batch_size=args.batch_size, **detector_kwargs(args))
+    for stream_id, source in sources.items():
+        manager.add_stream(stream_id, source, camera_config=configs.get(stream_id))
+
+    manager.start()
+    failed = False
+    try:
+        manager.wait()
+    except KeyboardInterrupt:
+        manager.stop()
+    except RuntimeError:
+        failed = True
+    print(json.dumps(manager.metrics(), indent=2))
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
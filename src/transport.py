@@ -0,0 +1,269 @@
+import json
+import logging
+import queue
+import socket
+import threading
+import time
+import uuid
+import zlib
+
+import pika
+
+from src import metrics
+from src.detection_codec import detections_to_dicts, encode_batch
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PUBLISH_FAILURES = metrics.counter('pizza_publish_failures_total', 'Detection publishes that failed or were deferred', ['reason'])
+MESSAGES_REJECTED = metrics.counter('pizza_messages_rejected_total', 'Detection messages the consumer could not handle')
+
+
+def partition_for(camera_id, partitions):
+    """Stable partition of a camera, so every message of one camera reaches the same consumer"""
+    return zlib.crc32(str(camera_id or '').encode()) % partitions
+
+
+def partition_queue(camera_id, partitions, base='detections'):
+    """Queue name for a camera's partition, e.g. RabbitMQTransport(partition_queue('cam1', 4))"""
+    return f"{base}.{partition_for(camera_id, partitions)}" if partitions > 1 else base
+
+
+def check_broker(host='localhost', timeout=2.0, port=5672):
+    """Open and close a RabbitMQ connection; raises if the broker can't be reached within timeout"""
+    # A plain TCP connect first, so an absent broker fails without pika's error logging
+    socket.create_connection((host, port), timeout=timeout).close()
+    connection = pika.BlockingConnection(
+        pika.ConnectionParameters(host=host, port=port, connection_attempts=1, socket_timeout=timeout, stack_timeout=timeout)
+    )
+    connection.close()
+
+
+class Transport:
+    """
+    Message transport between VideoProcessor and DetectionService.
+    consume() calls handler(body) for each message; a handler that raises
+    rejects that message, anything else acknowledges it. before_ack() is called
+    before handled messages are acknowledged, so consumers can make their effects
+    durable first.
+    """
+    def publish(self, body):
+        raise NotImplementedError
+
+    def consume(self, handler, before_ack=None):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class InProcessTransport(Transport):
+    """
+    Bounded in-memory queue, so the pipeline can run and be benchmarked without a broker
+    """
+    def __init__(self, maxsize=1024):
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.stopped = threading.Event()
+        self.published = 0
+        self.rejected = 0
+
+    def publish(self, body):
+        self.queue.put(body)
+        self.published += 1
+
+    def consume(self, handler, before_ack=None, idle_timeout=None, ack_every=32):
+        """Handle messages until stop() is called (or the queue stays empty for idle_timeout)"""
+        unacked = 0
+        while not self.stopped.is_set():
+            try:
+                body = self.queue.get(timeout=idle_timeout if idle_timeout is not None else 0.1)
+            except queue.Empty:
+                if unacked and before_ack is not None:
+                    before_ack()
+                unacked = 0
+                if idle_timeout is not None:
+                    break
+                continue
+            try:
+                handler(body)
+            except Exception as e:
+                self.rejected += 1
+                MESSAGES_REJECTED.inc()
+                logger.error(f"Rejected message: {e}")
+            unacked += 1
+            if unacked >= ack_every:
+                if before_ack is not None:
+                    before_ack()
+                unacked = 0
+        if unacked and before_ack is not None:
+            before_ack()
+
+    def stop(self):
+        self.stopped.set()
+
+
+class RabbitMQTransport(Transport):
+    """
+    RabbitMQ queue transport. Consumers prefetch many messages and acknowledge
+    them with one multi-ack every ack_every messages or whenever the queue goes idle.
+    """
+    def __init__(self, queue_name='detections', host='localhost', prefetch_count=64, ack_every=32,
+                 persistent=True):
+        self.queue_name = queue_name
+        self.host = host
+        self.prefetch_count = prefetch_count
+        self.ack_every = ack_every
+        self.persistent = persistent
+        self.connection = None
+        self.channel = None
+        self.stopped = threading.Event()
+
+    def ensure_connection(self):
+        """Ensure RabbitMQ connection is active"""
+        try:
+            if not self.connection or self.connection.is_closed:
+                self.connection = pika.BlockingConnection(
+                    pika.ConnectionParameters(
+                        host=self.host,
+                        heartbeat=600,
+                        blocked_connection_timeout=300
+                    )
+                )
+                self.channel = self.connection.channel()
+                self.channel.queue_declare(queue=self.queue_name, durable=True)
+                logger.info("RabbitMQ connection established")
+        except Exception as e:
+            logger.error(f"Failed to connect to RabbitMQ: {e}")
+            raise
+
+    def publish(self, body):
+        properties = pika.BasicProperties(delivery_mode=2) if self.persistent else None
+        try:
+            self.ensure_connection()
+            self.channel.basic_publish(exchange='', routing_key=self.queue_name, body=body, properties=properties)
+        except Exception as e:
+            PUBLISH_FAILURES.inc(1, 'reconnect')
+            logger.error(f"Failed to publish, reconnecting once: {e}")
+            self.close()
+            self.ensure_connection()
+            self.channel.basic_publish(exchange='', routing_key=self.queue_name, body=body, properties=properties)
+
+    def consume(self, handler, before_ack=None):
+        self.ensure_connection()
+        self.channel.basic_qos(prefetch_count=self.prefetch_count)
+        unacked_tag = None
+        unacked = 0
+
+        def ack():
+            if before_ack is not None:
+                before_ack()
+            self.channel.basic_ack(delivery_tag=unacked_tag, multiple=True)
+
+        try:
+            for method, properties, body in self.channel.consume(self.queue_name, inactivity_timeout=0.1):
+                if self.stopped.is_set():
+                    break
+                if method is None:
+                    # Queue went idle: acknowledge everything handled so far
+                    if unacked_tag is not None:
+                        ack()
+                        unacked_tag, unacked = None, 0
+                    continue
+
+                try:
+                    handler(body)
+                except Exception as e:
+                    MESSAGES_REJECTED.inc()
+                    logger.error(f"Rejected message: {e}")
+                    # Settle the successful messages before it, then reject this one alone
+                    if unacked_tag is not None:
+                        ack()
+                        unacked_tag, unacked = None, 0
+                    self.channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+                    continue
+
+                unacked_tag = method.delivery_tag
+                unacked += 1
+                if unacked >= self.ack_every:
+                    ack()
+                    unacked_tag, unacked = None, 0
+        finally:
+            if unacked_tag is not None and self.channel.is_open:
+                ack()
+            if self.channel.is_open:
+                self.channel.cancel()
+
+    def stop(self):
+        self.stopped.set()
+
+    def close(self):
+        try:
+            if self.connection and self.connection.is_open:
+                self.connection.close()
+        except Exception as e:
+            logger.error(f"Error closing RabbitMQ connection: {e}")
+        self.connection = None
+        self.channel = None
+
+
+class DetectionPublisher:
+    """
+    Collects per-frame detections from one camera and publishes them batch_frames
+    at a time as one binary message (see detection_codec). batch_frames=1 with
+    json_messages=True sends the original one-JSON-message-per-frame format.
+    """
+    def __init__(self, transport, labels, camera_id=None, batch_frames=16, json_messages=False):
+        self.transport = transport
+        self.labels = labels
+        self.camera_id = camera_id
+        self.batch_frames = batch_frames
+        self.json_messages = json_messages
+        self.run_id = uuid.uuid4().hex
+        self.pending = []
+        self.messages = 0
+        self.frames = 0
+        self.bytes = 0
+
+    def start_run(self):
+        """Start a new run id; consumers use it to tell restarted frame numbers from replays"""
+        self.flush()
+        self.run_id = uuid.uuid4().hex
+
+    def add(self, frame_number, detections, timestamp=None):
+        self.pending.append((frame_number, timestamp or time.time(), detections))
+        if len(self.pending) >= self.batch_frames:
+            self.flush()
+
+    def flush(self):
+        """Publish whatever frames are pending"""
+        if not self.pending:
+            return
+        if self.json_messages:
+            bodies = [json.dumps({
+                'camera_id': self.camera_id,
+                'run_id': self.run_id,
+                'frame_number': frame_number,
+                'timestamp': timestamp,
+                'detections': detections_to_dicts(detections, self.labels)
+            }) for frame_number, timestamp, detections in self.pending]
+        else:
+            bodies = [encode_batch(self.camera_id, self.pending, self.labels, self.run_id)]
+
+        self.frames += len(self.pending)
+        self.pending = []
+        for body in bodies:
+            with metrics.STAGE_SECONDS.time('publish'):
+                self.transport.publish(body)
+            self.messages += 1
+            self.bytes += len(body)
+
+    def metrics(self):
+        return {
+            'messages': self.messages,
+            'frames': self.frames,
+            'bytes_per_frame': self.bytes / self.frames if self.frames else 0.0
+        }
@@ -0,0 +1,124 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+VIDEO_SUFFIXES = ('.mp4', '.avi', '.mov')
+
+
+class UploadStore:
+    """
+    Content-addressed store for uploaded videos. Uploads stream to disk in chunks
+    under a server-generated name while being hashed, and end up as <sha256><suffix>,
+    so the same recording is stored once. An index maps each hash to the job that
+    processed it and that job's result, so re-uploads can be answered at once.
+    """
+    def __init__(self, directory="uploaded_videos", write_chunk_bytes=1024 * 1024):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.write_chunk_bytes = write_chunk_bytes
+        self.index_path = self.directory / "index.json"
+        self.lock = threading.Lock()
+        self.index = self._load_index()
+        # Leftovers of uploads interrupted by a restart
+        for path in self.directory.glob(".incoming-*"):
+            path.unlink(missing_ok=True)
+
+    @staticmethod
+    def suffix_for(file_name):
+        """Validated lower-case extension of a client file name, or None if it is not a video"""
+        suffix = Path(file_name or "").suffix.lower()
+        return suffix if suffix in VIDEO_SUFFIXES else None
+
+    async def save(self, chunks, suffix):
+        """
+        Write an async iterator of byte chunks to the store. File writes and hashing run
+        on a worker thread write_chunk_bytes at a time, so the event loop never blocks.
+        Returns (path, sha256, size).
+        """
+        tmp_path = self.directory / f".incoming-{uuid.uuid4().hex}{suffix}"
+        digest = hashlib.sha256()
+        size = 0
+        f = await asyncio.to_thread(open, tmp_path, "wb")
+        try:
+            buffer = bytearray()
+            async for chunk in chunks:
+                buffer += chunk
+                size += len(chunk)
+                if len(buffer) >= self.write_chunk_bytes:
+                    await asyncio.to_thread(self._write, f, digest, bytes(buffer))
+                    buffer.clear()
+            if buffer:
+                await asyncio.to_thread(self._write, f, digest, bytes(buffer))
+            await asyncio.to_thread(f.close)
+        except BaseException:
+            f.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        sha256 = digest.hexdigest()
+        path = self.directory / f"{sha256}{suffix}"
+        if path.exists():
+            tmp_path.unlink()
+        else:
+            os.replace(tmp_path, path)
+        logger.info(f"Stored upload {path.name} ({size / 2 ** 20:.1f} MB)")
+        return path, sha256, size
+
+    @staticmethod
+    def _write(f, digest, data):
+        f.write(data)
+        digest.update(data)
+
+    def get(self, sha256):
+        """Index entry of a stored video: job_id, file_name, uploaded_at and, once done, result"""
+        with self.lock:
+            entry = self.index.get(sha256)
+            return dict(entry) if entry is not None else None
+
+    def find_job(self, job_id):
+        """Index entry of the upload processed by job_id, for jobs from before a restart"""
+        with self.lock:
+            for sha256, entry in self.index.items():
+                if entry.get('job_id') == job_id:
+                    return dict(entry, sha256=sha256)
+        return None
+
+    def record_job(self, sha256, job_id, file_name):
+        with self.lock:
+            entry = self.index.get(sha256)
+            if entry is None or entry['job_id'] != job_id:
+                self.index[sha256] = {'job_id': job_id, 'file_name': file_name, 'uploaded_at': time.time(), 'result': None}
+                self._save_index()
+
+    def record_result(self, sha256, job):
+        """Keep a finished job's snapshot; failed and cancelled jobs are forgotten so a re-upload runs again"""
+        with self.lock:
+            if job.get('status') == 'completed':
+                entry = self.index.setdefault(sha256, {
+                    'job_id': job['job_id'], 'file_name': job.get('file_name'), 'uploaded_at': time.time()
+                })
+                entry['result'] = job
+            else:
+                self.index.pop(sha256, None)
+            self._save_index()
+
+    def _load_index(self):
+        try:
+            return json.loads(self.index_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        tmp_path.write_text(json.dumps(self.index))
+        os.replace(tmp_path, self.index_path)
@@ -1,109 +1,253 @@
-from ultralytics import YOLO
 import cv2
 import numpy as np
 from datetime import datetime
+import hashlib
 import logging
 import os
+import time
 from pathlib import Path
-import pika
 import asyncio
-import aiohttp
+from collections import deque
+from src import metrics
+from src.camera_config import CameraConfig
+from src.clip_recorder import ClipRecorder
+from src.detection_cache import DetectionCache
+from src.detectors import DEFAULT_MODEL, Detector, TorchDetector, load_detector
+from src.frame_pipeline import FramePipeline
+from src.frame_writer import FrameWriter
+from src.hand_tracker import HandTracker
+from src.live_source import LiveCapture
+from src.motion_gate import MotionGate
+from src.violation_store import ViolationStore, make_violation_record
+from src.roi_crops import (DEFAULT_CROP_PADDING, crop_input_fraction, crop_input_sizes, crop_regions,
+                           merge_crop_detections)
+from src.transport import DetectionPublisher
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+FRAMES_PROCESSED = metrics.counter('pizza_frames_processed_total', 'Frames tracked', ['camera'])
+FRAMES_SKIPPED = metrics.counter('pizza_frames_skipped_total', 'Frames the motion gate kept from the model', ['camera'])
+VIOLATIONS = metrics.counter('pizza_violations_total', 'Violations by station', ['camera', 'station'])
+FRAME_LATENCY = metrics.histogram('pizza_live_frame_latency_seconds', 'Capture to tracked, per live frame', ['camera'])
+ALERT_LATENCY = metrics.histogram('pizza_capture_to_alert_seconds', 'Capture to violation event, live feeds', ['camera'])
+
+# Latency samples kept per live run for the percentiles in last_run_stats
+LATENCY_SAMPLES = 10000
+
+
+def latency_summary(samples):
+    """p50/p95/max in milliseconds of latency samples in seconds"""
+    if not samples:
+        return {'count': 0}
+    values = np.array(samples) * 1000
+    return {
+        'count': len(values),
+        'p50': round(float(np.percentile(values, 50)), 1),
+        'p95': round(float(np.percentile(values, 95)), 1),
+        'max': round(float(values.max()), 1)
+    }
+
+
+def video_fps(video_path):
+    """Frame rate a video file reports, or None"""
+    cap = cv2.VideoCapture(str(video_path))
+    try:
+        return cap.get(cv2.CAP_PROP_FPS) or None
+    finally:
+        cap.release()
+
+
 class VideoProcessor:
     """
     Service that processes video and sends detection data to message broker
     """
-    def __init__(self, model_path="yolo12m-v2.pt"):
-        self.model = YOLO(model_path)
-        # Define ROI polygon for ingredient bowls
-        self.ingredient_roi = np.array([
-            (400, 260), (560, 260), (460, 740), (300, 740)
-        ], dtype=np.int32)
+    def __init__(self, model_path=DEFAULT_MODEL, pipelined=False, batch_size=4, queue_size=32,
+                 motion_gating=False, idle_stride=0, motion_threshold=0.01,
+                 crop_inference=False, crop_padding=DEFAULT_CROP_PADDING,
+                 model=None, camera_id=None, roi=None, camera_config=None,
+                 jpeg_quality=90, thumbnail_width=None, frame_queue_size=64, block_on_frame_writes=False,
+                 db_path="violations.db", transport=None, publish_batch_frames=16, json_messages=False,
+                 detection_cache=None, backend=None, imgsz=None, threads=None,
+                 violation_clips=False, clip_pre_seconds=2.0, clip_post_seconds=2.0, clip_memory_mb=256,
+                 frames_dir="violation_frames", clips_dir="violation_clips"):
+        # An already loaded Detector (or ultralytics YOLO) can be passed in to share it between processors
+        if model is None:
+            model = load_detector(model_path, backend, imgsz=imgsz, threads=threads)
+        elif not isinstance(model, Detector):
+            model = TorchDetector(model=model)
+        self.model = model
+        # Weights file identifying the model's detections
+        self.model_path = model.weights_path
+        self.class_ids = {name: class_id for class_id, name in self.model.names.items()}
+        # Ingredient stations (ROI polygons and thresholds); a bare roi becomes a single station
+        if camera_config is None:
+            camera_config = CameraConfig.from_roi(camera_id, roi)
+        self.camera_config = camera_config
+        self.camera_id = camera_id if camera_id is not None else camera_config.camera_id
+        self.metrics_camera = str(self.camera_id or '')
+        self.stations = camera_config.stations
         self.violation_count = 0
-        self.last_violation_time = 0  # To prevent duplicate violations
-        self.violation_cooldown = 30  # Frames between violations
-        self.connection = None
-        self.channel = None
+        self.last_violation_time = {}  # Per station, to prevent duplicate violations
+        self.violation_cooldown = camera_config.violation_cooldown  # Frames between violations
+
+        # Optional detection stream to DetectionService, publish_batch_frames frames per message
+        self.detection_publisher = None
+        if transport is not None:
+            self.detection_publisher = DetectionPublisher(
+                transport,
+                self.model.names,
+                camera_id=self.camera_id,
+                batch_frames=publish_batch_frames,
+                json_messages=json_messages
+            )
         
         # Create violation frames directory
-        self.frames_dir = Path("violation_frames")
-        self.frames_dir.mkdir(exist_ok=True)
+        self.frames_dir = Path(frames_dir)
+        self.frames_dir.mkdir(parents=True, exist_ok=True)
+        # Violation frames are annotated, encoded and written on a background thread
+        self.frame_writer = FrameWriter(
+            jpeg_quality=jpeg_quality,
+            thumbnail_width=thumbnail_width,
+            queue_size=frame_queue_size,
+            block_when_full=block_on_frame_writes
+        )
+        # Optional MP4 clips around violations, cut from frames already decoded for processing
+        self.clip_recorder = None
+        if violation_clips:
+            self.clip_recorder = ClipRecorder(
+                clips_dir=clips_dir,
+                pre_seconds=clip_pre_seconds,
+                post_seconds=clip_post_seconds,
+                max_bytes=int(clip_memory_mb * 2 ** 20)
+            )
+        # Violations are recorded in SQLite through batched background inserts
+        self.violation_store = ViolationStore(db_path) if db_path else None
+        self.current_video = None
+        # Set to identify a run: processing the same video again under the same run_id
+        # stores each violation once (see record_violations)
+        self.run_id = None
+        # Called with each violation event dict (e.g. Broadcaster.publish_threadsafe)
+        self.event_callback = None
+        # Live mode: capture time of the frame being handled, and capture-to-alert latencies
+        self.capture_time = None
+        self.alert_latencies = deque(maxlen=LATENCY_SAMPLES)
 
         # Track hands that entered ROI
-        self.hands_in_roi = {}  # Format: {hand_id: {'entered_with_scooper': bool, 'last_pos': (x,y)}}
-        self.next_hand_id = 0
+        self.hand_tracker = HandTracker(self.stations)
 
-    def ensure_connection(self):
-        """Ensure RabbitMQ connection is active"""
-        try:
-            if not self.connection or self.connection.is_closed:
-                self.connection = pika.BlockingConnection(
-                    pika.ConnectionParameters(
-                        host='localhost',
-                        heartbeat=600,
-                        blocked_connection_timeout=300
-                    )
-                )
-                self.channel = self.connection.channel()
-                self.channel.queue_declare(queue='detections', durable=True)
-                logger.info("RabbitMQ connection established")
-        except Exception as e:
-            logger.error(f"Failed to connect to RabbitMQ: {e}")
-            raise
+        # Pipelined mode: decode, batched inference and tracking run as separate stages
+        self.pipelined = pipelined
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.last_run_stats = None
 
-    def send_detection_data(self, frame_data):
-        """Send detection data to message broker"""
-        try:
-            self.ensure_connection()
-            message = json.dumps(frame_data)
-            self.channel.basic_publish(
-                exchange='',
-                routing_key='detections',
-                body=message,
-                properties=pika.BasicProperties(delivery_mode=2)
+        # Motion gating: skip YOLO (or run every idle_stride-th frame) while the ROI is static
+        self.motion_gate = None
+        if motion_gating:
+            self.motion_gate = MotionGate(
+                np.concatenate(camera_config.polygons),
+                min_changed_fraction=motion_threshold,
+                idle_stride=idle_stride
             )
-        except Exception as e:
-            logger.error(f"Failed to send detection data: {e}")
-            # Try to reconnect once
-            try:
-                self.close()
-                self.ensure_connection()
-                self.channel.basic_publish(
-                    exchange='',
-                    routing_key='detections',
-                    body=message,
-                    properties=pika.BasicProperties(delivery_mode=2)
-                )
-            except Exception as retry_error:
-                logger.error(f"Retry failed: {retry_error}")
-                raise
+
+        # Cropped inference: run YOLO only on padded boxes around the ROIs, each at the
+        # scale of the whole frame so the model input shrinks with the crop
+        if crop_inference and self.model.fixed_input:
+            logger.warning(f"{self.model.weights_path} has a fixed input size, so every crop would cost a full "
+                           f"frame; running full-frame inference. Export it with dynamic=True to crop")
+            crop_inference = False
+        self.crop_inference = crop_inference
+        self.crop_padding = crop_padding
+        self.crop_polygons = camera_config.polygons
+        self._crop_cache = None  # (frame_shape, regions, model input sizes)
+
+        # Detection cache: a rerun of a cached video/model pair replays tracking without YOLO
+        if isinstance(detection_cache, (str, Path)):
+            detection_cache = DetectionCache(detection_cache)
+        self.detection_cache = detection_cache
+        self._cache_recorder = None
+        if detection_cache is not None and motion_gating:
+            # Gated frames have no detections, and which frames are gated depends on the tracker
+            logger.warning("Detection cache is disabled with motion gating")
+            self.detection_cache = None
 
     async def process_video(self, video_path):
         """Process video and detect violations"""
+        if self.pipelined:
+            # Stages run on worker threads; keep the event loop free while they do
+            return await asyncio.to_thread(self.run_video, video_path)
+        return self.run_video(video_path)
+
+    def run_video(self, video_path, progress_callback=None, should_stop=None):
+        """
+        Process video and detect violations (blocking).
+        progress_callback(frames_done, total_frames, fps, violation_count) is called after
+        every frame; processing stops early once should_stop() returns True.
+        """
+        self.current_video = str(video_path)
+        self._cache_recorder = None
+        if self.detection_cache is not None:
+            entry, should_stop = self.open_detection_cache(video_path, should_stop)
+            if entry is not None:
+                return self.replay_detections(entry, video_path, progress_callback, should_stop)
+        if self.detection_publisher is not None:
+            self.detection_publisher.start_run()
+        if self.clip_recorder is not None:
+            self.clip_recorder.start_run(video_fps(video_path), self.camera_id)
+        if self.pipelined:
+            pipeline = FramePipeline(self, batch_size=self.batch_size, queue_size=self.queue_size)
+            self.last_run_stats = pipeline.run(video_path, progress_callback, should_stop)
+            self.flush_outputs()
+            if self.motion_gate is not None:
+                self.last_run_stats.update(self.motion_gate.summary())
+                logger.info(f"Motion gate ran inference on {self.last_run_stats['inferred_fraction']:.1%} of frames")
+            logger.info(f"Processed {self.last_run_stats['frames']} frames with {self.violation_count} violations")
+            return self.violation_count
+
         try:
             cap = cv2.VideoCapture(str(video_path))
             if not cap.isOpened():
                 raise ValueError(f"Failed to open video file: {video_path}")
 
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            start = time.perf_counter()
             frame_number = 0
             while True:
-                ret, frame = cap.read()
+                if should_stop and should_stop():
+                    logger.info(f"Stopped processing {video_path} at frame {frame_number}")
+                    break
+
+                with metrics.STAGE_SECONDS.time('decode'):
+                    ret, frame = cap.read()
                 if not ret:
                     break
 
                 frame_number += 1
-                results = self.model(frame)[0]
-                
-                # Process detections
-                violations = self.track_hands_and_check_violations(frame, results, frame_number)
-                if violations:
-                    self.save_violation_frame(frame, violations, frame_number)
+                if self.should_infer(frame):
+                    detections = self.infer_batch([frame])[0]
+                    self.handle_frame(frame, detections, frame_number)
+                else:
+                    self.skip_frame(frame, frame_number)
+
+                if progress_callback:
+                    elapsed = time.perf_counter() - start
+                    progress_callback(frame_number, total_frames, frame_number / elapsed, self.violation_count)
 
-            logger.info(f"Processed {frame_number} frames with {self.violation_count} violations")
+            elapsed = time.perf_counter() - start
+            self.last_run_stats = {
+                'frames': frame_number,
+                'elapsed_s': round(elapsed, 3),
+                'fps': round(frame_number / elapsed, 2) if elapsed > 0 else 0.0
+            }
+            self.flush_outputs()
+            if self.motion_gate is not None:
+                self.last_run_stats.update(self.motion_gate.summary())
+            logger.info(f"Processed {frame_number} frames with {self.violation_count} violations "
+                        f"at {self.last_run_stats['fps']} fps")
+            if self.motion_gate is not None:
+                logger.info(f"Motion gate ran inference on {self.last_run_stats['inferred_fraction']:.1%} of frames")
             return self.violation_count
 
         except Exception as e:
@@ -113,111 +257,368 @@ class VideoProcessor:
             if 'cap' in locals():
                 cap.release()
 
-    def track_hands_and_check_violations(self, frame, results, frame_number):
-        current_hands = []
-        current_scoopers = []
-        violations = []
+    def inference_settings(self):
+        """Settings other than the model and video that change what the model detects"""
+        return {
+            'crop_inference': self.crop_inference,
+            'crop_padding': self.crop_padding if self.crop_inference else None,
+            # Crops used to be letterboxed to imgsz; entries recorded that way must not be replayed
+            'crop_scale': 'frame' if self.crop_inference else None,
+            'names': {str(class_id): name for class_id, name in self.model.names.items()},
+            'detector': self.model.settings()
+        }
 
-        # Get current detections
-        for *box, conf, cls in results.boxes.data.cpu().numpy():
-            x1, y1, x2, y2 = map(int, box)
-            label = self.model.names[int(cls)]
-            cx, cy = (x1 + x2)//2, (y1 + y2)//2
-            
-            detection = {
-                'bbox': [x1, y1, x2, y2],
-                'center': (cx, cy),
-                'confidence': float(conf)
+    def open_detection_cache(self, video_path, should_stop=None):
+        """
+        Look the video up in the detection cache. Returns (entry, should_stop): the cached
+        entry on a hit; on a miss, None and a should_stop that also marks the recording
+        as partial, since only complete runs are stored.
+        """
+        key, meta = self.detection_cache.key(video_path, self.model_path, self.inference_settings())
+        if key is None:
+            logger.info("Model has no weights file to key the detection cache on; not caching")
+            return None, should_stop
+        entry = self.detection_cache.get(key)
+        if entry is not None:
+            return entry, should_stop
+
+        recorder = self._cache_recorder = self.detection_cache.recorder(key, meta)
+        if should_stop is None:
+            return None, None
+
+        def stop_and_discard():
+            stop = should_stop()
+            if stop:
+                recorder.complete = False
+            return stop
+
+        return None, stop_and_discard
+
+    def replay_detections(self, entry, video_path, progress_callback=None, should_stop=None):
+        """
+        Re-run tracking and the violation rules over cached detections (blocking). The
+        video is only read to save the frames of violations.
+        """
+        logger.info(f"Replaying {entry.frames} frames of cached detections for {video_path}")
+        if self.detection_publisher is not None:
+            self.detection_publisher.start_run()
+        cap = None
+        start = time.perf_counter()
+        frames_done = 0
+        try:
+            for frame_number in range(1, entry.frames + 1):
+                if should_stop and should_stop():
+                    logger.info(f"Stopped replaying {video_path} at frame {frames_done}")
+                    break
+
+                detections = entry.frame(frame_number)
+                violations = self.track_hands_and_check_violations(None, detections, frame_number)
+                if self.detection_publisher is not None:
+                    self.detection_publisher.add(frame_number, detections)
+                if violations:
+                    if cap is None:
+                        cap = cv2.VideoCapture(str(video_path))
+                    self.report_violations(self.read_frame(cap, frame_number), violations, frame_number)
+                frames_done = frame_number
+
+                if progress_callback:
+                    elapsed = time.perf_counter() - start
+                    progress_callback(frames_done, entry.frames, frames_done / elapsed if elapsed > 0 else 0.0,
+                                      self.violation_count)
+        finally:
+            if cap is not None:
+                cap.release()
+
+        elapsed = time.perf_counter() - start
+        self.last_run_stats = {
+            'frames': frames_done,
+            'elapsed_s': round(elapsed, 3),
+            'fps': round(frames_done / elapsed, 2) if elapsed > 0 else 0.0,
+            'detection_cache': 'replayed'
+        }
+        self.flush_outputs()
+        logger.info(f"Replayed {frames_done} frames with {self.violation_count} violations "
+                    f"at {self.last_run_stats['fps']} fps")
+        return self.violation_count
+
+    def run_live(self, source, progress_callback=None, should_stop=None, realtime=False):
+        """
+        Process a live feed until it ends or should_stop() returns True (blocking). The
+        model always gets the freshest frame; frames that arrive while it is busy are
+        dropped, so latency stays bounded by one inference instead of growing. Lost feeds
+        are reopened. realtime=True plays a file at its frame rate as a stand-in camera.
+        Capture-to-alert latency goes into each violation event and last_run_stats.
+        """
+        self.current_video = str(source)
+        if self.detection_publisher is not None:
+            self.detection_publisher.start_run()
+        capture = LiveCapture(source, realtime=realtime, camera_id=self.camera_id).start()
+        frame_latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.alert_latencies.clear()
+        start = time.perf_counter()
+        processed = 0
+        logger.info(f"Processing live feed {source}")
+        try:
+            while not (should_stop and should_stop()):
+                item = capture.read(timeout=0.5)
+                if item is None:
+                    if capture.ended:
+                        break
+                    continue
+
+                frame_number, frame, self.capture_time = item
+                if processed == 0 and self.clip_recorder is not None:
+                    self.clip_recorder.start_run(capture.fps, self.camera_id)
+                processed += 1
+                if self.should_infer(frame):
+                    detections = self.infer_batch([frame])[0]
+                    self.handle_frame(frame, detections, frame_number)
+                    latency = time.monotonic() - self.capture_time
+                    frame_latencies.append(latency)
+                    FRAME_LATENCY.observe(latency, self.metrics_camera)
+                else:
+                    self.skip_frame(frame, frame_number)
+
+                if progress_callback:
+                    elapsed = time.perf_counter() - start
+                    progress_callback(processed, 0, processed / elapsed if elapsed > 0 else 0.0, self.violation_count)
+        finally:
+            capture.stop()
+            self.capture_time = None
+            elapsed = time.perf_counter() - start
+            self.last_run_stats = {
+                'frames': processed,
+                'elapsed_s': round(elapsed, 3),
+                'fps': round(processed / elapsed, 2) if elapsed > 0 else 0.0,
+                **capture.metrics(),
+                'frame_latency_ms': latency_summary(frame_latencies),
+                'capture_to_alert_ms': latency_summary(self.alert_latencies)
             }
+            self.flush_outputs()
+            logger.info(f"Live feed {source}: {processed} of {capture.frames_captured} frames processed, "
+                        f"{capture.frames_dropped} dropped, {capture.reconnects} reconnects, "
+                        f"{self.violation_count} violations; latency {self.last_run_stats['frame_latency_ms']}")
+        return self.violation_count
 
-            if label == 'hand':
-                current_hands.append(detection)
-            elif label == 'scooper':
-                current_scoopers.append(detection)
+    @staticmethod
+    def read_frame(cap, frame_number):
+        """Frame frame_number (from 1) of an open capture; decodes forward over short gaps instead of seeking"""
+        position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+        if position <= frame_number - 1 <= position + 60:
+            for _ in range(frame_number - 1 - position):
+                cap.grab()
+        else:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, frame_number - 1)
+        ret, frame = cap.read()
+        return frame if ret else None
 
-        # Update hand tracking and check for violations
-        self.update_hand_tracking(current_hands, current_scoopers, frame_number, violations)
+    def flush_outputs(self):
+        """Wait for queued violation frames and records, and add writer metrics to last_run_stats"""
+        if self._cache_recorder is not None:
+            stored = self._cache_recorder.commit()
+            self._cache_recorder = None
+            if self.last_run_stats is not None:
+                self.last_run_stats['detection_cache'] = 'stored' if stored else 'not stored'
+        if self.detection_publisher is not None:
+            self.detection_publisher.flush()
+            if self.last_run_stats is not None:
+                self.last_run_stats['detection_publisher'] = self.detection_publisher.metrics()
+        if self.violation_store is not None:
+            self.violation_store.flush()
+        if self.clip_recorder is not None:
+            self.clip_recorder.finish()
+            if self.last_run_stats is not None:
+                self.last_run_stats['clips'] = self.clip_recorder.metrics()
+        self.frame_writer.flush()
+        metrics = self.frame_writer.metrics()
+        if self.last_run_stats is not None:
+            self.last_run_stats['frame_writer'] = metrics
+        logger.info(f"Violation frame writer: {metrics}")
+
+    def reset_state(self):
+        """Clear counts and tracked hands so the processor can be reused for another video"""
+        self.violation_count = 0
+        self.last_violation_time = {}
+        self.hand_tracker.reset()
+        self.last_run_stats = None
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
 
+    def should_infer(self, frame):
+        """Ask the motion gate whether this frame needs a YOLO pass"""
+        if self.motion_gate is None:
+            return True
+        # Never skip while hands are tracked: a skipped frame would look like the hand vanished
+        infer = self.motion_gate.should_infer(frame, force=len(self.hand_tracker) > 0)
+        if not infer:
+            FRAMES_SKIPPED.inc(1, self.metrics_camera)
+        return infer
+
+    def infer_batch(self, frames):
+        """Run YOLO over a list of frames and return one (N, 6) detection array per frame"""
+        inputs = [self.prepare_inputs(frame) for frame in frames]
+        outputs = self.run_model([item for items in inputs for item in items])
+
+        detections = []
+        for frame, items in zip(frames, inputs):
+            detections.append(self.collect_detections(frame, outputs[:len(items)]))
+            outputs = outputs[len(items):]
+        return detections
+
+    def run_model(self, inputs):
+        """Run the detector over (image, input size) pairs and return their raw (N, 6) detection arrays"""
+        return self.model.detect([image for image, _ in inputs], [size for _, size in inputs])
+
+    def prepare_inputs(self, frame):
+        """
+        (image, model input size) pairs for this frame: the frame itself at the model's
+        imgsz, or its ROI crops at the input sizes that keep the frame's scale
+        """
+        if not self.crop_inference:
+            return [(frame, None)]
+        _, regions, sizes = self.get_crop_regions(frame.shape)
+        return [(frame[y1:y2, x1:x2], size) for (x1, y1, x2, y2), size in zip(regions, sizes)]
+
+    def collect_detections(self, frame, outputs):
+        """Combine model outputs for prepare_inputs(frame) into one frame-coordinate array"""
+        if not self.crop_inference:
+            return outputs[0]
+        return merge_crop_detections(outputs, self.get_crop_regions(frame.shape)[1])
+
+    def get_crop_regions(self, frame_shape):
+        """(frame_shape, padded ROI crop boxes, their model input sizes), computed once per frame size"""
+        if self._crop_cache is None or self._crop_cache[0] != frame_shape:
+            regions = crop_regions(self.crop_polygons, frame_shape, self.crop_padding)
+            sizes = crop_input_sizes(regions, frame_shape, self.model.imgsz)
+            self._crop_cache = (frame_shape, regions, sizes)
+            logger.info(f"Cropped inference on {len(regions)} region(s) at input sizes {sizes}: "
+                        f"{crop_input_fraction(sizes, frame_shape, self.model.imgsz):.1%} of the "
+                        f"full frame's model input pixels")
+        return self._crop_cache
+
+    def handle_frame(self, frame, detections, frame_number):
+        """Track hands for one frame's detections and save the frame on violation"""
+        with metrics.STAGE_SECONDS.time('track'):
+            violations = self.track_hands_and_check_violations(frame, detections, frame_number)
+        FRAMES_PROCESSED.inc(1, self.metrics_camera)
+        if self.detection_publisher is not None:
+            self.detection_publisher.add(frame_number, detections)
+        if self._cache_recorder is not None:
+            self._cache_recorder.add(frame_number, detections)
         if violations:
+            self.report_violations(frame, violations, frame_number)
+        if self.clip_recorder is not None:
+            self.clip_recorder.add(frame_number, frame)
+        return violations
+
+    def skip_frame(self, frame, frame_number):
+        """
+        A frame the motion gate kept from the model. Clips still need it, or they would
+        jump over static stretches and play faster than the time they cover.
+        """
+        if self.clip_recorder is not None:
+            self.clip_recorder.add(frame_number, frame)
+
+    def report_violations(self, frame, violations, frame_number):
+        """Save the annotated frame, record the violations and emit the event"""
+        frame_path = self.save_violation_frame(frame, violations, frame_number) if frame is not None else None
+        clip_path = None
+        if self.clip_recorder is not None:
+            clip_path = self.clip_recorder.violation(frame_number, frame,
+                                                     lambda image: self.annotate_frame(image, violations))
+        self.record_violations(violations, frame_number, frame_path, clip_path)
+        self.emit_violation_event(frame_path, frame_number, violations, clip_path)
+
+    def record_violations(self, violations, frame_number, frame_path, clip_path=None):
+        """Queue one store record per violating hand"""
+        if self.violation_store is None:
+            return
+        polygons = {station.name: station.polygon for station in self.stations}
+        for i, hand in enumerate(violations['hands']):
+            # Same id for the same event, as in DetectionService, so a rerun cannot store it twice
+            violation_id = None
+            if self.run_id is not None:
+                key = f"{self.camera_id}|{self.run_id}|{frame_number}|{hand['station']}|{i}"
+                violation_id = hashlib.sha1(key.encode()).hexdigest()[:32]
+            self.violation_store.add(make_violation_record(
+                violations['violation_type'],
+                frame_number,
+                frame_path=frame_path,
+                hand=hand,
+                camera_id=self.camera_id,
+                station=hand['station'],
+                roi=polygons.get(hand['station']),
+                metadata={'video': self.current_video, 'clip': clip_path},
+                violation_id=violation_id
+            ))
+
+    def track_hands_and_check_violations(self, frame, detections, frame_number):
+        detections = np.asarray(detections).reshape(-1, 6)
+        boxes = detections[:, :4].astype(np.int64)
+        centers = (boxes[:, :2] + boxes[:, 2:]) // 2
+        classes = detections[:, 5].astype(np.int64)
+
+        # Get current detections
+        hand_rows = np.flatnonzero(classes == self.class_ids.get('hand', -1))
+        scooper_rows = np.flatnonzero(classes == self.class_ids.get('scooper', -1))
+
+        # Update hand tracking and check for violations
+        violators = self.update_hand_tracking(centers[hand_rows], centers[scooper_rows], frame_number)
+
+        if violators:
+            def detection(row):
+                return {
+                    'bbox': boxes[row].tolist(),
+                    'center': tuple(centers[row].tolist()),
+                    'confidence': float(detections[row, 4])
+                }
+
+            hands = []
+            for hand_index, station in violators:
+                hand = detection(hand_rows[hand_index])
+                hand['station'] = self.stations[station].name
+                hands.append(hand)
             return {
-                'hands': violations,
-                'scoopers': current_scoopers,
+                'hands': hands,
+                'scoopers': [detection(row) for row in scooper_rows],
+                'stations': sorted({hand['station'] for hand in hands}),
                 'violation_type': 'left_roi_without_scooper'
             }
         return None
 
-    def update_hand_tracking(self, current_hands, current_scoopers, frame_number, violations):
-        # Update existing hands and check for leaving ROI
-        hands_to_remove = []
-        for hand_id, hand_info in self.hands_in_roi.items():
-            hand_found = False
-            last_pos = hand_info['last_pos']
-
-            # Try to match with current hands
-            for hand in current_hands:
-                cx, cy = hand['center']
-                dist = np.hypot(cx - last_pos[0], cy - last_pos[1])
-                
-                if dist < 50:  # Maximum distance for same hand
-                    hand_found = True
-                    hand_info['last_pos'] = (cx, cy)
-                    
-                    # Check if hand left ROI
-                    in_roi = cv2.pointPolygonTest(self.ingredient_roi, (cx, cy), False) >= 0
-                    if not in_roi and not hand_info.get('left_checked', False):
-                        # Check if there's a scooper nearby when leaving
-                        has_scooper = any(
-                            np.hypot(s['center'][0] - cx, s['center'][1] - cy) < 100 
-                            for s in current_scoopers
-                        )
-                        
-                        if not has_scooper and frame_number - self.last_violation_time >= self.violation_cooldown:
-                            self.violation_count += 1
-                            self.last_violation_time = frame_number
-                            violations.append(hand)
-                        
-                        hand_info['left_checked'] = True
-                    break
-
-            if not hand_found:
-                hands_to_remove.append(hand_id)
-
-        # Remove hands that are no longer tracked
-        for hand_id in hands_to_remove:
-            del self.hands_in_roi[hand_id]
-
-        # Add new hands that entered ROI
-        for hand in current_hands:
-            cx, cy = hand['center']
-            if cv2.pointPolygonTest(self.ingredient_roi, (cx, cy), False) >= 0:
-                # Check if this is a new hand
-                if not any(
-                    np.hypot(cx - info['last_pos'][0], cy - info['last_pos'][1]) < 50 
-                    for info in self.hands_in_roi.values()
-                ):
-                    # Record if hand entered with scooper
-                    has_scooper = any(
-                        np.hypot(s['center'][0] - cx, s['center'][1] - cy) < 100 
-                        for s in current_scoopers
-                    )
-                    self.hands_in_roi[self.next_hand_id] = {
-                        'entered_with_scooper': has_scooper,
-                        'last_pos': (cx, cy),
-                        'left_checked': False
-                    }
-                    self.next_hand_id += 1
+    def update_hand_tracking(self, hand_centers, scooper_centers, frame_number):
+        """Advance the hand tracker and return (hand index, station index) for each violation"""
+        violators = []
+        for hand_index, station in self.hand_tracker.update(hand_centers, scooper_centers):
+            if frame_number - self.last_violation_time.get(station, 0) >= self.violation_cooldown:
+                self.violation_count += 1
+                self.last_violation_time[station] = frame_number
+                violators.append((hand_index, station))
+                VIOLATIONS.inc(1, self.metrics_camera, self.stations[station].name)
+        return violators
 
     def save_violation_frame(self, frame, violations, frame_number):
-        frame_copy = frame.copy()
-        
-        # Draw ROI
-        cv2.polylines(frame_copy, [self.ingredient_roi], True, (0, 255, 255), 2)
+        """Queue the annotated frame for writing and return the path it will be written to"""
+        # Save frame with timestamp
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        suffix = f"_{self.camera_id}" if self.camera_id else ""
+        frame_path = self.frames_dir / f"violation_{self.violation_count}_{frame_number}_{timestamp}{suffix}.jpg"
+        return self.frame_writer.submit(frame_path, frame, lambda image: self.annotate_frame(image, violations))
+
+    def annotate_frame(self, frame_copy, violations):
+        """Draw stations, violating hands and scoopers onto the frame in place"""
+        # Draw stations
+        for station in self.stations:
+            cv2.polylines(frame_copy, [station.polygon], True, (0, 255, 255), 2)
+            x, y = station.polygon.min(axis=0)
+            cv2.putText(frame_copy, station.name, (int(x), int(y) - 5), cv2.FONT_HERSHEY_SIMPLEX,
+                        0.5, (0, 255, 255), 1)
         
         # Draw hands (red for violations)
         for hand in violations['hands']:
             x1, y1, x2, y2 = hand['bbox']
             cv2.rectangle(frame_copy, (x1, y1), (x2, y2), (0, 0, 255), 2)
-            cv2.putText(frame_copy, 'VIOLATION: Left ROI without Scooper', 
+            cv2.putText(frame_copy, f"VIOLATION: Left {hand['station']} without Scooper", 
                        (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 
                        0.5, (0, 0, 255), 2)
 
@@ -226,23 +627,28 @@ class VideoProcessor:
             x1, y1, x2, y2 = scooper['bbox']
             cv2.rectangle(frame_copy, (x1, y1), (x2, y2), (0, 255, 0), 2)
 
-        # Save frame with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        frame_path = self.frames_dir / f"violation_{self.violation_count}_{frame_number}_{timestamp}.jpg"
-        cv2.imwrite(str(frame_path), frame_copy)
-        return str(frame_path)
-
-    async def emit_violation_event(self, frame_path, frame_number):
-        """Emit violation event for real-time display"""
+    def emit_violation_event(self, frame_path, frame_number, violations, clip_path=None):
+        """Emit violation event for real-time display through the in-process event callback"""
+        latency = None
+        if self.capture_time is not None:
+            latency = time.monotonic() - self.capture_time
+            self.alert_latencies.append(latency)
+            ALERT_LATENCY.observe(latency, self.metrics_camera)
+        if self.event_callback is None:
+            return
         event_data = {
             'violation_count': self.violation_count,
             'frame_path': frame_path,
             'frame_number': frame_number,
+            'clip_path': clip_path,
+            'camera_id': self.camera_id,
+            'stations': violations['stations'],
+            'violation_type': violations['violation_type'],
             'timestamp': datetime.now().isoformat()
         }
-        # Send event to FastAPI endpoint
-        async with aiohttp.ClientSession() as session:
-            await session.post(
-                'http://localhost:8000/violation_event',
-                json=event_data
-            )
\ No newline at end of file
+        if latency is not None:
+            event_data['capture_to_alert_ms'] = round(latency * 1000, 1)
+        try:
+            self.event_callback(event_data)
+        except Exception as e:
+            logger.error(f"Failed to emit violation event: {e}")
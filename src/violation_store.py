@@ -0,0 +1,314 @@
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Columns written for each violation, in insert order
+COLUMNS = (
+    'violation_id', 'timestamp', 'frame_number', 'frame_path', 'hand_bbox', 'hand_position',
+    'violation_type', 'confidence', 'roi_coordinates', 'metadata', 'camera_id', 'station'
+)
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS violations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        violation_id TEXT UNIQUE,
+        timestamp TEXT,
+        frame_number INTEGER,
+        frame_path TEXT,
+        hand_bbox TEXT,
+        hand_position TEXT,
+        violation_type TEXT,
+        confidence REAL,
+        roi_coordinates TEXT,
+        metadata TEXT,
+        camera_id TEXT,
+        station TEXT
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_violations_timestamp ON violations (timestamp);
+    CREATE INDEX IF NOT EXISTS idx_violations_camera ON violations (camera_id, timestamp);
+    CREATE INDEX IF NOT EXISTS idx_violations_station ON violations (station, timestamp);
+    CREATE INDEX IF NOT EXISTS idx_violations_type ON violations (violation_type, timestamp);
+
+    -- Maintained counters so counts never scan the violations table
+    CREATE TABLE IF NOT EXISTS violation_counts (
+        camera_id TEXT NOT NULL,
+        station TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (camera_id, station)
+    );
+
+    CREATE TRIGGER IF NOT EXISTS trg_violations_count AFTER INSERT ON violations
+    BEGIN
+        INSERT INTO violation_counts (camera_id, station, count)
+        VALUES (COALESCE(NEW.camera_id, ''), COALESCE(NEW.station, ''), 1)
+        ON CONFLICT (camera_id, station) DO UPDATE SET count = count + 1;
+    END;
+
+    -- Tracker state of each camera's consumer, committed in order with its violations
+    CREATE TABLE IF NOT EXISTS camera_checkpoints (
+        camera_id TEXT PRIMARY KEY,
+        partition INTEGER,
+        run_id TEXT,
+        frame_number INTEGER,
+        frames INTEGER,
+        violations INTEGER,
+        state TEXT,
+        updated_at TEXT
+    );
+'''
+
+CHECKPOINT_COLUMNS = (
+    'camera_id', 'partition', 'run_id', 'frame_number', 'frames', 'violations', 'state', 'updated_at'
+)
+
+
+def make_violation_record(violation_type, frame_number, frame_path=None, hand=None, camera_id=None,
+                          station=None, roi=None, metadata=None, timestamp=None, violation_id=None):
+    """
+    Build a row for ViolationStore.add from a hand detection dict. A violation_id
+    derived from the event makes re-processing the same frame a no-op.
+    """
+    hand = hand or {}
+    return {
+        'violation_id': violation_id or uuid.uuid4().hex,
+        'timestamp': (timestamp or datetime.now()).isoformat(timespec='milliseconds'),
+        'frame_number': frame_number,
+        'frame_path': frame_path,
+        'hand_bbox': json.dumps(hand.get('bbox')),
+        'hand_position': json.dumps(hand.get('center')),
+        'violation_type': violation_type,
+        'confidence': hand.get('confidence'),
+        'roi_coordinates': json.dumps(roi.tolist() if hasattr(roi, 'tolist') else roi),
+        'metadata': json.dumps(metadata or {}),
+        'camera_id': camera_id,
+        'station': station
+    }
+
+
+class ViolationStore:
+    """
+    SQLite violation store in WAL mode: inserts are batched into transactions by a
+    background thread, reads use indexed keyset pagination and maintained counters
+    """
+    def __init__(self, db_path="violations.db", batch_size=200, flush_interval=0.5):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pending = queue.Queue()
+        self.local = threading.local()
+        self.setup_database()
+
+        self.writer = threading.Thread(target=self._write_loop, name="violation-store", daemon=True)
+        self.writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def setup_database(self):
+        """Create or migrate the schema, indexes and counters"""
+        conn = self._connect()
+        try:
+            # Older databases lack the camera/station columns; add them before the indexes
+            existing = {row['name'] for row in conn.execute("PRAGMA table_info(violations)")}
+            if existing:
+                for column in ('camera_id', 'station'):
+                    if column not in existing:
+                        conn.execute(f"ALTER TABLE violations ADD COLUMN {column} TEXT")
+            has_counts = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'violation_counts'"
+            ).fetchone()
+            conn.executescript(SCHEMA)
+            if not has_counts:
+                # First run against an older database: seed counters from existing rows
+                conn.execute('''
+                    INSERT INTO violation_counts (camera_id, station, count)
+                    SELECT COALESCE(camera_id, ''), COALESCE(station, ''), COUNT(*)
+                    FROM violations GROUP BY 1, 2
+                ''')
+            conn.commit()
+        finally:
+            conn.close()
+        logger.info(f"Database initialized: {self.db_path}")
+
+    def _reader(self):
+        """One read connection per thread"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = self._connect()
+        return conn
+
+    def add(self, record):
+        """Queue a violation record (see make_violation_record) for the next batch"""
+        self.pending.put(('violation', record))
+
+    def add_checkpoint(self, record):
+        """Queue a camera checkpoint; it commits together with or after every violation added before it"""
+        self.pending.put(('checkpoint', record))
+
+    def _write_loop(self):
+        conn = self._connect()
+        statements = {
+            'violation': (COLUMNS, "INSERT OR IGNORE INTO violations ({}) VALUES ({})"),
+            'checkpoint': (CHECKPOINT_COLUMNS, "INSERT OR REPLACE INTO camera_checkpoints ({}) VALUES ({})")
+        }
+        statements = {
+            kind: (columns, sql.format(', '.join(columns), ', '.join('?' for _ in columns)))
+            for kind, (columns, sql) in statements.items()
+        }
+        while True:
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + self.flush_interval
+            # A flush marker commits what has been gathered right away
+            while len(batch) < self.batch_size and batch[-1][0] != 'flush':
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                with conn:
+                    for kind, (columns, sql) in statements.items():
+                        rows = [tuple(record.get(c) for c in columns) for k, record in batch if k == kind]
+                        if rows:
+                            conn.executemany(sql, rows)
+            except Exception as e:
+                logger.error(f"Failed to store {len(batch)} records: {e}")
+            finally:
+                for _ in batch:
+                    self.pending.task_done()
+
+    def flush(self):
+        """Block until every queued violation is committed"""
+        self.pending.put(('flush', None))
+        self.pending.join()
+
+    def count(self, camera_id=None, station=None):
+        """Violation count from the maintained counters"""
+        sql = "SELECT COALESCE(SUM(count), 0) FROM violation_counts WHERE 1 = 1"
+        params = []
+        if camera_id is not None:
+            sql += " AND camera_id = ?"
+            params.append(camera_id)
+        if station is not None:
+            sql += " AND station = ?"
+            params.append(station)
+        return self._reader().execute(sql, params).fetchone()[0]
+
+    def load_checkpoint(self, camera_id):
+        """Last committed checkpoint of a camera, with its state decoded, or None"""
+        row = self._reader().execute(
+            "SELECT * FROM camera_checkpoints WHERE camera_id = ?", (camera_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        checkpoint = dict(row)
+        checkpoint['state'] = json.loads(checkpoint['state'])
+        return checkpoint
+
+    def partition_summary(self):
+        """Cameras, frames and violations per consumer partition, from the checkpoints"""
+        rows = self._reader().execute('''
+            SELECT partition, COUNT(*) AS cameras, SUM(frames) AS frames, SUM(violations) AS violations,
+                   MAX(updated_at) AS updated_at
+            FROM camera_checkpoints GROUP BY partition ORDER BY partition
+        ''')
+        return [dict(row) for row in rows]
+
+    def counts_by_camera(self):
+        rows = self._reader().execute(
+            "SELECT camera_id, station, count FROM violation_counts ORDER BY camera_id, station"
+        )
+        return [dict(row) for row in rows]
+
+    def query(self, start=None, end=None, camera_id=None, violation_type=None, station=None,
+              cursor=None, limit=50):
+        """
+        Newest-first page of violations. start/end are ISO timestamps (inclusive start,
+        exclusive end); cursor is the next_cursor of the previous page.
+        Returns {'items': [...], 'next_cursor': str or None}.
+        """
+        limit = max(1, min(int(limit), 1000))
+        conditions, params = [], []
+        for column, value in (('camera_id', camera_id), ('violation_type', violation_type), ('station', station)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if start is not None:
+            conditions.append("timestamp >= ?")
+            params.append(start)
+        if end is not None:
+            conditions.append("timestamp < ?")
+            params.append(end)
+        if cursor:
+            # Keyset pagination on (timestamp, id): no OFFSET scans on deep pages
+            cursor_timestamp, _, cursor_id = cursor.rpartition("|")
+            conditions.append("(timestamp < ? OR (timestamp = ? AND id < ?))")
+            params.extend([cursor_timestamp, cursor_timestamp, int(cursor_id)])
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._reader().execute(
+            f"SELECT * FROM violations {where} ORDER BY timestamp DESC, id DESC LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+
+        items = [self._decode(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = items[-1]
+            next_cursor = f"{last['timestamp']}|{last['id']}"
+        return {'items': items, 'next_cursor': next_cursor}
+
+    def since(self, after_id=None, limit=100):
+        """
+        Violations committed after the row id after_id, oldest first, for readers that
+        keep a cursor. Without after_id, the newest `limit` violations. Returns
+        {'items': [...], 'last_id': id of the last item, or after_id when there are none}.
+        """
+        limit = max(1, min(int(limit), 1000))
+        if after_id is None:
+            rows = self._reader().execute(
+                "SELECT * FROM violations ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()[::-1]
+        else:
+            rows = self._reader().execute(
+                "SELECT * FROM violations WHERE id > ? ORDER BY id LIMIT ?", (int(after_id), limit)
+            ).fetchall()
+        items = [self._decode(row) for row in rows]
+        return {'items': items, 'last_id': items[-1]['id'] if items else after_id}
+
+    def latest_id(self):
+        """Row id of the newest committed violation (0 when there are none); a rowid lookup, no scan"""
+        return self._reader().execute("SELECT COALESCE(MAX(id), 0) FROM violations").fetchone()[0]
+
+    @staticmethod
+    def _decode(row):
+        item = dict(row)
+        for column in ('hand_bbox', 'hand_position', 'roi_coordinates', 'metadata'):
+            if item[column] is not None:
+                item[column] = json.loads(item[column])
+        return item
+
+    def recent_frames(self, limit=100):
+        """Frame paths of the newest violations that saved a frame"""
+        rows = self._reader().execute(
+            "SELECT frame_path FROM violations WHERE frame_path IS NOT NULL ORDER BY id DESC LIMIT ?",
+            (limit,)
+        )
+        return [row['frame_path'] for row in rows]
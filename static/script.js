@@ -4,7 +4,12 @@ document.addEventListener('DOMContentLoaded', () => {
     const processVideoButton = document.getElementById('process-video');
     const videoUploadInput = document.getElementById('video-upload');
     const framesContainer = document.getElementById('frames-container');
-    let pollInterval;
+    // Cards shown, by frame name (one card per frame, even with several violating hands)
+    const shownFrames = new Set();
+    const MAX_CARDS = 200;
+    let lastViolationId = null;
+    let ws = null;
+    let pollTimer = null;
 
     // Check if elements exist before adding event listeners
     if (fetchCountButton) {
@@ -39,20 +44,17 @@ document.addEventListener('DOMContentLoaded', () => {
             const file = videoUploadInput.files[0];
             console.log('Selected file:', file.name); // Debug log
 
-            const formData = new FormData();
-            formData.append('file', file);
-
             try {
                 // Disable button and show processing state
                 processVideoButton.disabled = true;
                 processVideoButton.textContent = 'Processing...';
-                violationCountElement.textContent = '0';
-                framesContainer.innerHTML = '';
 
-                console.log('Sending request to /process_video_upload'); // Debug log
-                const response = await fetch('/process_video_upload', {
+                // The file is the request body, so the server writes it to disk as it arrives
+                console.log('Sending request to /process_video_stream'); // Debug log
+                const response = await fetch(`/process_video_stream?filename=${encodeURIComponent(file.name)}`, {
                     method: 'POST',
-                    body: formData
+                    headers: { 'Content-Type': 'application/octet-stream' },
+                    body: file
                 });
 
                 console.log('Response received:', response.status); // Debug log
@@ -62,10 +64,15 @@ document.addEventListener('DOMContentLoaded', () => {
                     throw new Error(result.error || 'Failed to process video');
                 }
 
-                violationCountElement.textContent = result.violation_count;
+                // Processing runs in the background; follow the job until it finishes.
+                // A video uploaded before returns its earlier job, usually already completed.
+                const job = await waitForJob(result.job_id);
                 await updateViolationFrames();
-                
-                alert('Video processing completed!');
+
+                if (job.status === 'failed') {
+                    throw new Error(job.error || 'Failed to process video');
+                }
+                alert(`Video processing ${job.status}!`);
 
             } catch (error) {
                 console.error('Error:', error);
@@ -77,86 +84,133 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
+    async function waitForJob(jobId) {
+        while (true) {
+            const response = await fetch(`/jobs/${jobId}`);
+            const job = await response.json();
+            if (!response.ok) {
+                throw new Error(job.detail || 'Failed to fetch job status');
+            }
+
+            if (job.total_frames) {
+                processVideoButton.textContent =
+                    `Processing... ${job.frames_done}/${job.total_frames} (${job.fps} fps)`;
+            }
+            if (['completed', 'failed', 'cancelled'].includes(job.status)) {
+                return job;
+            }
+
+            // With the WebSocket open, violations arrive as they happen
+            if (!wsConnected()) {
+                await updateViolationFrames();
+            }
+            await new Promise(resolve => setTimeout(resolve, 1000));
+        }
+    }
+
     async function updateViolationFrames() {
+        // Only violations after the last one shown; the server answers 304 when there are none
         try {
-            const response = await fetch('/violations/count');
-            const data = await response.json();
-            
-            const framesContainer = document.getElementById('frames-container');
-            const violationCount = document.getElementById('violation-count');
-            
-            violationCount.textContent = data.violation_count;
-            
-            if (data.frames && data.frames.length > 0) {
-                framesContainer.innerHTML = data.frames
-                    .map(frame => {
-                        const [_, violationNum, frameNum, timestamp] = frame.split('_');
-                        return `
-                            <div class="violation-frame">
-                                <img src="/violation_frames/${frame}?t=${Date.now()}" 
-                                     alt="Violation ${violationNum}">
-                                <div class="violation-info">
-                                    <p>Violation #${violationNum}</p>
-                                    <p>Frame: ${frameNum}</p>
-                                    <p class="timestamp">Detected at: ${formatTimestamp(timestamp)}</p>
-                                </div>
-                            </div>
-                        `;
-                    })
-                    .join('');
+            const query = lastViolationId === null ? '' : `?after_id=${lastViolationId}`;
+            const response = await fetch(`/violations/since${query}`);
+            if (!response.ok) {
+                return;
             }
+            const data = await response.json();
+            violationCountElement.textContent = data.violation_count;
+            data.items.forEach(item => addViolationCard({
+                frameName: item.frame_name,
+                frameNumber: item.frame_number,
+                time: item.timestamp,
+                clipUrl: item.clip_url
+            }));
+            lastViolationId = data.last_id;
         } catch (error) {
             console.error('Error updating violation frames:', error);
         }
     }
 
-    function formatTimestamp(timestamp) {
-        const date = new Date(parseInt(timestamp));
-        return date.toLocaleString();
-    }
-
-    // Call updateViolationFrames every 2 seconds while processing
-    let updateInterval;
-    function startFrameUpdates() {
-        updateViolationFrames();
-        updateInterval = setInterval(updateViolationFrames, 2000);
-    }
-
-    function stopFrameUpdates() {
-        if (updateInterval) {
-            clearInterval(updateInterval);
+    function addViolationCard({ frameName, frameNumber, time, clipUrl, highlight = false }) {
+        if (!frameName || shownFrames.has(frameName)) {
+            return;
         }
-    }
-
-    // Setup WebSocket connection for real-time updates
-    const ws = new WebSocket(`ws://${window.location.host}/ws`);
-    
-    ws.onmessage = function(event) {
-        const data = JSON.parse(event.data);
-        
-        // Update violation count
-        document.getElementById('violation-count').textContent = data.violation_count;
-        
-        // Add new violation frame to container
-        const framesContainer = document.getElementById('frames-container');
+        shownFrames.add(frameName);
         const violationFrame = document.createElement('div');
-        violationFrame.className = 'violation-frame new-violation';
+        violationFrame.className = highlight ? 'violation-frame new-violation' : 'violation-frame';
+        violationFrame.dataset.frame = frameName;
         violationFrame.innerHTML = `
-            <img src="/${data.frame_path}?t=${Date.now()}" alt="Violation frame">
+            <a href="/violation_frames/${frameName}" target="_blank">
+                <img src="/violation_frames/thumbnails/${frameName}" alt="Violation frame" loading="lazy">
+            </a>
             <div class="violation-info">
-                <p>Frame: ${data.frame_number}</p>
-                <p>Time: ${new Date(data.timestamp).toLocaleTimeString()}</p>
+                <p>Frame: ${frameNumber}</p>
+                <p class="timestamp">Detected at: ${new Date(time).toLocaleString()}</p>
+                ${clipUrl ? `<p><a href="${clipUrl}" target="_blank">Clip</a></p>` : ''}
             </div>
         `;
-        
-        // Add to beginning of container
+        // Newest first; the oldest cards go once there are more than MAX_CARDS
         framesContainer.insertBefore(violationFrame, framesContainer.firstChild);
-        
-        // Highlight new violation briefly
-        setTimeout(() => {
-            violationFrame.classList.remove('new-violation');
-        }, 2000);
-    };
+        while (framesContainer.children.length > MAX_CARDS) {
+            shownFrames.delete(framesContainer.lastChild.dataset.frame);
+            framesContainer.removeChild(framesContainer.lastChild);
+        }
+        if (highlight) {
+            setTimeout(() => {
+                violationFrame.classList.remove('new-violation');
+            }, 2000);
+        }
+    }
+
+    function wsConnected() {
+        return ws !== null && ws.readyState === WebSocket.OPEN;
+    }
+
+    // Poll only while the WebSocket is down
+    function startPolling() {
+        if (!pollTimer) {
+            pollTimer = setInterval(updateViolationFrames, 2000);
+        }
+    }
+
+    function stopPolling() {
+        if (pollTimer) {
+            clearInterval(pollTimer);
+            pollTimer = null;
+        }
+    }
+
+    // Setup WebSocket connection for real-time updates, reconnecting with backoff
+    function connectWebSocket(delay = 1000) {
+        ws = new WebSocket(`ws://${window.location.host}/ws`);
+
+        ws.onopen = function() {
+            delay = 1000;
+            stopPolling();
+            // Events aren't replayed, so catch up from the newest violations; cards already shown are skipped
+            lastViolationId = null;
+            updateViolationFrames();
+        };
+
+        ws.onmessage = function(event) {
+            const data = JSON.parse(event.data);
+            violationCountElement.textContent = data.violation_count;
+            addViolationCard({
+                frameName: data.frame_path ? data.frame_path.split('/').pop() : null,
+                frameNumber: data.frame_number,
+                time: data.timestamp,
+                clipUrl: data.clip_path ? `/violation_clips/${data.clip_path.split('/').pop()}` : null,
+                highlight: true
+            });
+        };
+
+        ws.onclose = function() {
+            startPolling();
+            setTimeout(() => connectWebSocket(Math.min(delay * 2, 30000)), delay);
+        };
+    }
+
+    updateViolationFrames();
+    connectWebSocket();
 });
 
 async function updateViolationCount() {
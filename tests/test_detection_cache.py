@@ -0,0 +1,92 @@
+import json
+
+import numpy as np
+import pytest
+
+from src.detection_cache import DetectionCache
+
+META = {'video': 'clip.mp4', 'video_sha256': 'v' * 64, 'model': 'model.pt', 'model_sha256': 'm' * 64, 'settings': {}}
+
+
+def record(cache, key, frames=20, seed=0):
+    """Record and commit a complete run; returns its per-frame detections"""
+    rng = np.random.default_rng(seed)
+    arrays = [rng.uniform(0, 100, (int(rng.integers(0, 4)), 6)).astype(np.float32) for _ in range(frames)]
+    recorder = cache.recorder(key, META)
+    for frame_number, detections in enumerate(arrays, start=1):
+        recorder.add(frame_number, detections)
+    assert recorder.commit() is not None
+    return arrays
+
+
+def assert_replays(cache, key, arrays):
+    entry = cache.get(key)
+    assert entry is not None
+    assert entry.frames == len(arrays)
+    for frame_number, detections in enumerate(arrays, start=1):
+        np.testing.assert_array_equal(entry.frame(frame_number), detections)
+
+
+def test_round_trip(tmp_path):
+    cache = DetectionCache(tmp_path)
+    arrays = record(cache, 'key')
+    assert_replays(cache, 'key', arrays)
+
+
+def test_incomplete_run_is_not_stored(tmp_path):
+    cache = DetectionCache(tmp_path)
+    recorder = cache.recorder('key', META)
+    recorder.add(1, np.zeros((1, 6)))
+    recorder.add(3, np.zeros((1, 6)))  # Frame 2 was skipped
+    assert recorder.commit() is None
+    assert cache.get('key') is None
+
+
+@pytest.mark.parametrize('name, keep', [
+    ('detections.npy', 0.5),
+    ('detections.npy', 0.0),
+    ('offsets.npy', 0.5),
+    ('meta.json', 0.5),
+])
+def test_partial_file_is_ignored_and_rebuilt(tmp_path, name, keep):
+    cache = DetectionCache(tmp_path)
+    record(cache, 'key')
+    path = tmp_path / 'key' / name
+    data = path.read_bytes()
+    path.write_bytes(data[:int(len(data) * keep)])
+
+    assert cache.get('key') is None
+    arrays = record(cache, 'key', seed=1)
+    assert_replays(cache, 'key', arrays)
+
+
+def test_offsets_that_do_not_match_the_detections_are_ignored(tmp_path):
+    cache = DetectionCache(tmp_path)
+    record(cache, 'key')
+    offsets = np.load(tmp_path / 'key' / 'offsets.npy')
+    np.save(tmp_path / 'key' / 'offsets.npy', offsets + 1)
+    assert cache.get('key') is None
+
+
+def test_leftover_temporary_files_are_ignored(tmp_path):
+    cache = DetectionCache(tmp_path)
+    # What a process killed in the middle of store() leaves behind
+    leftover = tmp_path / '.key.1234.abcd.tmp'
+    leftover.mkdir()
+    (leftover / 'meta.json').write_text(json.dumps(dict(META, frames=5)))
+    assert cache.get('key') is None
+    assert list(cache._entries()) == []
+
+    arrays = record(cache, 'key')
+    assert_replays(cache, 'key', arrays)
+    assert [key for key, _ in cache._entries()] == ['key']
+
+
+def test_partial_digest_file_is_recomputed(tmp_path):
+    video = tmp_path / 'clip.mp4'
+    video.write_bytes(b'frames' * 1000)
+    cache = DetectionCache(tmp_path / 'cache')
+    digest = cache.digest(video)
+    for path in cache.digests_dir.iterdir():
+        path.write_text(path.read_text()[:10])
+    assert DetectionCache(tmp_path / 'cache').digest(video) == digest
@@ -0,0 +1,101 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from src.detection_codec import encode_batch
+from src.detection_service import DetectionService
+from src.transport import InProcessTransport, partition_for
+
+LABELS = ['hand', 'person', 'pizza', 'scooper']
+
+# A hand inside the default station moving left until it leaves it, without a scooper,
+# on frames 101-104 (past the first violation cooldown)
+HAND_PATH = {101: (430, 500), 102: (390, 500), 103: (350, 500), 104: (310, 500)}
+
+
+def hand_box(x, y):
+    return [x - 10, y - 10, x + 10, y + 10, 0.9, LABELS.index('hand')]
+
+
+def batch(frame_numbers, run_id='run-1', camera_id='cam1'):
+    frames = [(n, 1700000000.0 + n, np.array([hand_box(*HAND_PATH[n])])) for n in frame_numbers]
+    return encode_batch(camera_id, frames, LABELS, run_id=run_id)
+
+
+@pytest.fixture
+def make_service(tmp_path):
+    """Services sharing one database, like a consumer restarted after a crash"""
+    services = []
+
+    def make():
+        service = DetectionService(db_path=str(tmp_path / 'violations.db'), frames_dir=str(tmp_path / 'frames'),
+                                   transport=InProcessTransport())
+        services.append(service)
+        return service
+
+    yield make
+    for service in services:
+        service.violation_store.flush()
+
+
+def stored(service):
+    service.violation_store.flush()
+    return service.violation_store.count(camera_id='cam1')
+
+
+def test_replayed_message_is_not_applied_twice(make_service):
+    service = make_service()
+    message = batch([101, 102, 103, 104])
+    assert service.process_message(message) == 1
+    service.checkpoint()
+    assert service.process_message(message) == 0
+    assert stored(service) == 1
+
+
+def test_redelivery_after_a_crash_does_not_duplicate_the_violation(make_service):
+    message = batch([101, 102, 103, 104])
+    first = make_service()
+    assert first.process_message(message) == 1
+    # The violation was committed, then the consumer died before its checkpoint and ack
+    first.violation_store.flush()
+
+    second = make_service()
+    assert second.process_message(message) == 1
+    assert stored(second) == 1
+
+
+def test_new_run_of_the_same_camera_is_stored_again(make_service):
+    service = make_service()
+    assert service.process_message(batch([101, 102, 103, 104], run_id='run-1')) == 1
+    assert service.process_message(batch([101, 102, 103, 104], run_id='run-2')) == 1
+    assert stored(service) == 2
+
+
+def test_tracker_state_resumes_from_the_checkpoint(make_service):
+    first = make_service()
+    assert first.process_message(batch([101, 102, 103])) == 0
+    first.checkpoint()
+
+    # Frame 104 alone is a hand outside the station; only the resumed track makes it a violation
+    second = make_service()
+    assert second.process_message(batch([104])) == 1
+    assert second.process_message(batch([103])) == 0  # Already applied before the checkpoint
+    assert stored(second) == 1
+
+
+def test_partition_is_stable_across_processes():
+    cameras = [f"cam{i}" for i in range(20)] + ['', None]
+    expected = [partition_for(camera, 4) for camera in cameras]
+    assert all(0 <= partition < 4 for partition in expected)
+    root = Path(__file__).resolve().parents[1]
+    code = f"from src.transport import partition_for; print([partition_for(c, 4) for c in {cameras!r}])"
+    for seed in ('1', '2'):
+        # str hashes differ between these processes; the partition must not
+        env = dict(os.environ, PYTHONHASHSEED=seed)
+        output = subprocess.run([sys.executable, '-c', code], cwd=root, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        assert output.strip() == str(expected)
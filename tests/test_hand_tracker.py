@@ -0,0 +1,71 @@
+import random
+
+import numpy as np
+import pytest
+
+from src.camera_config import Station
+from src.hand_tracker import HandTracker, close_pairs
+
+STATIONS = [
+    Station('left', [(100, 100), (300, 100), (300, 300), (100, 300)], hand_match_distance=60, scooper_distance=50),
+    Station('right', [(320, 100), (500, 100), (500, 300), (320, 300)], hand_match_distance=45.5, scooper_distance=70),
+]
+
+
+def random_scenes(seed, frames=80):
+    """Hands random-walking over both stations, appearing, vanishing and overlapping, with scoopers"""
+    rng = random.Random(seed)
+    hands = [(rng.randint(50, 550), rng.randint(50, 350)) for _ in range(rng.randint(1, 14))]
+    for _ in range(frames):
+        hands = [(x + rng.randint(-40, 40), y + rng.randint(-40, 40)) for x, y in hands]
+        if rng.random() < 0.2:
+            hands.append((rng.randint(50, 550), rng.randint(50, 350)))
+        if rng.random() < 0.2 and hands:
+            hands.pop(rng.randrange(len(hands)))
+        if rng.random() < 0.1 and hands:
+            hands.append(hands[0])  # Two detections at one point: ties in distance
+        scoopers = [(rng.randint(50, 550), rng.randint(50, 350)) for _ in range(rng.randint(0, 4))]
+        yield hands, scoopers
+
+
+@pytest.mark.parametrize('seed', range(100))
+def test_loop_and_numpy_distances_track_identically(seed):
+    loops = HandTracker(STATIONS, loop_max_pairs=10 ** 9)
+    vectorized = HandTracker(STATIONS, loop_max_pairs=0)
+    for frame, (hands, scoopers) in enumerate(random_scenes(seed)):
+        as_arrays = frame % 2 == 0
+        if as_arrays:
+            hands = np.array(hands, dtype=np.int64).reshape(-1, 2)
+            scoopers = np.array(scoopers, dtype=np.int64).reshape(-1, 2)
+        assert loops.update(hands, scoopers) == vectorized.update(hands, scoopers), f"frame {frame}"
+        assert loops.state_dict() == vectorized.state_dict(), f"frame {frame}"
+
+
+def test_close_pairs_orders_ties_by_index():
+    a = [(0, 0), (10, 0)]
+    b = [(5, 0), (0, 3), (20, 0)]
+    for loop_max_pairs in (0, 100):
+        assert close_pairs(a, b, [6, 11], loop_max_pairs) == [(0, 1), (0, 0), (1, 0), (1, 2), (1, 1)]
+
+
+def test_hand_leaving_without_scooper_is_a_violation():
+    tracker = HandTracker(STATIONS)
+    assert tracker.update([(200, 280)], []) == []
+    assert tracker.update([(200, 310)], []) == [(0, 0)]
+    # A violation is reported once per track
+    assert tracker.update([(200, 320)], []) == []
+
+
+def test_hand_leaving_with_scooper_is_not_a_violation():
+    tracker = HandTracker(STATIONS)
+    tracker.update([(200, 280)], [])
+    assert tracker.update([(200, 310)], [(210, 320)]) == []
+
+
+def test_state_dict_round_trip():
+    tracker = HandTracker(STATIONS)
+    tracker.update([(200, 280), (400, 200)], [(205, 205)])
+    restored = HandTracker(STATIONS)
+    restored.load_state_dict(tracker.state_dict())
+    assert restored.state_dict() == tracker.state_dict()
+    assert restored.update([(200, 310), (400, 200)], []) == tracker.update([(200, 310), (400, 200)], []) == [(0, 0)]
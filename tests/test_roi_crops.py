@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from src.detectors import decode_output, letterbox
+from src.roi_crops import crop_input_fraction, crop_input_sizes, crop_regions, merge_crop_detections
+
+FRAME_SHAPE = (1080, 1920, 3)
+POLYGONS = [
+    [(400, 260), (560, 260), (460, 740), (300, 740)],
+    [(1400, 300), (1600, 300), (1600, 500), (1400, 500)],
+]
+
+
+def test_crop_regions_are_padded_clipped_and_merged():
+    assert crop_regions(POLYGONS, FRAME_SHAPE, padding=200) == [(100, 60, 761, 941), (1200, 100, 1801, 701)]
+    # Enough padding makes the two boxes overlap, and they are merged into one
+    assert crop_regions(POLYGONS, FRAME_SHAPE, padding=500) == [(0, 0, 1920, 1080)]
+
+
+def test_crops_keep_the_full_frame_scale():
+    regions = crop_regions(POLYGONS[:1], FRAME_SHAPE, padding=200)
+    # The frame runs at 640/1920 = 1/3 scale in a 384x640 input; the 661x881 crop at the same scale
+    assert crop_input_sizes([(0, 0, 1920, 1080)], FRAME_SHAPE, 640) == [(384, 640)]
+    assert crop_input_sizes(regions, FRAME_SHAPE, 640) == [(320, 224)]
+    assert crop_input_fraction([(320, 224)], FRAME_SHAPE, 640) == pytest.approx(320 * 224 / (384 * 640))
+    # Never more than imgsz
+    assert crop_input_sizes([(0, 0, 1920, 1080)], FRAME_SHAPE, (320, 320)) == [(192, 320)]
+
+
+def raw_output(boxes, classes, num_classes=4):
+    """A YOLO output, (4 + classes, anchors) of center-xywh boxes and class scores, holding the given boxes"""
+    output = np.zeros((4 + num_classes, len(boxes)), dtype=np.float32)
+    output[0] = (boxes[:, 0] + boxes[:, 2]) / 2
+    output[1] = (boxes[:, 1] + boxes[:, 3]) / 2
+    output[2] = boxes[:, 2] - boxes[:, 0]
+    output[3] = boxes[:, 3] - boxes[:, 1]
+    output[4 + classes, np.arange(len(boxes))] = 0.9
+    return output
+
+
+def test_crop_detections_map_back_to_frame_coordinates():
+    regions = crop_regions(POLYGONS, FRAME_SHAPE, padding=200)
+    sizes = crop_input_sizes(regions, FRAME_SHAPE, 640)
+    frame = np.zeros(FRAME_SHAPE, dtype=np.uint8)
+    # Frame-coordinate boxes, each inside one crop
+    expected = np.array([
+        [350, 400, 420, 470, 0.9, 0],
+        [500, 700, 560, 790, 0.9, 3],
+        [1450, 350, 1520, 430, 0.9, 0],
+    ], dtype=np.float32)
+
+    outputs = []
+    for (x1, y1, x2, y2), size in zip(regions, sizes):
+        crop = frame[y1:y2, x1:x2]
+        _, gain, pad = letterbox(crop, size)
+        inside = ((expected[:, 0] >= x1) & (expected[:, 2] <= x2)
+                  & (expected[:, 1] >= y1) & (expected[:, 3] <= y2))
+        # What the model sees: crop coordinates, scaled and padded by the letterbox
+        boxes = expected[inside, :4] - [x1, y1, x1, y1]
+        boxes = boxes * gain + [pad[0], pad[1], pad[0], pad[1]]
+        output = raw_output(boxes, expected[inside, 5].astype(np.int64))
+        outputs.append(decode_output(output, gain, pad, crop.shape, conf=0.25, iou=0.7))
+
+    merged = merge_crop_detections(outputs, regions)
+    order = np.lexsort((merged[:, 1], merged[:, 0]))
+    np.testing.assert_allclose(merged[order], expected[np.lexsort((expected[:, 1], expected[:, 0]))], atol=1e-3)
+
+
+def test_merge_of_no_detections_is_empty():
+    merged = merge_crop_detections([np.zeros((0, 6), dtype=np.float32)] * 2, [(0, 0, 10, 10), (20, 20, 30, 30)])
+    assert merged.shape == (0, 6)